@@ -1,18 +1,41 @@
 __version__ = "0.0.13"
 __all__ = [
     "BloomFilter",
+    "FilterPlan",
     "blake2b512",
     "sha3",
     "sha256",
     "shannon_entropy",
+    "false_positive_rate",
     "MemoryMappedBitArray",
+    "RotatingBloomFilter",
+    "ShardedBloomFilter",
+    "AsyncBloomFilter",
+    "FilterIndex",
+    "FilterArena",
+    "FilterManager",
+    "PrefixBloomFilter",
+    "tune",
+    "Backend",
+    "make_backend",
 ]
 
+from .aio import AsyncBloomFilter
+from .arena import FilterArena
+from .backends import Backend, make_backend
 from .bloom import (
     BloomFilter,
+    FilterPlan,
     MemoryMappedBitArray,
     blake2b512,
+    false_positive_rate,
     sha3,
     sha256,
     shannon_entropy,
 )
+from .index import FilterIndex
+from .manager import FilterManager
+from .prefix import PrefixBloomFilter
+from .rotating import RotatingBloomFilter
+from .sharded import ShardedBloomFilter
+from .tuning import tune
@@ -1,9 +1,139 @@
+import sys
+
 from fastbloomfilter.bloom import BloomFilter
 
 
-def main() -> int:
+def convert_main(argv: list[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="fastbloomfilter convert",
+        description="Rewrite a filter saved by save() in the mapped format",
+    )
+    parser.add_argument("source", help="Filter file written by save()")
+    parser.add_argument("destination", help="Mapped filter file to write")
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1024**2,
+        help="Bytes copied at a time (default: 1MB)",
+    )
+
+    args = parser.parse_args(argv)
+    BloomFilter.convert(args.source, args.destination, args.chunk_size)
+    return 0
+
+
+def tune_main(argv: list[str]) -> int:
+    import argparse
+
+    from fastbloomfilter.tuning import TuneConfig, format_table, recommend, tune
+
+    parser = argparse.ArgumentParser(
+        prog="fastbloomfilter tune",
+        description="Measure false positive rate, memory and throughput of "
+        "filter configurations and recommend one",
+    )
+    parser.add_argument(
+        "--keys", help="File of sample keys, one per line (default: synthetic keys)"
+    )
+    parser.add_argument(
+        "--capacity",
+        type=int,
+        default=100_000,
+        help="Synthetic keys to add when --keys is not given (default: 100000)",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.01,
+        help="Target false positive rate (default: 0.01)",
+    )
+    parser.add_argument(
+        "--probes",
+        type=int,
+        default=100_000,
+        help="Absent keys queried per configuration (default: 100000)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic key seed")
+    parser.add_argument(
+        "--array-size",
+        type=int,
+        action="append",
+        help="Array size in bytes to try, repeatable (default: sizes around the plan)",
+    )
+    parser.add_argument(
+        "--slices",
+        type=int,
+        action="append",
+        help="Number of hash slices to try with --array-size, repeatable (default: 10)",
+    )
+    parser.add_argument(
+        "--slice-bits",
+        type=int,
+        help="Digest bits per key with --array-size (default: 256)",
+    )
+    parser.add_argument(
+        "--index-mode", help="Index mode with --array-size (default: by size)"
+    )
+    parser.add_argument(
+        "--fast", action="store_true", help="Also try fast mode with --array-size"
+    )
+
+    args = parser.parse_args(argv)
+    if not args.array_size:
+        given = [
+            flag
+            for flag, value in (
+                ("--slices", args.slices),
+                ("--slice-bits", args.slice_bits),
+                ("--index-mode", args.index_mode),
+                ("--fast", args.fast or None),
+            )
+            if value is not None
+        ]
+        if given:
+            parser.error(f"{', '.join(given)} only apply with --array-size")
+    keys = None
+    if args.keys is not None:
+        with open(args.keys, "rb") as f:
+            keys = [line.rstrip(b"\r\n") for line in f]
+    configs = None
+    if args.array_size:
+        configs = [
+            TuneConfig(size, slices, args.slice_bits or 256, fast, args.index_mode)
+            for size in args.array_size
+            for slices in args.slices or [10]
+            for fast in ((False, True) if args.fast else (False,))
+        ]
+    results = tune(
+        keys,
+        capacity=args.capacity,
+        error_rate=args.error_rate,
+        configs=configs,
+        probes=args.probes,
+        seed=args.seed,
+    )
+    best = recommend(results, args.error_rate)
+    print(format_table(results, best))
+    config = best.config
+    print(
+        f"Recommended: array_size={config.array_size} slices={config.slices} "
+        f"slice_bits={config.slice_bits} fast={config.fast} "
+        f"index_mode={config.index_mode} (measured fpr {best.empirical_fpr:.6f})"
+    )
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
     import argparse
 
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "convert":
+        return convert_main(argv[1:])
+    if argv and argv[0] == "tune":
+        return tune_main(argv[1:])
+
     parser = argparse.ArgumentParser(description="fastBloomFilter CLI")
     parser.add_argument("filename", nargs="?", help="Filter file to load/create")
     parser.add_argument(
@@ -35,7 +165,7 @@ def main() -> int:
         help="Print full info",
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     bf = BloomFilter(
         array_size=args.size,
@@ -0,0 +1,229 @@
+"""
+Asyncio front end for BloomFilter. Filter work runs on an executor so the
+event loop never blocks on it, and single add/query/update calls made in
+the same loop iteration are coalesced into one batch call.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
+
+from fastbloomfilter.bloom import BloomFilter, Key
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+OPERATIONS = ("add", "query", "update")
+
+# Attributes _hash() needs, enough to rebuild the index derivation of a
+# filter in another process without its bits.
+_INDEX_ATTRS = (
+    "do_hashes",
+    "data_is_hex",
+    "hashfunc",
+    "fast",
+    "bitcount",
+    "slices",
+    "slice_bits",
+    "index_mode",
+    "layout",
+    "partition_bits",
+)
+
+
+def _index_rows(params: dict[str, Any], values: list[Key]) -> list[list[int]]:
+    hasher = BloomFilter.__new__(BloomFilter)
+    hasher.__dict__.update(params)
+    return [list(hasher._hash(value)) for value in values]
+
+
+class AsyncBloomFilter:
+    def __init__(
+        self,
+        bloom: BloomFilter | None = None,
+        executor: Executor | None = None,
+        hash_executor: Executor | None = None,
+        max_batch: int = 4096,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        """
+        Expects:
+            bloom (BloomFilter): filter to wrap, one is created from kwargs
+                when None
+            executor: runs every call on the filter, a single thread
+                executor when None; calls are serialized with a lock since
+                the filter is not thread safe
+            hash_executor: hashes the values of batches, usually a
+                ProcessPoolExecutor so hashing runs outside the GIL; values
+                are hashed on executor when None
+            max_batch (int): coalesced single calls are flushed once this
+                many are pending
+        """
+        self.bloom = bloom if bloom is not None else BloomFilter(**kwargs)
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1)
+        self.hash_executor = hash_executor
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self._pending: dict[str, list[tuple[Key, asyncio.Future[Any]]]] = {
+            op: [] for op in OPERATIONS
+        }
+        self._tasks: set[asyncio.Task[None]] = set()
+        self.batches = 0
+
+    def _locked(self, func: Callable[..., Any], *args: Any) -> Any:  # noqa: ANN401
+        with self.lock:
+            return func(*args)
+
+    async def _call(self, func: Callable[..., Any], *args: Any) -> Any:  # noqa: ANN401
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._locked, func, *args)
+
+    def _index_params(self) -> dict[str, Any]:
+        return {attr: getattr(self.bloom, attr) for attr in _INDEX_ATTRS}
+
+    async def _batch(self, op: str, values: list[Key]) -> list[Any]:
+        bf = self.bloom
+        self.batches += 1
+        if self.hash_executor is None:
+            result = await self._call(getattr(bf, f"{op}_batch"), values)
+        else:
+            loop = asyncio.get_running_loop()
+            params = await self._call(self._index_params)
+            rows = await loop.run_in_executor(
+                self.hash_executor, _index_rows, params, values
+            )
+            result = await self._call(self._apply_rows, op, params, rows, values)
+        return [None] * len(values) if result is None else result
+
+    def _apply_rows(
+        self, op: str, params: dict[str, Any], rows: list[list[int]], values: list[Key]
+    ) -> Any:  # noqa: ANN401
+        # Runs under the lock. The filter may have been saved, loaded or
+        # merged into while the rows were hashed: the guards and reloads of
+        # the batch methods apply, and rows hashed for other parameters are
+        # recomputed by the batch method itself.
+        bf = self.bloom
+        batch = getattr(bf, f"{op}_batch")
+        if op != "query" and (bf.saving or bf.loading or bf.merging):
+            return batch(values)
+        if op == "query" and bf.reload_interval is not None:
+            bf._maybe_reload()
+        if self._index_params() != params:
+            return batch(values)
+        return getattr(bf, f"_{op}_hashes")(rows, bf._sort_pages(None))
+
+    def _submit(self, op: str, value: Key) -> asyncio.Future[Any]:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[Any] = loop.create_future()
+        pending = self._pending[op]
+        pending.append((value, future))
+        if len(pending) >= self.max_batch:
+            self._flush(op)
+        elif len(pending) == 1:
+            # Everything submitted before the loop comes back here shares
+            # one batch.
+            loop.call_soon(self._flush, op)
+        return future
+
+    def _flush(self, op: str) -> None:
+        batch = self._pending[op]
+        if not batch:
+            return
+        self._pending[op] = []
+        task = asyncio.ensure_future(self._resolve(op, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(
+        self, op: str, batch: list[tuple[Key, asyncio.Future[Any]]]
+    ) -> None:
+        try:
+            results = await self._batch(op, [value for value, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        if len(results) != len(batch):
+            # update_batch() returns nothing while the filter is saved,
+            # loaded or merged; update() answers False then.
+            results = [False] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def add(self, value: Key) -> None:
+        await self._submit("add", value)
+
+    async def query(self, value: Key) -> bool:
+        result: bool = await self._submit("query", value)
+        return result
+
+    async def update(self, value: Key) -> bool:
+        result: bool = await self._submit("update", value)
+        return result
+
+    async def add_batch(self, values: Iterable[Key]) -> None:
+        await self._batch("add", list(values))
+
+    async def query_batch(self, values: Iterable[Key]) -> list[bool]:
+        return await self._batch("query", list(values))
+
+    async def update_batch(self, values: Iterable[Key]) -> list[bool]:
+        return await self._batch("update", list(values))
+
+    async def drain(self) -> None:
+        """
+        Waits until every coalesced call submitted so far has run.
+        """
+        for op in OPERATIONS:
+            self._flush(op)
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+
+    async def save(self, filename: str | None = None) -> bool:
+        await self.drain()
+        result: bool = await self._call(self.bloom.save, filename)
+        return result
+
+    async def save_mapped(self, filename: str | None = None) -> bool:
+        await self.drain()
+        result: bool = await self._call(self.bloom.save_mapped, filename)
+        return result
+
+    async def load(self, filename: str | None = None) -> bool:
+        await self.drain()
+        result: bool = await self._call(self.bloom.load, filename)
+        return result
+
+    async def merge(self, other: BloomFilter | AsyncBloomFilter) -> None:
+        if isinstance(other, AsyncBloomFilter):
+            await other.drain()
+            other_bloom = other.bloom
+            # Both locks are taken in id() order, so a.merge(b) running
+            # alongside b.merge(a) cannot deadlock.
+            locks = sorted({id(lock): lock for lock in (self.lock, other.lock)}.items())
+        else:
+            other_bloom = other
+            locks = [(id(self.lock), self.lock)]
+        await self.drain()
+
+        def merge() -> None:
+            with contextlib.ExitStack() as stack:
+                for _, lock in locks:
+                    stack.enter_context(lock)
+                self.bloom._raw_merge(other_bloom)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, merge)
+
+    async def close(self) -> None:
+        await self.drain()
+        await self._call(self.bloom.close)
+        if self._own_executor:
+            self.executor.shutdown()
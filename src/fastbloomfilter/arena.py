@@ -0,0 +1,337 @@
+"""
+Many small filters, of any size, in one mapped data file. A JSON directory
+next to it records where each tenant's bits start, so tens of thousands of
+filters cost one mapping and one file descriptor instead of one each.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import sys
+from typing import TYPE_CHECKING, Any
+
+from fastbloomfilter.backends import FileMmapBackend
+from fastbloomfilter.bloom import BloomFilter, Key, _new_filter
+from fastbloomfilter.lib.mapfile import atomic_write
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    import bitarray
+
+DIRECTORY = "arena.json"
+ALIGNMENT = 64
+
+
+class ArenaFilter:
+    """
+    Handle on one tenant's filter; holds no bits or hashing state itself.
+    """
+
+    __slots__ = ("arena", "tenant")
+
+    def __init__(self, arena: FilterArena, tenant: str) -> None:
+        self.arena = arena
+        self.tenant = tenant
+
+    def add(self, value: Key) -> None:
+        self.arena.add(self.tenant, value)
+
+    def query(self, value: Key) -> bool:
+        return self.arena.query(self.tenant, value)
+
+    def __contains__(self, value: Key) -> bool:
+        return self.query(value)
+
+    def add_batch(self, values: Iterable[Key]) -> None:
+        self.arena.add_batch((self.tenant, value) for value in values)
+
+    def query_batch(self, values: Iterable[Key]) -> list[bool]:
+        return self.arena.query_batch((self.tenant, value) for value in values)
+
+
+class FilterArena:
+    def __init__(
+        self,
+        directory: str,
+        initial_size: int = (1024**2) * 64,
+        slice_bits: int = 256,
+    ) -> None:
+        """
+        Opens the arena in directory, or creates it when directory has no
+        arena.json yet.
+        Expects:
+            initial_size (in bytes): size of a new data file, it grows by
+                doubling when full
+            slice_bits (int): digest bits per index, for every filter
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, DIRECTORY)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.meta: dict[str, Any] = json.load(f)
+        else:
+            self.meta = {
+                "version": 1,
+                "generation": 0,
+                "size": max(mmap.PAGESIZE, _align(initial_size, mmap.PAGESIZE)),
+                "slice_bits": slice_bits,
+                "filters": {},
+            }
+        self.filters: dict[str, dict[str, Any]] = self.meta["filters"]
+        # (offset, nbytes) of filters removed since the last save(); the saved
+        # directory still points at them, so they are not reused until then.
+        self.pending_free: list[tuple[int, int]] = []
+        self._hashers: dict[tuple[int, int, str], BloomFilter] = {}
+        self.storage: FileMmapBackend | None = None
+        self.mapping: mmap.mmap | None = None
+        self.bits: bitarray.bitarray | None = None
+        self._map(self._data_path(), int(self.meta["size"]))
+        sys.stderr.write(
+            f"BLOOM: Opened arena of {len(self.filters)} filters in {directory}\n"
+        )
+
+    def _data_path(self, generation: int | None = None) -> str:
+        if generation is None:
+            generation = int(self.meta["generation"])
+        return os.path.join(self.directory, f"data-{generation:04d}.bin")
+
+    def _map(self, path: str, size: int) -> None:
+        self.storage = FileMmapBackend(size, path, keep=True)
+        self.mapping = self.storage.mapping
+        self.bits = self.storage.bits
+
+    def _unmap(self) -> None:
+        self.bits = None
+        self.mapping = None
+        if self.storage is not None:
+            self.storage.close()
+            self.storage = None
+
+    def __len__(self) -> int:
+        return len(self.filters)
+
+    def __contains__(self, tenant: str) -> bool:
+        return tenant in self.filters
+
+    def __getitem__(self, tenant: str) -> ArenaFilter:
+        if tenant not in self.filters:
+            raise KeyError(tenant)
+        return ArenaFilter(self, tenant)
+
+    def tenants(self) -> list[str]:
+        return list(self.filters)
+
+    @property
+    def used(self) -> int:
+        return max(
+            (entry["offset"] + entry["nbytes"] for entry in self.filters.values()),
+            default=0,
+        )
+
+    def _find_space(self, nbytes: int) -> int:
+        # First fit in the holes left by removed filters, else the end.
+        taken = [(entry["offset"], entry["nbytes"]) for entry in self.filters.values()]
+        offset = 0
+        for start, size in sorted(taken + self.pending_free):
+            if start - offset >= nbytes:
+                return offset
+            offset = max(offset, _align(start + size, ALIGNMENT))
+        return offset
+
+    def _grow(self, size: int) -> None:
+        new_size = int(self.meta["size"])
+        while new_size < size:
+            new_size *= 2
+        self._unmap()
+        self._map(self._data_path(), new_size)
+        self.meta["size"] = new_size
+
+    def create(
+        self,
+        tenant: str,
+        array_size: int,
+        slices: int = 10,
+        index_mode: str | None = None,
+    ) -> ArenaFilter:
+        """
+        Allocates a zeroed filter of array_size bytes for tenant.
+        """
+        if tenant in self.filters:
+            raise KeyError(f"Tenant {tenant} already has a filter")
+        if array_size <= 0:
+            raise ValueError(f"array_size must be positive, got {array_size}")
+        bitcount = array_size * 8
+        index_mode = BloomFilter._check_index_mode(index_mode, bitcount)
+        offset = self._find_space(array_size)
+        end = offset + array_size
+        if end > int(self.meta["size"]):
+            self._grow(end)
+        assert self.bits is not None
+        # Holes may hold the bits of a removed filter.
+        self.bits[offset * 8 : end * 8] = 0
+        self.filters[tenant] = {
+            "offset": offset,
+            "nbytes": array_size,
+            "slices": slices,
+            "index_mode": index_mode,
+        }
+        return ArenaFilter(self, tenant)
+
+    def remove(self, tenant: str) -> None:
+        """
+        Frees the filter of tenant; its space is reused by create() after
+        the next save() and given back by compact().
+        """
+        entry = self.filters.pop(tenant)
+        self.pending_free.append((entry["offset"], entry["nbytes"]))
+
+    def _hasher(self, entry: dict[str, Any]) -> BloomFilter:
+        # One hasher per filter shape, not per tenant.
+        shape = (entry["nbytes"] * 8, entry["slices"], entry["index_mode"])
+        hasher = self._hashers.get(shape)
+        if hasher is None:
+            bitcount, slices, index_mode = shape
+            hasher = _new_filter(BloomFilter)
+            hasher._reset_runtime()
+            hasher._apply_metadata(
+                {
+                    "bitcount": bitcount,
+                    "slices": slices,
+                    "slice_bits": self.meta["slice_bits"],
+                    "fast": False,
+                    "do_hashes": True,
+                    "data_is_hex": False,
+                    "hashfunc": "blake2b512",
+                    "index_mode": index_mode,
+                    "layout": "shared",
+                    "partition_bits": bitcount,
+                    "bitset": 0,
+                }
+            )
+            self._hashers[shape] = hasher
+        return hasher
+
+    def _indices(self, tenant: str, value: Key) -> list[int]:
+        entry = self.filters.get(tenant)
+        if entry is None:
+            raise KeyError(tenant)
+        base = entry["offset"] * 8
+        return [base + index for index in self._hasher(entry)._hash(value)]
+
+    def add(self, tenant: str, value: Key) -> None:
+        assert self.bits is not None
+        self.bits[self._indices(tenant, value)] = 1
+
+    def query(self, tenant: str, value: Key) -> bool:
+        assert self.bits is not None
+        return bool(self.bits[self._indices(tenant, value)].all())
+
+    def add_batch(self, items: Iterable[tuple[str, Key]]) -> None:
+        """
+        Adds (tenant, value) pairs, setting the bits of the whole batch in
+        one call.
+        """
+        assert self.bits is not None
+        indices: list[int] = []
+        for tenant, value in items:
+            indices.extend(self._indices(tenant, value))
+        if indices:
+            self.bits[indices] = 1
+
+    def query_batch(self, items: Iterable[tuple[str, Key]]) -> list[bool]:
+        assert self.bits is not None
+        indices: list[int] = []
+        ends: list[int] = []
+        for tenant, value in items:
+            indices.extend(self._indices(tenant, value))
+            ends.append(len(indices))
+        if not indices:
+            return [True] * len(ends)
+        found = self.bits[indices]
+        results = []
+        start = 0
+        for end in ends:
+            results.append(found.count(1, start, end) == end - start)
+            start = end
+        return results
+
+    def filter(self, tenant: str) -> BloomFilter:
+        """
+        A BloomFilter over the tenant's bits in the mapping, for the rest of
+        the filter API. Close it before create(), compact() or close().
+        """
+        entry = self.filters[tenant]
+        assert self.mapping is not None
+        view = memoryview(self.mapping)[
+            entry["offset"] : entry["offset"] + entry["nbytes"]
+        ]
+        return BloomFilter(
+            buffer=view,
+            slices=entry["slices"],
+            slice_bits=self.meta["slice_bits"],
+            index_mode=entry["index_mode"],
+        )
+
+    def save(self) -> None:
+        """
+        Flushes the bits and replaces the directory atomically; the directory
+        is the commit point, a crash before it keeps the previous one. Space
+        is only reused once no saved directory points at it.
+        """
+        assert self.mapping is not None
+        self.mapping.flush()
+        atomic_write(
+            os.path.join(self.directory, DIRECTORY),
+            json.dumps(self.meta, indent=1).encode(),
+        )
+        self.pending_free = []
+
+    def compact(self) -> int:
+        """
+        Packs the filters into a new data file without holes, commits it
+        with save() and removes the old file. Returns the bytes reclaimed.
+        """
+        assert self.bits is not None
+        generation = int(self.meta["generation"]) + 1
+        path = self._data_path(generation)
+        offset = 0
+        moves = []
+        for tenant, entry in sorted(
+            self.filters.items(), key=lambda item: item[1]["offset"]
+        ):
+            moves.append((tenant, entry["offset"], offset, entry["nbytes"]))
+            offset = _align(offset + entry["nbytes"], ALIGNMENT)
+        size = max(mmap.PAGESIZE, _align(offset, mmap.PAGESIZE))
+        with open(path, "wb") as f:
+            f.truncate(size)
+            for _, source, target, nbytes in moves:
+                f.seek(target)
+                f.write(self.bits[source * 8 : (source + nbytes) * 8].tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        old_path = self._data_path()
+        reclaimed = int(self.meta["size"]) - size
+        self._unmap()
+        for tenant, _, target, _ in moves:
+            self.filters[tenant]["offset"] = target
+        self.meta["generation"] = generation
+        self.meta["size"] = size
+        self._map(path, size)
+        self.save()
+        os.unlink(old_path)
+        sys.stderr.write(f"BLOOM: Compacted arena, reclaimed {reclaimed} bytes\n")
+        return reclaimed
+
+    def close(self) -> None:
+        self._unmap()
+
+    def __del__(self) -> None:
+        self.close()
+
+
+def _align(value: int, alignment: int) -> int:
+    return (value + alignment - 1) // alignment * alignment
@@ -0,0 +1,366 @@
+"""
+Storage backends for the bits of a filter. Every backend owns one flat,
+writable buffer and exposes it as a little-endian bitarray, so the filter
+code runs the same C loops whatever holds the memory: the bitarray heap,
+a file mapping, an anonymous mapping, POSIX shared memory or a NumPy array.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import sys
+import tempfile
+from multiprocessing import shared_memory
+from typing import IO, TYPE_CHECKING, Any, Protocol
+
+import bitarray
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+np: Any = None
+try:
+    import numpy as np
+except ImportError:
+    pass
+
+BACKENDS = ("bitarray", "mmap", "anonymous", "shm", "numpy")
+# Used when /proc/meminfo can't be read.
+DEFAULT_MEMORY_THRESHOLD = (1024**2) * 64
+MEMINFO = "/proc/meminfo"
+
+
+class Backend(Protocol):
+    """
+    What BloomFilter needs from a backend: it reads and writes self.bits
+    directly and only merges, maps, flushes and closes through the backend.
+    The concrete backends add bulk get_bits/set_bits, and_ and count.
+    """
+
+    name: str
+    bits: bitarray.bitarray
+    mapping: mmap.mmap | None
+
+    def or_(self, other: Any) -> None: ...  # noqa: ANN401
+
+    def buffer(self) -> memoryview: ...
+
+    def flush(self) -> None: ...
+
+    def close(self) -> None: ...
+
+
+def madvise(mapping: mmap.mmap, option: str) -> bool:
+    """
+    Applies the mmap.MADV_* option named option to the whole mapping, returns
+    False when the platform or kernel does not support it.
+    """
+    flag = getattr(mmap, option, None)
+    if flag is None or not hasattr(mapping, "madvise"):
+        return False
+    try:
+        mapping.madvise(flag)
+    except OSError:
+        return False
+    return True
+
+
+def anonymous_mapping(
+    size: int, huge_pages: bool = False, populate: bool = False
+) -> mmap.mmap:
+    """
+    Anonymous private mapping of size bytes, optionally prefaulted with
+    MAP_POPULATE and hinted for transparent huge pages.
+    """
+    flags = mmap.MAP_PRIVATE | getattr(mmap, "MAP_ANONYMOUS", 0)
+    if populate:
+        flags |= getattr(mmap, "MAP_POPULATE", 0)
+    mapping = mmap.mmap(-1, size, flags=flags)
+    if huge_pages:
+        madvise(mapping, "MADV_HUGEPAGE")
+    return mapping
+
+
+def available_memory(meminfo: str = MEMINFO) -> int | None:
+    """
+    Bytes the kernel reports as available for new allocations without
+    swapping (MemAvailable, MemFree on old kernels), None where unknown.
+    """
+    fields: dict[str, int] = {}
+    try:
+        with open(meminfo) as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                parts = value.split()
+                if parts and parts[0].isdigit():
+                    fields[key] = int(parts[0]) * 1024
+    except OSError:
+        return None
+    return fields.get("MemAvailable", fields.get("MemFree"))
+
+
+def memory_limit(fraction: float = 0.5, meminfo: str = MEMINFO) -> int:
+    """
+    Largest filter kept in memory: fraction of the available memory, or
+    DEFAULT_MEMORY_THRESHOLD where it can't be read.
+    """
+    available = available_memory(meminfo)
+    if available is None:
+        return DEFAULT_MEMORY_THRESHOLD
+    return int(available * fraction)
+
+
+def select_backend(nbytes: int, fraction: float = 0.5) -> str:
+    return "bitarray" if nbytes <= memory_limit(fraction) else "mmap"
+
+
+class _BufferBackend:
+    """
+    Implements the Backend operations on self.bits, subclasses only
+    allocate and release the memory under it.
+    """
+
+    name = ""
+    mapping: mmap.mmap | None = None
+
+    def __init__(self, buffer: Any) -> None:  # noqa: ANN401
+        self.bits = bitarray.bitarray(buffer=buffer, endian="little")
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    def get_bits(self, indices: Sequence[int]) -> list[bool]:
+        return [bool(bit) for bit in self.bits[list(indices)]]
+
+    def set_bits(self, indices: Sequence[int]) -> None:
+        self.bits[list(indices)] = 1
+
+    def _other(self, other: Any) -> bitarray.bitarray:  # noqa: ANN401
+        theirs = bitarray.bitarray(buffer=other, endian="little")
+        if len(theirs) != len(self.bits):
+            raise ValueError(
+                f"Buffers are not conformable: {len(self.bits)} - {len(theirs)} bits"
+            )
+        return theirs
+
+    def or_(self, other: Any) -> None:  # noqa: ANN401
+        """
+        ORs a bytes-like object of the same size into the bits, in place.
+        """
+        self.bits |= self._other(other)
+
+    def and_(self, other: Any) -> None:  # noqa: ANN401
+        self.bits &= self._other(other)
+
+    def count(self) -> int:
+        return int(self.bits.count())
+
+    def buffer(self) -> memoryview:
+        return memoryview(self.bits)
+
+    def flush(self) -> None:
+        if self.mapping is not None and not self.mapping.closed:
+            self.mapping.flush()
+
+    def _release(self) -> None:
+        # The bitarray exports the buffer, drop it before the memory goes.
+        if hasattr(self, "bits"):
+            del self.bits
+
+    def close(self) -> None:
+        self._release()
+
+    def __del__(self) -> None:
+        self.close()
+
+
+class BitarrayBackend(_BufferBackend):
+    name = "bitarray"
+
+    def __init__(self, nbytes: int) -> None:
+        self.bits = bitarray.bitarray(nbytes * 8, endian="little")
+        self.bits.setall(False)
+
+
+class FileMmapBackend(_BufferBackend):
+    """
+    Bits in a shared mapping of filepath from offset, a multiple of
+    mmap.ALLOCATIONGRANULARITY, or of a temporary file removed on close().
+    A new file starts zeroed; with keep the bits already in filepath are
+    kept and the file grown to fit, with create=False they are mapped as is.
+    """
+
+    name = "mmap"
+
+    def __init__(
+        self,
+        nbytes: int,
+        filepath: str | None = None,
+        populate: bool = False,
+        offset: int = 0,
+        create: bool = True,
+        keep: bool = False,
+    ) -> None:
+        self.temp_file = filepath is None
+        if filepath is None:
+            fd, filepath = tempfile.mkstemp(prefix="bloom-")
+            os.close(fd)
+        self.filepath = filepath
+        reuse = not create or (keep and os.path.exists(filepath))
+        self.file_obj: IO[bytes] | None = open(filepath, "r+b" if reuse else "w+b")
+        if create and os.fstat(self.file_obj.fileno()).st_size < offset + nbytes:
+            # A truncated file reads as zeros without writing them first.
+            self.file_obj.truncate(offset + nbytes)
+        flags = mmap.MAP_SHARED
+        if populate:
+            flags |= getattr(mmap, "MAP_POPULATE", 0)
+        self.mapping = mmap.mmap(
+            self.file_obj.fileno(), nbytes, flags=flags, offset=offset
+        )
+        super().__init__(self.mapping)
+        sys.stderr.write(
+            f"BLOOM: Mapped {nbytes / (1024**2):.2f} MB at {self.filepath}\n"
+        )
+
+    def close(self) -> None:
+        self._release()
+        if self.mapping is not None:
+            self.mapping.flush()
+            self.mapping.close()
+            self.mapping = None
+        if getattr(self, "file_obj", None) is not None:
+            assert self.file_obj is not None
+            self.file_obj.close()
+            self.file_obj = None
+            if self.temp_file and os.path.exists(self.filepath):
+                os.unlink(self.filepath)
+
+
+class AnonymousMmapBackend(_BufferBackend):
+    name = "anonymous"
+
+    def __init__(
+        self, nbytes: int, huge_pages: bool = False, populate: bool = False
+    ) -> None:
+        # Anonymous mappings start zeroed.
+        self.mapping = anonymous_mapping(nbytes, huge_pages, populate)
+        super().__init__(self.mapping)
+
+    def close(self) -> None:
+        self._release()
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+
+
+class SharedMemoryBackend(_BufferBackend):
+    """
+    Bits in a multiprocessing.shared_memory block that other processes
+    attach to by name with create=False. The creator unlinks it on close().
+    """
+
+    name = "shm"
+
+    def __init__(
+        self, nbytes: int, name: str | None = None, create: bool = True
+    ) -> None:
+        shm = shared_memory.SharedMemory(
+            name=name, create=create, size=nbytes if create else 0
+        )
+        if shm.size < nbytes:
+            shm.close()
+            raise ValueError(
+                f"Shared memory block {name} holds {shm.size} bytes, {nbytes} needed"
+            )
+        self.shm: shared_memory.SharedMemory | None = shm
+        self.owner = create
+        assert shm.buf is not None
+        # Some platforms round the block up to whole pages.
+        super().__init__(shm.buf[:nbytes])
+
+    @property
+    def shm_name(self) -> str:
+        assert self.shm is not None
+        return self.shm.name
+
+    def close(self) -> None:
+        self._release()
+        if getattr(self, "shm", None) is not None:
+            assert self.shm is not None
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+            self.shm = None
+
+
+class NumpyBackend(_BufferBackend):
+    """
+    Bits in a uint8 NumPy array; bulk get/set and OR/AND run vectorized
+    over index arrays.
+    """
+
+    name = "numpy"
+
+    def __init__(self, nbytes: int) -> None:
+        if np is None:
+            raise ValueError("The numpy backend needs numpy installed")
+        self.array = np.zeros(nbytes, dtype=np.uint8)
+        super().__init__(self.array)
+
+    def get_bits(self, indices: Sequence[int]) -> list[bool]:
+        idx = np.asarray(indices, dtype=np.int64)
+        bits: list[bool] = (
+            ((self.array[idx >> 3] >> (idx & 7)) & 1).astype(bool).tolist()
+        )
+        return bits
+
+    def set_bits(self, indices: Sequence[int]) -> None:
+        idx = np.asarray(indices, dtype=np.int64)
+        # ufunc.at applies repeated byte indices one after the other.
+        np.bitwise_or.at(
+            self.array, idx >> 3, np.left_shift(1, idx & 7).astype(np.uint8)
+        )
+
+    def _other_array(self, other: Any) -> Any:  # noqa: ANN401
+        theirs = np.frombuffer(other, dtype=np.uint8)
+        if theirs.size != self.array.size:
+            raise ValueError(
+                f"Buffers are not conformable: {self.array.size} - {theirs.size} bytes"
+            )
+        return theirs
+
+    def or_(self, other: Any) -> None:  # noqa: ANN401
+        np.bitwise_or(self.array, self._other_array(other), out=self.array)
+
+    def and_(self, other: Any) -> None:  # noqa: ANN401
+        np.bitwise_and(self.array, self._other_array(other), out=self.array)
+
+
+def make_backend(
+    name: str,
+    nbytes: int,
+    filepath: str | None = None,
+    populate: bool = False,
+    huge_pages: bool = False,
+    shm_name: str | None = None,
+) -> Backend:
+    """
+    Creates a zeroed backend of nbytes. name is one of BACKENDS or "auto",
+    which keeps the bits in memory while they fit in half of the available
+    memory and maps a file otherwise. With shm_name the "shm" backend
+    attaches to that existing block and keeps its bits.
+    """
+    if name == "auto":
+        name = select_backend(nbytes)
+    if name == "bitarray":
+        return BitarrayBackend(nbytes)
+    if name == "mmap":
+        return FileMmapBackend(nbytes, filepath, populate)
+    if name == "anonymous":
+        return AnonymousMmapBackend(nbytes, huge_pages, populate)
+    if name == "shm":
+        return SharedMemoryBackend(nbytes, shm_name, create=shm_name is None)
+    if name == "numpy":
+        return NumpyBackend(nbytes)
+    raise ValueError(f"Unknown backend: {name}")
@@ -12,20 +12,60 @@ http://en.wikipedia.org/wiki/Bloom_filter
 
 from __future__ import annotations
 
-import binascii
 import hashlib
+import itertools
 import math
 import mmap
 import os
+import pickle
 import sys
-from typing import IO, TYPE_CHECKING, Any, TypeVar
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, TypeVar
 
 import bitarray
-
-from fastbloomfilter.lib.pickling import compress_pickle, decompress_pickle
+import bitarray.util
+
+from fastbloomfilter.backends import (
+    BACKENDS,
+    FileMmapBackend,
+    madvise,
+    make_backend,
+    memory_limit,
+)
+from fastbloomfilter.lib.chunks import ChunkTracker
+from fastbloomfilter.lib.delta import decode_delta, encode_delta
+from fastbloomfilter.lib.legacy import load_legacy
+from fastbloomfilter.lib.lru import LRUCache
+from fastbloomfilter.lib.mapfile import (
+    encode_header,
+    file_identity,
+    is_mapfile,
+    read_header,
+    rewrite_header,
+    write_mapfile,
+)
+from fastbloomfilter.lib.merkle import MERKLE_CHUNK_SIZE, hash_chunks, merkle_root
+from fastbloomfilter.lib.pickling import compress_pickle
 
 if TYPE_CHECKING:
-    from collections.abc import Generator, Iterable
+    from collections.abc import Callable, Generator, Iterable
+
+    from fastbloomfilter.backends import Backend
+    from fastbloomfilter.lib.tracing import Tracer
+
+resource: Any = None
+try:
+    import resource
+except ImportError:
+    pass
+
+np: Any = None
+try:
+    import numpy as np
+except ImportError:
+    pass
 
 tqdm: Any = None
 try:
@@ -37,74 +77,169 @@ except ImportError:
 
 T = TypeVar("T")
 
+INDEX_MODES = ("mask", "lemire", "mod")
+LAYOUTS = ("shared", "partitioned")
+DELTA_CHUNK_SIZE = 64 * 1024
+MERGE_CHUNK_SIZE = 16 * 1024**2
+
+# Keys are hashed as UTF-8 when given as str and as-is when bytes-like.
+Key = str | bytes | bytearray | memoryview
+
 
-def blake2b512(s: str) -> hashlib._Hash:
+def blake2b512(s: Key) -> hashlib._Hash:
     h = hashlib.new("blake2b512")
-    h.update(s.encode("utf8"))
+    h.update(s.encode("utf8") if isinstance(s, str) else s)
     return h
 
 
-def sha3(s: str) -> hashlib._Hash:
+def sha3(s: Key) -> hashlib._Hash:
     h = hashlib.sha3_256()
-    h.update(s.encode("utf8"))
+    h.update(s.encode("utf8") if isinstance(s, str) else s)
     return h
 
 
-def sha256(s: str) -> hashlib._Hash:
+def sha256(s: Key) -> hashlib._Hash:
     h = hashlib.sha256()
-    h.update(s.encode("utf8"))
+    h.update(s.encode("utf8") if isinstance(s, str) else s)
     return h
 
 
-def shannon_entropy(data: bytes, iterator: list[int] | None = None) -> float:
+HASHFUNCS = {"blake2b512": blake2b512, "sha3": sha3, "sha256": sha256}
+
+
+def byte_counts(data: Any, chunk_size: int = 1024**2) -> list[int]:  # noqa: ANN401
+    """
+    Occurrences of every byte value in a bytes-like object, counted in one
+    pass (NumPy) or chunk by chunk, without copying the whole buffer.
+    """
+    view = memoryview(data).cast("B")
+    if np is not None:
+        counts: list[int] = np.bincount(
+            np.frombuffer(view, dtype=np.uint8), minlength=256
+        ).tolist()
+        view.release()
+        return counts
+    counts = [0] * 256
+    for start in range(0, len(view), chunk_size):
+        chunk = view[start : start + chunk_size].tobytes()
+        for x in range(256):
+            counts[x] += chunk.count(x)
+    view.release()
+    return counts
+
+
+def shannon_entropy(data: Any, iterator: list[int] | None = None) -> float:  # noqa: ANN401
     """
     Borrowed from http://blog.dkbza.org/2007/05/scanning-data-for-entropy-anomalies.html
+    data may be any bytes-like object, it is not copied.
     """
-    if not data:
+    size = memoryview(data).nbytes
+    if not size:
         return 0.0
     entropy = 0.0
     if iterator is None:
         iterator = list(range(0, 255))
+    counts = byte_counts(data)
     for x in iterator:
-        p_x = float(data.count(bytes([x]))) / len(data)
+        p_x = float(counts[x]) / size
         if p_x > 0:
             entropy += -p_x * math.log(p_x, 2)
     return entropy
 
 
-class MemoryMappedBitArray:
+@dataclass(frozen=True)
+class FilterPlan:
     """
-    A memory-mapped implementation of a bit array.
-    Uses disk instead of RAM for large filters.
+    Sizing computed by BloomFilter.plan() for a target capacity and error rate.
     """
 
-    def __init__(
-        self, size_in_bits: int, filepath: str | None = None, create_new: bool = True
-    ) -> None:
-        self.size_in_bits = size_in_bits
-        self.size_in_bytes = (size_in_bits + 7) // 8
+    capacity: int
+    error_rate: float
+    bitcount: int
+    slices: int
+    slice_bits: int
+    digest_bits: int
+    expected_fpr: float
+    index_mode: str = "lemire"
+    layout: str = "shared"
 
-        self.temp_file = False
-        self.file_obj: IO[bytes] | None = None
-        if filepath is None:
-            import tempfile
+    @property
+    def array_size(self) -> int:
+        return self.bitcount // 8
 
-            self.temp_file = True
-            self.file_obj = tempfile.NamedTemporaryFile(delete=False)
-            self.filepath = self.file_obj.name
-        else:
-            self.filepath = filepath
+    @property
+    def memory_bytes(self) -> int:
+        return self.array_size
 
-        if create_new or not os.path.exists(self.filepath):
-            with open(self.filepath, "wb") as f:
-                f.write(b"\x00" * self.size_in_bytes)
+    @property
+    def bits_per_index(self) -> int:
+        return self.slice_bits // self.slices
 
-        self.file_obj = open(self.filepath, "r+b")
-        self.mmap: mmap.mmap = mmap.mmap(self.file_obj.fileno(), self.size_in_bytes)
 
-        sys.stderr.write(
-            f"BLOOM: Created memory-mapped bit array of {self.size_in_bytes / (1024**2):.2f} MB at {self.filepath}\n"
+def false_positive_rate(bitcount: int, slices: int, count: int) -> float:
+    """
+    False positive rate of a filter of bitcount bits and slices hashes
+    after count insertions: (1 - e^(-k * n / m)) ** k
+    """
+    if bitcount <= 0:
+        return 1.0
+    return float((1.0 - math.exp(-float(slices * count) / bitcount)) ** slices)
+
+
+def partition_bytes(array_size: int, slices: int, grow: bool = True) -> int:
+    """
+    Bytes per partition of a partitioned filter. Partitions of at least
+    mmap.ALLOCATIONGRANULARITY are a whole number of granules, rounded up
+    (or down without grow), so each one can be mapped or madvised on its
+    own; smaller ones are only byte aligned.
+    """
+    nbytes = array_size // slices
+    granule = mmap.ALLOCATIONGRANULARITY
+    if nbytes < granule:
+        return nbytes
+    if grow:
+        return -(-nbytes // granule) * granule
+    return nbytes // granule * granule
+
+
+def page_faults() -> tuple[int, int]:
+    """
+    Minor and major page faults of this process so far, (0, 0) where
+    getrusage is not available.
+    """
+    if resource is None:
+        return 0, 0
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_minflt, usage.ru_majflt
+
+
+def _new_filter(cls: type[T]) -> T:
+    # Unpickling creates the filter without __init__, __setstate__ fills it.
+    return cls.__new__(cls)
+
+
+class MemoryMappedBitArray:
+    """
+    A memory-mapped implementation of a bit array, over the mapping of a
+    FileMmapBackend. Uses disk instead of RAM for large filters.
+    """
+
+    def __init__(
+        self,
+        size_in_bits: int,
+        filepath: str | None = None,
+        create_new: bool = True,
+        populate: bool = False,
+    ) -> None:
+        self.size_in_bits = size_in_bits
+        self.size_in_bytes = (size_in_bits + 7) // 8
+        self.backend: FileMmapBackend | None = FileMmapBackend(
+            self.size_in_bytes, filepath, populate, keep=not create_new
         )
+        self.filepath = self.backend.filepath
+        self.temp_file = self.backend.temp_file
+        assert self.backend.mapping is not None
+        self.mmap: mmap.mmap = self.backend.mapping
 
     def __getitem__(self, index: int) -> bool:
         if index >= self.size_in_bits:
@@ -134,42 +269,39 @@ class MemoryMappedBitArray:
         return self.size_in_bits
 
     def tobytes(self) -> bytes:
-        self.mmap.flush()
+        # A copy of the whole array, as_memoryview() avoids it.
         return self.mmap[:]
 
-    def setall(self, value: bool) -> None:
-        fill_byte = 0xFF if value else 0x00
-        self.mmap[:] = bytes([fill_byte] * self.size_in_bytes)
+    def as_memoryview(self) -> memoryview:
+        return memoryview(self.mmap)
 
-    def frombytes(self, byte_data: bytes) -> None:
-        if len(byte_data) != self.size_in_bytes:
+    def setall(self, value: bool) -> None:
+        fill = (b"\xff" if value else b"\x00") * min(self.size_in_bytes, 1024**2)
+        for start in range(0, self.size_in_bytes, len(fill)):
+            end = min(start + len(fill), self.size_in_bytes)
+            self.mmap[start:end] = fill[: end - start]
+
+    def frombytes(self, byte_data: Any) -> None:  # noqa: ANN401
+        nbytes = memoryview(byte_data).nbytes
+        if nbytes != self.size_in_bytes:
             raise ValueError(
-                f"Data size mismatch: {len(byte_data)} bytes provided, {self.size_in_bytes} bytes required"
+                f"Data size mismatch: {nbytes} bytes provided, {self.size_in_bytes} bytes required"
             )
         self.mmap[:] = byte_data
 
     def close(self) -> None:
-        if hasattr(self, "mmap") and self.mmap is not None:
-            self.mmap.flush()
-            self.mmap.close()
+        if getattr(self, "backend", None) is not None:
+            assert self.backend is not None
+            self.backend.close()
+            self.backend = None
             self.mmap = None  # type: ignore[assignment]
 
-        if hasattr(self, "file_obj") and self.file_obj is not None:
-            self.file_obj.close()
-            self.file_obj = None
-
-        if self.temp_file and os.path.exists(self.filepath):
-            try:
-                os.unlink(self.filepath)
-            except Exception:
-                pass
-
     def __del__(self) -> None:
         self.close()
 
 
 class BloomFilter:
-    bfilter: MemoryMappedBitArray | bitarray.bitarray
+    bfilter: bitarray.bitarray
     hashfunc: Any
 
     def __init__(
@@ -183,8 +315,64 @@ class BloomFilter:
         data_is_hex: bool = False,
         use_mmap: bool = False,
         mmap_file: str | None = None,
-        memory_threshold: int = (1024**2) * 64,
+        memory_threshold: int | None = None,
+        index_mode: str | None = None,
+        layout: str = "shared",
+        buffer: Any = None,  # noqa: ANN401
+        populate: bool = False,
+        huge_pages: bool = False,
+        cache_size: int = 0,
+        digest_cache_size: int = 0,
+        fingerprint_bits: int = 64,
+        track_changes: bool = False,
+        tracer: Tracer | None = None,
+        backend: str | None = None,
+        shm_name: str | None = None,
     ) -> None:
+        """
+        Initializes a BloomFilter() object:
+        Expects:
+            array_size (in bytes): 4 * 1024 for a 4KB filter, ignored with buffer
+            buffer: writable bytes-like object (bytearray, mmap, memoryview) to
+                hold the bits in place of a new allocation; its content is kept
+            populate (bool): prefault the mapping with MAP_POPULATE
+            huge_pages (bool): keep an in-memory filter in an anonymous mapping
+                hinted with MADV_HUGEPAGE
+            cache_size (int): values remembered as positive by query() and
+                update(), 0 disables the cache
+            digest_cache_size (int): values whose bit indices are remembered,
+                0 disables the cache
+            fingerprint_bits (int): width of the precomputed hashes given to
+                the *_fingerprint(s) methods; each index uses half of them, so
+                they raise ValueError on ranges over 2 ** (fingerprint_bits / 2)
+                bits (512MB with the default 64)
+            track_changes (bool): remember which chunks were written since
+                each export_delta(), so deltas only carry changed chunks
+            tracer (Tracer): times a sample of add/query/update calls per
+                stage (hash, index derivation, bit access)
+            memory_threshold (in bytes): larger filters are memory-mapped,
+                by default half of MemAvailable in /proc/meminfo
+            backend (str): keep the bits in a storage backend, one of
+                backends.BACKENDS or "auto"; mmap_file, populate and
+                huge_pages are passed on to it. By default "mmap" with
+                use_mmap or past memory_threshold, "anonymous" with
+                huge_pages or populate, else "bitarray"
+            shm_name (str): with backend="shm", attach to the shared memory
+                block of another filter by name and keep its bits; the other
+                options must match that filter's
+        """
+        if shm_name is not None and backend != "shm":
+            raise ValueError('shm_name needs backend="shm"')
+        if buffer is not None:
+            array_size = memoryview(buffer).nbytes
+            use_mmap = False
+            memory_threshold = array_size
+            backend = "bitarray"
+        if memory_threshold is None:
+            memory_threshold = memory_limit()
+        if backend is not None:
+            use_mmap = False
+            memory_threshold = array_size
         self.saving = False
         self.loading = False
         self.bitcalc = False
@@ -194,13 +382,54 @@ class BloomFilter:
         self.header = "BLOOM:\0\0\0\0"
         self.use_mmap = use_mmap or (array_size > memory_threshold)
         self.mmap_file = mmap_file
+        if backend is None:
+            if self.use_mmap:
+                backend = "mmap"
+            else:
+                backend = "anonymous" if huge_pages or populate else "bitarray"
 
         self.slices = slices
         self.slice_bits = slice_bits
+        if fingerprint_bits < 2 or fingerprint_bits % 2:
+            raise ValueError(f"fingerprint_bits must be even, got {fingerprint_bits}")
+        self.fingerprint_bits = fingerprint_bits
         self.bitset = 0
         self.do_hashes = do_hashing
         self.hits = 0
         self.queryes = 0
+        self.capacity: int | None = None
+        self.error_rate: float | None = None
+        self.shared_mmap: mmap.mmap | None = None
+        self.reload_interval: float | None = None
+        self.verify_reloads = False
+        self._identity: tuple[int, int, int, int] | None = None
+        self._checked_at = 0.0
+        self.storage: Backend | None = None
+        # The kind of backend loaded bits go into, set before load() runs.
+        self.backend = backend
+        self._backend_options: dict[str, Any] = {
+            "filepath": mmap_file,
+            "populate": populate,
+            "huge_pages": huge_pages,
+            "shm_name": shm_name,
+        }
+        self.populate = populate
+        self._faults_at_start = page_faults()
+        # Bits are never cleared by add(), so a positive answer stays valid
+        # until the bits are replaced by load() or reload().
+        self.result_cache: LRUCache[bool] | None = (
+            LRUCache(cache_size) if cache_size > 0 else None
+        )
+        self.digest_cache: LRUCache[list[int]] | None = (
+            LRUCache(digest_cache_size) if digest_cache_size > 0 else None
+        )
+        self.tracker: ChunkTracker | None = None
+        self.tracer = tracer
+        self._leaves: list[bytes] | None = None
+        self._leaves_version = 0
+        # Set once a writable view is handed out, see as_memoryview().
+        self._untracked_views = False
+        self.stored_merkle_root: str | None = None
         try:
             self.hashfunc = blake2b512
         except Exception:
@@ -210,77 +439,538 @@ class BloomFilter:
         if filename is not None and self.load() is True:
             sys.stderr.write("BLOOM: Loaded OK\n")
         else:
-            if self.use_mmap:
-                self.bfilter = MemoryMappedBitArray(
-                    array_size * 8, filepath=self.mmap_file
-                )
-                self.bfilter.setall(False)
+            if layout not in LAYOUTS:
+                raise ValueError(f"Unknown layout: {layout}")
+            self.layout = layout
+            if layout == "partitioned":
+                if fast:
+                    raise ValueError("A partitioned layout needs fast=False")
+                # A caller's buffer can't grow, so its partitions round down.
+                nbytes = partition_bytes(array_size, slices, grow=buffer is None)
+                if nbytes == 0:
+                    raise ValueError(
+                        f"array_size {array_size} is too small for {slices} partitions"
+                    )
+                self.partition_bits = nbytes * 8
+                if buffer is None:
+                    array_size = nbytes * slices
             else:
-                self.bfilter = bitarray.bitarray(array_size * 8, endian="little")
-                self.bfilter.setall(False)
+                self.partition_bits = array_size * 8
+            self.index_mode = self._check_index_mode(index_mode, self.partition_bits)
+            if buffer is not None:
+                self.bfilter = bitarray.bitarray(buffer=buffer, endian="little")
+            else:
+                self.storage = make_backend(
+                    backend, array_size, **self._backend_options
+                )
+                self.bfilter = self.storage.bits
+                if shm_name is not None:
+                    self.bitset = self.bfilter.count()
 
             self.bitcount = array_size * 8
 
-        memory_type = "Memory-mapped" if self.use_mmap else "In-memory"
+        if track_changes:
+            self._track_all()
+
         sys.stderr.write(
             f"BLOOM: filename: {self.filename}, do_hashes: {self.do_hashes}, slices: {self.slices}, "
             f"bits_per_hash: {self.slice_bits}, func:{str(self.hashfunc).split(' ')[1]}, "
-            f"size:{(self.bitcount // 8) / (1024**2):.2f}MB, type: {memory_type}\n"
+            f"size:{(self.bitcount // 8) / (1024**2):.2f}MB, type: {self._memory_type()}\n"
+        )
+
+    def _memory_type(self) -> str:
+        if self.storage is not None:
+            return f"{self.storage.name} backend"
+        return "Memory-mapped" if self.shared_mmap is not None else "In-memory"
+
+    @staticmethod
+    def _check_index_mode(index_mode: str | None, bitcount: int) -> str:
+        power_of_two = bitcount > 0 and bitcount & (bitcount - 1) == 0
+        if index_mode is None:
+            return "mask" if power_of_two else "lemire"
+        if index_mode not in INDEX_MODES:
+            raise ValueError(f"Unknown index_mode: {index_mode}")
+        if index_mode == "mask" and not power_of_two:
+            raise ValueError(
+                f"index_mode 'mask' needs a power of two bit count, got {bitcount}"
+            )
+        return index_mode
+
+    @staticmethod
+    def plan(
+        capacity: int,
+        error_rate: float,
+        hashfunc: Callable[[str], hashlib._Hash] = blake2b512,
+        index_mode: str = "lemire",
+        layout: str = "shared",
+    ) -> FilterPlan:
+        """
+        Computes the optimal bit count and number of hashes for capacity
+        elements at error_rate, and checks the digest of hashfunc has enough
+        bits to derive every index.
+        """
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+        if not 0.0 < error_rate < 1.0:
+            raise ValueError(f"error_rate must be in (0, 1), got {error_rate}")
+        if index_mode not in INDEX_MODES:
+            raise ValueError(f"Unknown index_mode: {index_mode}")
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout: {layout}")
+
+        optimal_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        slices = max(1, round(optimal_bits / capacity * math.log(2)))
+        digest_bits = len(hashfunc("").digest()) * 8
+        # Each hash addresses the whole array, or its own partition of it.
+        parts = slices if layout == "partitioned" else 1
+        index_range = math.ceil(optimal_bits / parts)
+        if index_mode == "mask":
+            # Masking with bitcount - 1 needs a power of two bit count.
+            index_range = max(8, 1 << (index_range - 1).bit_length())
+        else:
+            index_range = max(8, (index_range + 7) // 8 * 8)
+        if layout == "partitioned":
+            index_range = partition_bytes(index_range // 8 * parts, parts) * 8
+        bitcount = index_range * parts
+        needed_bits = (index_range - 1).bit_length()
+        if slices * needed_bits > digest_bits:
+            raise ValueError(
+                f"{slices} hashes of {needed_bits} bits need {slices * needed_bits} digest bits, "
+                f"{hashfunc.__name__} only provides {digest_bits}"
+            )
+        if index_mode == "mask":
+            bits_per_index = needed_bits
+        else:
+            # Wider windows keep the range reduction bias negligible.
+            bits_per_index = max(needed_bits, min(64, digest_bits // slices))
+        slice_bits = slices * bits_per_index
+
+        return FilterPlan(
+            capacity=capacity,
+            error_rate=error_rate,
+            bitcount=bitcount,
+            slices=slices,
+            slice_bits=slice_bits,
+            digest_bits=digest_bits,
+            expected_fpr=false_positive_rate(bitcount, slices, capacity),
+            index_mode=index_mode,
+            layout=layout,
+        )
+
+    @classmethod
+    def for_capacity(
+        cls,
+        capacity: int,
+        error_rate: float,
+        backend: str = "auto",
+        layout: str = "shared",
+        index_mode: str = "lemire",
+        **kwargs: Any,  # noqa: ANN401
+    ) -> BloomFilter:
+        """
+        Creates a filter sized by plan() for capacity elements at error_rate.
+        Expects:
+            backend (str): "auto" (memory_threshold decides) or one of
+                backends.BACKENDS, as in BloomFilter(backend=...)
+            layout (str): "shared", all hashes index the same bit array, or
+                "partitioned", hash i only indexes partition i
+            index_mode (str): "lemire", "mod" or "mask" (power of two sizes)
+        Remaining keyword arguments are passed to BloomFilter().
+        """
+        if backend not in ("auto", *BACKENDS):
+            raise ValueError(f"Unknown backend: {backend}")
+
+        plan = cls.plan(capacity, error_rate, index_mode=index_mode, layout=layout)
+        sys.stderr.write(
+            f"BLOOM: plan: capacity: {plan.capacity}, error_rate: {plan.error_rate}, "
+            f"bits: {plan.bitcount}, hashes: {plan.slices}, "
+            f"memory: {plan.memory_bytes / (1024**2):.2f}MB, "
+            f"expected_fpr: {plan.expected_fpr:.8f}\n"
+        )
+        if backend != "auto":
+            kwargs["backend"] = backend
+        bf = cls(
+            array_size=plan.array_size,
+            slices=plan.slices,
+            slice_bits=plan.slice_bits,
+            index_mode=plan.index_mode,
+            layout=plan.layout,
+            **kwargs,
+        )
+        bf.capacity = plan.capacity
+        bf.error_rate = plan.error_rate
+        return bf
+
+    @classmethod
+    def open_shared(
+        cls,
+        filename: str,
+        reload_interval: float | None = None,
+        populate: bool = False,
+        cache_size: int = 0,
+        verify: bool = False,
+    ) -> BloomFilter:
+        """
+        Opens a file written by save_mapped() read-only. The bits are mapped
+        with MAP_SHARED and PROT_READ, so every process opening the same file
+        shares one copy in the page cache. With reload_interval set, queries
+        check every reload_interval seconds whether the file was replaced and
+        map the new one; add() and update() raise TypeError. populate
+        prefaults the mapping with MAP_POPULATE and cache_size enables the
+        positive result cache, which is cleared on reload. verify checks the
+        stored Merkle root in parallel and raises ValueError on a mismatch;
+        replaced files are then verified before they are mapped on reload.
+        """
+        shared_mmap, meta, identity = cls._map_readonly(filename, populate)
+        # Stored metadata is taken as is: legacy "mask" filters may have any
+        # bit count, which __init__ would reject.
+        bf = _new_filter(cls)
+        bf._reset_runtime()
+        bf._apply_metadata(meta)
+        bf.bfilter = bitarray.bitarray(buffer=shared_mmap, endian="little")
+        if cache_size > 0:
+            bf.result_cache = LRUCache(cache_size)
+        bf.filename = filename
+        bf.shared_mmap = shared_mmap
+        bf._identity = identity
+        bf.reload_interval = reload_interval
+        bf.populate = populate
+        bf.verify_reloads = verify
+        bf._checked_at = time.monotonic()
+        if verify and not bf.verify():
+            bf.close()
+            raise ValueError(f"{filename} is corrupt: Merkle root mismatch")
+        return bf
+
+    @classmethod
+    def open_mapped(
+        cls, filename: str, populate: bool = False, verify: bool = False
+    ) -> BloomFilter:
+        """
+        Maps a file written by save_mapped() read-write with MAP_SHARED:
+        add() writes go to the file through the page cache and the bits are
+        never read into memory as a whole. sync_mapped() flushes them and
+        brings the header up to date. verify checks the stored Merkle root
+        like open_shared() and raises ValueError on a mismatch.
+        """
+        with open(filename, "rb") as f:
+            meta, offset = read_header(f)
+        bf = _new_filter(cls)
+        bf._reset_runtime()
+        bf._apply_metadata(meta)
+        bf.storage = FileMmapBackend(
+            bf.bitcount // 8, filename, populate, offset=offset, create=False
+        )
+        bf.bfilter = bf.storage.bits
+        bf.filename = filename
+        bf.populate = populate
+        if verify and not bf.verify():
+            bf.close()
+            raise ValueError(f"{filename} is corrupt: Merkle root mismatch")
+        return bf
+
+    def sync_mapped(self) -> None:
+        """
+        Flushes a filter opened with open_mapped() and rewrites its header
+        in place with the current bitset and Merkle root.
+        """
+        if not isinstance(self.storage, FileMmapBackend) or self.filename is None:
+            raise ValueError("sync_mapped() needs a filter from open_mapped()")
+        self.storage.flush()
+        meta = self._metadata()
+        meta["merkle_root"] = self.merkle_root()
+        meta["merkle_chunk_size"] = MERKLE_CHUNK_SIZE
+        rewrite_header(self.filename, meta)
+        self.stored_merkle_root = meta["merkle_root"]
+
+    @staticmethod
+    def _map_readonly(
+        filename: str, populate: bool = False
+    ) -> tuple[mmap.mmap, dict[str, Any], tuple[int, int, int, int]]:
+        flags = mmap.MAP_SHARED
+        if populate:
+            flags |= getattr(mmap, "MAP_POPULATE", 0)
+        with open(filename, "rb") as f:
+            meta, offset = read_header(f)
+            st = os.fstat(f.fileno())
+            shared_mmap = mmap.mmap(
+                f.fileno(),
+                int(meta["bitcount"]) // 8,
+                flags=flags,
+                prot=mmap.PROT_READ,
+                offset=offset,
+            )
+        return shared_mmap, meta, (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def reload(self, verify: bool | None = None) -> bool:
+        """
+        Maps the file again if it was replaced since it was opened with
+        open_shared(). Returns True if a new filter was mapped. With verify
+        (by default the verify option of open_shared()) a new file whose
+        Merkle root does not match is not mapped and the old one is kept.
+        """
+        if self.shared_mmap is None or self.filename is None:
+            return False
+        if verify is None:
+            verify = self.verify_reloads
+        try:
+            if file_identity(self.filename) == self._identity:
+                return False
+            shared_mmap, meta, identity = self._map_readonly(
+                self.filename, self.populate
+            )
+        except (OSError, ValueError) as e:
+            sys.stderr.write(f"BLOOM: Error reloading filter: {str(e)}\n")
+            return False
+        if verify and not self._verify_mapping(shared_mmap, meta):
+            shared_mmap.close()
+            sys.stderr.write(f"BLOOM: Not reloading corrupt {self.filename}\n")
+            return False
+        old_mmap = self.shared_mmap
+        self.clear_cache()
+        self._apply_metadata(meta)
+        self.bfilter = bitarray.bitarray(buffer=shared_mmap, endian="little")
+        self.shared_mmap = shared_mmap
+        self._identity = identity
+        if self.tracker is not None:
+            self._track_all()
+        old_mmap.close()
+        sys.stderr.write(f"BLOOM: Reloaded {self.filename}\n")
+        return True
+
+    def _verify_mapping(self, shared_mmap: mmap.mmap, meta: dict[str, Any]) -> bool:
+        # verify() on a throwaway filter over the new mapping, so a corrupt
+        # file never replaces the bits being queried.
+        candidate = _new_filter(type(self))
+        candidate._reset_runtime()
+        candidate._apply_metadata(meta)
+        candidate.bfilter = bitarray.bitarray(buffer=shared_mmap, endian="little")
+        try:
+            return candidate.verify()
+        except ValueError as e:
+            sys.stderr.write(f"BLOOM: Error verifying filter: {str(e)}\n")
+            return False
+        finally:
+            del candidate.bfilter
+
+    def _maybe_reload(self) -> None:
+        assert self.reload_interval is not None
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            self._checked_at = now
+            self.reload()
+
+    def _metadata(self) -> dict[str, Any]:
+        return {
+            "bitcount": self.bitcount,
+            "slices": self.slices,
+            "slice_bits": self.slice_bits,
+            "fast": self.fast,
+            "do_hashes": self.do_hashes,
+            "data_is_hex": self.data_is_hex,
+            "hashfunc": self.hashfunc.__name__,
+            "index_mode": self.index_mode,
+            "layout": self.layout,
+            "partition_bits": self.partition_bits,
+            "fingerprint_bits": self.fingerprint_bits,
+            "bitset": self.bitset,
+            "capacity": self.capacity,
+            "error_rate": self.error_rate,
+        }
+
+    def _apply_metadata(self, meta: dict[str, Any]) -> None:
+        self.bitcount = int(meta["bitcount"])
+        self.slices = int(meta["slices"])
+        self.slice_bits = int(meta["slice_bits"])
+        self.fast = bool(meta["fast"])
+        self.do_hashes = bool(meta["do_hashes"])
+        self.data_is_hex = bool(meta["data_is_hex"])
+        self.hashfunc = HASHFUNCS[meta["hashfunc"]]
+        self.index_mode = meta["index_mode"]
+        self.layout = meta["layout"]
+        self.partition_bits = int(meta["partition_bits"])
+        self.fingerprint_bits = int(meta.get("fingerprint_bits", 64))
+        self.bitset = int(meta["bitset"])
+        self.capacity = meta.get("capacity")
+        self.error_rate = meta.get("error_rate")
+        # A root over chunks of another size cannot be checked.
+        self.stored_merkle_root = (
+            meta.get("merkle_root")
+            if meta.get("merkle_chunk_size") == MERKLE_CHUNK_SIZE
+            else None
+        )
+
+    def _mapping(self) -> mmap.mmap | None:
+        if self.storage is not None:
+            return self.storage.mapping
+        return self.shared_mmap
+
+    def advise(self, pattern: str) -> bool:
+        """
+        Tells the kernel how the mapped bits will be accessed: "random" for
+        the query path (disables readahead), "sequential" or "normal".
+        Returns False for in-memory filters or unsupported platforms.
+        """
+        options = {
+            "random": "MADV_RANDOM",
+            "sequential": "MADV_SEQUENTIAL",
+            "normal": "MADV_NORMAL",
+        }
+        if pattern not in options:
+            raise ValueError(f"Unknown access pattern: {pattern}")
+        mapping = self._mapping()
+        if mapping is None:
+            return False
+        return madvise(mapping, options[pattern])
+
+    def warm(self) -> None:
+        """
+        Pulls the whole filter into memory before serving queries, so the
+        first queries don't pay for cold page faults.
+        """
+        start = time.monotonic()
+        mapping = self._mapping()
+        if mapping is not None and not madvise(mapping, "MADV_POPULATE_READ"):
+            madvise(mapping, "MADV_WILLNEED")
+        # Touch one byte per page in order, which also works where the
+        # madvise hints are missing.
+        view = self._buffer()
+        bytes(view[:: mmap.PAGESIZE])
+        view.release()
+        sys.stderr.write(
+            f"BLOOM: Warmed {(self.bitcount // 8) / (1024**2):.2f}MB in "
+            f"{time.monotonic() - start:.3f}s\n"
+        )
+
+    def page_faults(self) -> tuple[int, int]:
+        """
+        Minor and major page faults of the process since the filter was
+        created; the counters are process wide.
+        """
+        minor, major = page_faults()
+        return (
+            minor - self._faults_at_start[0],
+            major - self._faults_at_start[1],
         )
 
     def len(self) -> int:
         return len(self.bfilter)
 
+    def expected_fpr(self, count: int | None = None) -> float:
+        """
+        Theoretical false positive rate after count insertions, by default
+        the capacity the filter was planned for.
+        """
+        if count is None:
+            count = self.capacity if self.capacity is not None else 0
+        slices = 1 if self.fast else self.slices
+        return false_positive_rate(self.bitcount, slices, count)
+
     def calc_capacity(self, error_rate: float, capacity: int) -> int:
-        hashes = int(math.ceil(math.log(1.0 / error_rate, 2)))
-        bits_per_hash = int(
-            math.ceil(
-                (capacity * abs(math.log(error_rate)))
-                / (self.slices * (math.log(2) ** 2))
-            )
-        )
-        bitcount = bits_per_hash * hashes
+        plan = self.plan(capacity, error_rate, self.hashfunc)
         sys.stderr.write(
-            f"Hashes: {self.slices}, bit_per_hash: {self.slice_bits} bitcount: {bitcount}\n"
+            f"Hashes: {plan.slices}, bit_per_hash: {plan.bits_per_index} bitcount: {plan.bitcount}\n"
         )
-        return bitcount
+        return plan.bitcount
 
     def calc_entropy(self) -> float:
-        self.entropy = shannon_entropy(self.bfilter.tobytes())
+        view = self._buffer()
+        self.entropy = shannon_entropy(view)
+        view.release()
         sys.stderr.write(f"Entropy: {self.entropy:1.8f}\n")
         return self.entropy
 
     def calc_hashid(self) -> str:
-        data = self.bfilter.tobytes()
-        self.hashid = self.hashfunc(str(data))
-        del data
-        hex_digest: str = self.hashid.hexdigest()[:8]
+        self.hashid = self.merkle_root()
+        hex_digest = self.hashid[:8]
         result = f"BLOOM: HASHID: {hex_digest}\n"
         sys.stderr.write(result)
         return hex_digest
 
+    def _merkle_leaves(self, workers: int = 1) -> list[bytes]:
+        # With a change tracker (track_changes) only the leaves over chunks
+        # written since the last call are rehashed. None is started here:
+        # that would turn export_delta() into deltas and slow every add().
+        view = self._buffer()
+        count = -(-len(view) // MERKLE_CHUNK_SIZE)
+        leaves = None if self._untracked_views else self._leaves
+        if self.tracker is None or leaves is None or len(leaves) != count:
+            leaves = [b""] * count
+            dirty: list[int] = list(range(count))
+        else:
+            stale: set[int] = set()
+            for chunk in self.tracker.changed_since(self._leaves_version):
+                start, end = self.tracker.span(chunk)
+                stale.update(
+                    range(
+                        start // MERKLE_CHUNK_SIZE, (end - 1) // MERKLE_CHUNK_SIZE + 1
+                    )
+                )
+            dirty = sorted(stale)
+        digests = hash_chunks(view, MERKLE_CHUNK_SIZE, dirty, workers)
+        view.release()
+        for leaf, digest in zip(dirty, digests):
+            leaves[leaf] = digest
+        if self.tracker is not None:
+            self._leaves_version = self.tracker.advance()
+            self._leaves = leaves
+        return leaves
+
+    def merkle_root(self, workers: int = 1) -> str:
+        """
+        Returns the hex Merkle root of the bits, over MERKLE_CHUNK_SIZE
+        chunks. With track_changes, leaves are kept between calls and only
+        the chunks written since are rehashed, so calling it again on a large
+        filter is cheap; bits changed behind the filter's back (through
+        bfilter directly) are not seen then. Otherwise every chunk is hashed.
+        """
+        return merkle_root(self._merkle_leaves(workers)).hex()
+
+    def verify(self, workers: int | None = None) -> bool:
+        """
+        Rehashes every chunk, with workers threads (one per CPU when None),
+        and checks the root against the one stored by save_mapped().
+        """
+        if self.stored_merkle_root is None:
+            raise ValueError("The filter has no stored Merkle root to verify")
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self._leaves = None
+        ok = self.merkle_root(workers) == self.stored_merkle_root
+        if not ok:
+            sys.stderr.write("BLOOM: Merkle root mismatch, the filter is corrupt\n")
+        return ok
+
     def _raw_merge(self, other: BloomFilter) -> None:
+        if self.shared_mmap is not None:
+            raise ValueError("Cannot merge into a read-only shared filter")
         if self.merging is False:
             self.merging = True
             sys.stderr.write("BLOOM: Merging...\n")
             if len(other.bfilter) == len(self.bfilter):
-                a = bytearray(self.bfilter.tobytes())
-                b = bytearray(other.bfilter.tobytes())
-                if tqdm is not None:
-                    iterator = tqdm(range(0, len(a)))
-                else:
-                    iterator = range(0, len(a))
-                for i in iterator:
-                    a[i] |= b[i]
-
-                if self.use_mmap:
-                    self.bfilter.frombytes(bytes(a))
+                theirs = other._buffer()
+                if self.storage is not None:
+                    self.storage.or_(theirs)
                 else:
-                    bfilternew = bitarray.bitarray(endian="little")
-                    bfilternew.frombytes(bytes(a))
-                    self.bfilter = bfilternew
-
-                del a, b
+                    # OR in place through bitarray views over both buffers,
+                    # a chunk at a time for the progress bar.
+                    view = self._buffer()
+                    iterator = range(0, len(view), MERGE_CHUNK_SIZE)
+                    if tqdm is not None:
+                        iterator = tqdm(iterator)
+                    for start in iterator:
+                        end = start + MERGE_CHUNK_SIZE
+                        target = bitarray.bitarray(
+                            buffer=view[start:end], endian="little"
+                        )
+                        target |= bitarray.bitarray(
+                            buffer=theirs[start:end], endian="little"
+                        )
+                        del target
+                    view.release()
+                theirs.release()
+                if self.tracker is not None:
+                    self._track_all()
                 sys.stderr.write("BLOOM: Merged Ok\n")
             else:
                 sys.stderr.write(
@@ -288,40 +978,206 @@ class BloomFilter:
                 )
             self.merging = False
 
+    def _check_conformable(self, other: BloomFilter) -> None:
+        mine = (self.bitcount, self.slices, self.fast, self.layout, self.index_mode)
+        theirs = (
+            other.bitcount,
+            other.slices,
+            other.fast,
+            other.layout,
+            other.index_mode,
+        )
+        if mine != theirs or self.hashfunc is not other.hashfunc:
+            raise ValueError(f"filters are not conformable: {mine} - {theirs}")
+
+    def _overlap_counts(
+        self, other: BloomFilter, chunk_size: int = 1024**2
+    ) -> tuple[int, int, int, int]:
+        """
+        Popcounts of self, other, self | other and self & other, computed
+        chunk_size bytes at a time over views of both buffers.
+        """
+        self._check_conformable(other)
+        a_view = self._buffer()
+        b_view = other._buffer()
+        count_a = count_b = count_or = count_and = 0
+        for start in range(0, len(a_view), chunk_size):
+            a = bitarray.bitarray(
+                buffer=a_view[start : start + chunk_size], endian="little"
+            )
+            b = bitarray.bitarray(
+                buffer=b_view[start : start + chunk_size], endian="little"
+            )
+            count_a += a.count()
+            count_b += b.count()
+            count_or += bitarray.util.count_or(a, b)
+            count_and += bitarray.util.count_and(a, b)
+            del a, b
+        a_view.release()
+        b_view.release()
+        return count_a, count_b, count_or, count_and
+
+    def _cardinality(self, bits_set: int) -> float:
+        # Swamidass & Baldi: n = -(m / k) * ln(1 - X / m)
+        slices = 1 if self.fast else self.slices
+        if bits_set >= self.bitcount:
+            return float("inf")
+        return -(self.bitcount / slices) * math.log(1.0 - bits_set / self.bitcount)
+
+    def estimate_cardinality(self) -> float:
+        """
+        Estimated number of distinct values added, from the bits set.
+        """
+        view = self._buffer()
+        bits_set = bitarray.bitarray(buffer=view, endian="little").count()
+        view.release()
+        return self._cardinality(bits_set)
+
+    def compare(self, other: BloomFilter) -> dict[str, float]:
+        """
+        Estimates the overlap of two conformable filters in one pass, without
+        building the union or intersection filters:
+            cardinality, other_cardinality, union, intersection,
+            jaccard: intersection / union,
+            containment: intersection / cardinality (share of self in other)
+        """
+        count_a, count_b, count_or, count_and = self._overlap_counts(other)
+        n_a = self._cardinality(count_a)
+        n_b = self._cardinality(count_b)
+        union = self._cardinality(count_or)
+        if union == float("inf"):
+            intersection = 0.0
+        else:
+            # Inclusion-exclusion, bounded by the bits set in both filters
+            # (which also counts bits that collide by chance).
+            intersection = max(0.0, n_a + n_b - union)
+            intersection = min(intersection, self._cardinality(count_and))
+        return {
+            "cardinality": n_a,
+            "other_cardinality": n_b,
+            "union": union,
+            "intersection": intersection,
+            "jaccard": intersection / union if union > 0 else 0.0,
+            "containment": intersection / n_a if n_a > 0 else 0.0,
+        }
+
+    def union_cardinality(self, other: BloomFilter) -> float:
+        return self.compare(other)["union"]
+
+    def intersection_cardinality(self, other: BloomFilter) -> float:
+        return self.compare(other)["intersection"]
+
+    def jaccard(self, other: BloomFilter) -> float:
+        return self.compare(other)["jaccard"]
+
+    def containment(self, other: BloomFilter) -> float:
+        return self.compare(other)["containment"]
+
     def __add__(self, other_filter: BloomFilter) -> BloomFilter:
         self._raw_merge(other_filter)
         return self
 
-    def _hash(self, value: str) -> Generator[int, None, None]:
+    def _digest(self, value: Key) -> int:
         if self.do_hashes:
-            digest = int.from_bytes(self.hashfunc(value).digest(), "big")
-        elif self.data_is_hex:
-            digest = int(value, 16)
-        else:
-            try:
-                digest = int(binascii.hexlify(value.encode("utf8")), 16)
-            except Exception:
-                digest = int(binascii.hexlify(value.encode()), 16)
+            return int.from_bytes(self.hashfunc(value).digest(), "big")
+        if isinstance(value, str):
+            if self.data_is_hex:
+                return int(value, 16)
+            return int.from_bytes(value.encode("utf8"), "big")
+        if self.data_is_hex:
+            return int(bytes(value), 16)
+        return int.from_bytes(value, "big")
+
+    def _hash(self, value: Key) -> Generator[int, None, None]:
+        return self._digest_indices(self._digest(value))
+
+    def _digest_indices(self, digest: int) -> Generator[int, None, None]:
         if self.fast:
             yield digest % self.bitcount
-        else:
+            return
+
+        # In the partitioned layout hash i is offset into partition i.
+        size = self.partition_bits
+        step = size if self.layout == "partitioned" else 0
+        shift = int(self.slice_bits / self.slices)
+        base = 0
+        if self.index_mode == "mask":
             for _ in range(0, self.slices):
-                yield digest & (self.bitcount - 1)
-                digest >>= int(self.slice_bits / self.slices)
-
-    def add(self, value: str) -> None:
+                yield base + (digest & (size - 1))
+                digest >>= shift
+                base += step
+        else:
+            # Each index takes a window of the digest that is at least as wide
+            # as the index range, reduced to [0, size) without masking.
+            width = max(shift, (size - 1).bit_length())
+            window = (1 << width) - 1
+            if self.index_mode == "lemire":
+                for _ in range(0, self.slices):
+                    yield base + (((digest & window) * size) >> width)
+                    digest >>= shift
+                    base += step
+            else:
+                for _ in range(0, self.slices):
+                    yield base + (digest & window) % size
+                    digest >>= shift
+                    base += step
+
+    def _indices(self, value: Key) -> list[int]:
+        if self.digest_cache is None:
+            return list(self._hash(value))
+        hash_list = self.digest_cache.get(value)
+        if hash_list is None:
+            hash_list = list(self._hash(value))
+            self.digest_cache.put(value, hash_list)
+        return hash_list
+
+    def clear_cache(self) -> None:
+        if self.result_cache is not None:
+            self.result_cache.clear()
+        if self.digest_cache is not None:
+            self.digest_cache.clear()
+
+    def cache_stats(self) -> dict[str, dict[str, int]]:
+        stats = {}
+        if self.result_cache is not None:
+            stats["result"] = self.result_cache.stats()
+        if self.digest_cache is not None:
+            stats["digest"] = self.digest_cache.stats()
+        return stats
+
+    def add(self, value: Key) -> None:
         if not self.saving and not self.loading and not self.merging:
-            hash_gen = self._hash(value)
-            self._add(hash_gen)
+            if self.tracer is not None and self.tracer.sample():
+                self._traced("add", value)
+            elif self.digest_cache is None:
+                self._add(self._hash(value))
+            else:
+                self._add(self._indices(value))
 
     def _add(self, hash_iter: Iterable[int]) -> None:
+        if self.tracker is not None:
+            hash_iter = list(hash_iter)
+            self.tracker.mark_bits(hash_iter)
         for digest in hash_iter:
             self.bfilter[digest] = True
         self.bitset += 1 if self.fast else self.slices
 
-    def query(self, value: str) -> bool:
-        hash_gen = self._hash(value)
-        return self._query(hash_gen)
+    def query(self, value: Key) -> bool:
+        if self.reload_interval is not None:
+            self._maybe_reload()
+        if self.result_cache is not None and self.result_cache.get(value):
+            self.hits += 1
+            self.queryes += 1
+            return True
+        if self.tracer is not None and self.tracer.sample():
+            ret = self._traced("query", value)
+        elif self.digest_cache is None:
+            ret = self._query(self._hash(value))
+        else:
+            ret = self._query(self._indices(value))
+        if ret and self.result_cache is not None:
+            self.result_cache.put(value, True)
+        return ret
 
     def _query(self, hash_iter: Iterable[int]) -> bool:
         ret = all(self.bfilter[digest] for digest in hash_iter)
@@ -330,18 +1186,357 @@ class BloomFilter:
         self.queryes += 1
         return ret
 
-    def __getitem__(self, value: str) -> bool:
+    def __getitem__(self, value: Key) -> bool:
         return self.query(value)
 
-    def update(self, value: str) -> bool:
+    def _buffer(self) -> memoryview:
+        return memoryview(self.bfilter)
+
+    def as_memoryview(self) -> memoryview:
+        """
+        Zero-copy view of the live bits, 8 bits per byte, little-endian
+        within a byte. Writes through it change the filter; it is read-only
+        for shared filters. Release it before close().
+        The change tracker can't see those writes, so from then on
+        merkle_root() rehashes every chunk and tracked export_delta() sends
+        every chunk.
+        """
+        view = self._buffer()
+        if not view.readonly:
+            self._untracked_views = True
+            self._leaves = None
+        return view
+
+    def as_numpy(self) -> Any:  # noqa: ANN401
+        """
+        The live bits as a uint8 NumPy array sharing the filter's memory,
+        see as_memoryview().
+        """
+        if np is None:
+            raise ValueError("as_numpy() needs numpy installed")
+        return np.frombuffer(self.as_memoryview(), dtype=np.uint8)
+
+    def partition(self, index: int) -> bitarray.bitarray:
+        """
+        Returns a bitarray sharing memory with partition index of a
+        partitioned filter, so it can be scanned on its own. Partitions of a
+        granule or more start on mmap.ALLOCATIONGRANULARITY boundaries of a
+        mapped filter and of its save_mapped() file, so they can also be
+        madvised or mapped on their own. Drop the view before closing the
+        filter.
+        """
+        if self.layout != "partitioned":
+            raise ValueError("partition() needs a partitioned layout")
+        if not 0 <= index < self.slices:
+            raise IndexError(f"Partition {index} out of range")
+        nbytes = self.partition_bits // 8
+        view = self.as_memoryview()[index * nbytes : (index + 1) * nbytes]
+        return bitarray.bitarray(buffer=view, endian="little")
+
+    def _sort_pages(self, page_sorted: bool | None) -> bool:
+        # Sorting pays off when bits live in pages that may not be resident.
+        if page_sorted is None:
+            return self._mapping() is not None
+        return page_sorted
+
+    def add_batch(self, values: Iterable[Key], page_sorted: bool | None = None) -> None:
+        """
+        Adds every value. With page_sorted (the default for mapped filters)
+        the bits are set in index order, one page after the other; a
+        partitioned filter is written one partition at a time.
+        """
+        if self.saving or self.loading or self.merging:
+            return
+        hashes = [self._indices(value) for value in values]
+        self._add_hashes(hashes, self._sort_pages(page_sorted))
+
+    def _add_hashes(self, hashes: list[list[int]], page_sorted: bool) -> None:
+        bits = self.bfilter
+        if self.layout == "partitioned":
+            for i in range(self.slices):
+                column = [hash_list[i] for hash_list in hashes]
+                for digest in sorted(column) if page_sorted else column:
+                    bits[digest] = True
+        else:
+            flat = [digest for hash_list in hashes for digest in hash_list]
+            for digest in sorted(set(flat)) if page_sorted else flat:
+                bits[digest] = True
+        del bits
+        if self.tracker is not None:
+            for hash_list in hashes:
+                self.tracker.mark_bits(hash_list)
+        self.bitset += (1 if self.fast else self.slices) * len(hashes)
+
+    def query_batch(
+        self, values: Iterable[Key], page_sorted: bool | None = None
+    ) -> list[bool]:
+        """
+        Queries every value. With page_sorted (the default for mapped filters)
+        the bits of the whole batch are tested in index order and the
+        answers mapped back to the order of values. A partitioned filter is
+        scanned one partition at a time and keys are dropped as soon as one
+        of their bits is unset, so most negatives never touch the later
+        partitions.
+        """
+        if self.reload_interval is not None:
+            self._maybe_reload()
+        hashes = [self._indices(value) for value in values]
+        return self._query_hashes(hashes, self._sort_pages(page_sorted))
+
+    def _query_hashes(self, hashes: list[list[int]], page_sorted: bool) -> list[bool]:
+        bits = self.bfilter
+        if self.layout == "partitioned":
+            alive = list(range(len(hashes)))
+            for i in range(self.slices):
+                if not alive:
+                    break
+                if page_sorted:
+                    alive.sort(key=lambda j: hashes[j][i])
+                alive = [j for j in alive if bits[hashes[j][i]]]
+            result = [False] * len(hashes)
+            for j in alive:
+                result[j] = True
+        elif page_sorted:
+            flat = [digest for hash_list in hashes for digest in hash_list]
+            width = len(hashes[0]) if hashes else 1
+            missing = bytearray(len(hashes))
+            for pos in sorted(range(len(flat)), key=flat.__getitem__):
+                if not bits[flat[pos]]:
+                    missing[pos // width] = 1
+            result = [not miss for miss in missing]
+        else:
+            result = [all(bits[d] for d in hash_list) for hash_list in hashes]
+        del bits
+        self.hits += sum(result)
+        self.queryes += len(result)
+        return result
+
+    def update_batch(
+        self, values: Iterable[Key], page_sorted: bool | None = None
+    ) -> list[bool]:
+        """
+        update() for every value, with the same answers as calling it in a
+        loop (a value repeated in the batch is seen the second time) but
+        every distinct bit is read and written once, in page order when
+        page_sorted.
+        """
+        if self.saving or self.loading or self.merging:
+            return []
+        hashes = [self._indices(value) for value in values]
+        return self._update_hashes(hashes, self._sort_pages(page_sorted))
+
+    def dedup(
+        self,
+        records: Iterable[T],
+        key: Callable[[T], Key] | None = None,
+        batch_size: int = 1024,
+        page_sorted: bool | None = None,
+    ) -> Generator[T, None, None]:
+        """
+        Yields the records whose key (key(record), or the record itself) was
+        not in the filter and adds it, like `if not bf.update(k): yield r`.
+        Records are read batch_size at a time and each batch goes through one
+        update_batch(), so a key repeated within a batch is yielded once. The
+        next batch is read only after the consumer has taken this one.
+        Raises RuntimeError when a batch arrives while the filter is being
+        saved, loaded or merged, since its keys could be neither tested nor
+        added; the records of that batch are not yielded.
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        records = iter(records)
+        while batch := list(itertools.islice(records, batch_size)):
+            keys = batch if key is None else [key(record) for record in batch]
+            seen = self.update_batch(keys, page_sorted)  # type: ignore[arg-type]
+            if not seen:
+                raise RuntimeError(
+                    "Cannot dedup while the filter is being saved, loaded or merged"
+                )
+            for record, present in zip(batch, seen, strict=True):
+                if not present:
+                    yield record
+
+    def _update_hashes(self, hashes: list[list[int]], page_sorted: bool) -> list[bool]:
+        # Before key j runs, a bit is set if it was set before the batch or
+        # belongs to an earlier key of the batch: earlier keys that were
+        # already present only have bits that were set anyway.
+        first: dict[int, int] = {}
+        for j, hash_list in enumerate(hashes):
+            for digest in hash_list:
+                first.setdefault(digest, j)
+        order = sorted(first) if page_sorted else list(first)
+        bits = self.bfilter
+        before = {digest: bits[digest] for digest in order}
+        result = [
+            all(before[digest] or first[digest] < j for digest in hash_list)
+            for j, hash_list in enumerate(hashes)
+        ]
+        for digest in order:
+            bits[digest] = True
+        del bits
+        if self.tracker is not None:
+            self.tracker.mark_bits(digest for digest in order if not before[digest])
+        added = len(result) - sum(result)
+        self.bitset += (1 if self.fast else self.slices) * added
+        self.hits += len(result) - added
+        self.queryes += len(result)
+        return result
+
+    def _traced(self, op: str, value: Key) -> bool:
+        # The add/query/update path of a sampled call, timed per stage.
+        tracer = self.tracer
+        assert tracer is not None
+        start = time.perf_counter_ns()
+        if self.digest_cache is None:
+            digest = self._digest(value)
+            hashed = time.perf_counter_ns()
+            hash_list = list(self._digest_indices(digest))
+            indexed = time.perf_counter_ns()
+            tracer.record(f"{op};hash", hashed - start)
+            tracer.record(f"{op};index", indexed - hashed)
+        else:
+            hash_list = self._indices(value)
+            indexed = time.perf_counter_ns()
+            tracer.record(f"{op};cached_indices", indexed - start)
+        if op == "add":
+            self._add(hash_list)
+            result = True
+        else:
+            result = self._query(hash_list)
+            if op == "update" and not result:
+                self._add(hash_list)
+        end = time.perf_counter_ns()
+        tracer.record(f"{op};bits", end - indexed)
+        tracer.record(op, end - start)
+        return result
+
+    def update(self, value: Key) -> bool:
         if not self.saving and not self.loading and not self.merging:
-            hash_list = list(self._hash(value))
+            if self.result_cache is not None and self.result_cache.get(value):
+                self.hits += 1
+                self.queryes += 1
+                return True
+            if self.tracer is not None and self.tracer.sample():
+                r = self._traced("update", value)
+            else:
+                hash_list = self._indices(value)
+                r = self._query(iter(hash_list))
+                if r is False:
+                    self._add(iter(hash_list))
+            if self.result_cache is not None:
+                # Either way the value is in the filter now.
+                self.result_cache.put(value, True)
+            return r
+        return False
+
+    def _check_fingerprint_range(self) -> None:
+        # Each index is derived from half of the fingerprint, which can only
+        # reach 2 ** half positions: larger ranges would silently leave bits
+        # unused and raise the false positive rate.
+        size = self.bitcount if self.fast else self.partition_bits
+        if (size - 1).bit_length() > self.fingerprint_bits // 2:
+            raise ValueError(
+                f"{self.fingerprint_bits} bit fingerprints index at most "
+                f"2**{self.fingerprint_bits // 2} bits, the filter has {size}; "
+                f"use fingerprint_bits={2 * (size - 1).bit_length()} or more"
+            )
+
+    def _fingerprint_indices(self, fingerprint: int) -> list[int]:
+        # Double hashing (Kirsch-Mitzenmacher): index i comes from
+        # h1 + i * h2, where h1 and h2 are the two halves of the fingerprint,
+        # reduced to the index range with a multiply-shift.
+        self._check_fingerprint_range()
+        half = self.fingerprint_bits // 2
+        mask = (1 << half) - 1
+        h1 = fingerprint & mask
+        h2 = ((fingerprint >> half) & mask) | 1
+        if self.fast:
+            return [((h1 * self.bitcount) >> half)]
+        size = self.partition_bits
+        step = size if self.layout == "partitioned" else 0
+        return [
+            i * step + ((((h1 + i * h2) & mask) * size) >> half)
+            for i in range(self.slices)
+        ]
+
+    def _fingerprint_rows(self, fingerprints: Iterable[int]) -> list[list[int]]:
+        self._check_fingerprint_range()
+        size = self.bitcount if self.fast else self.partition_bits
+        if (
+            np is not None
+            and isinstance(fingerprints, np.ndarray)
+            and self.fingerprint_bits == 64
+            and size <= 1 << 32
+        ):
+            # Same arithmetic as _fingerprint_indices on uint64 lanes; the
+            # products fit because both factors are below 2**32.
+            arr = fingerprints.astype(np.uint64, copy=False)
+            mask = np.uint64(0xFFFFFFFF)
+            shift = np.uint64(32)
+            h1 = arr & mask
+            h2 = ((arr >> shift) & mask) | np.uint64(1)
+            slices = 1 if self.fast else self.slices
+            step = size if self.layout == "partitioned" else 0
+            columns = [
+                (((h1 + np.uint64(i) * h2) & mask) * np.uint64(size) >> shift)
+                + np.uint64(i * step)
+                for i in range(slices)
+            ]
+            rows: list[list[int]] = np.stack(columns, axis=1).tolist()
+            return rows
+        return [self._fingerprint_indices(int(fp)) for fp in fingerprints]
+
+    def add_fingerprint(self, fingerprint: int) -> None:
+        """
+        Adds a key by a precomputed hash of fingerprint_bits bits instead of
+        hashing a value. A key must always be given the same way: its
+        fingerprint and its value map to different bits.
+        """
+        if not self.saving and not self.loading and not self.merging:
+            self._add(self._fingerprint_indices(fingerprint))
+
+    def query_fingerprint(self, fingerprint: int) -> bool:
+        if self.reload_interval is not None:
+            self._maybe_reload()
+        return self._query(self._fingerprint_indices(fingerprint))
+
+    def update_fingerprint(self, fingerprint: int) -> bool:
+        if not self.saving and not self.loading and not self.merging:
+            hash_list = self._fingerprint_indices(fingerprint)
             r = self._query(iter(hash_list))
             if r is False:
                 self._add(iter(hash_list))
             return r
         return False
 
+    def add_fingerprints(
+        self, fingerprints: Iterable[int], page_sorted: bool | None = None
+    ) -> None:
+        """
+        add_batch() for precomputed hashes, a NumPy uint64 array is turned
+        into bit indices without a Python loop per key.
+        """
+        if self.saving or self.loading or self.merging:
+            return
+        rows = self._fingerprint_rows(fingerprints)
+        self._add_hashes(rows, self._sort_pages(page_sorted))
+
+    def query_fingerprints(
+        self, fingerprints: Iterable[int], page_sorted: bool | None = None
+    ) -> list[bool]:
+        if self.reload_interval is not None:
+            self._maybe_reload()
+        rows = self._fingerprint_rows(fingerprints)
+        return self._query_hashes(rows, self._sort_pages(page_sorted))
+
+    def update_fingerprints(
+        self, fingerprints: Iterable[int], page_sorted: bool | None = None
+    ) -> list[bool]:
+        if self.saving or self.loading or self.merging:
+            return []
+        rows = self._fingerprint_rows(fingerprints)
+        return self._update_hashes(rows, self._sort_pages(page_sorted))
+
     def load(self, filename: str | None = None) -> bool:
         if not self.loading:
             self.loading = True
@@ -350,27 +1545,16 @@ class BloomFilter:
 
             try:
                 assert self.filename is not None
-                loaded_filter: Any = decompress_pickle(self.filename)
-                self.do_hashes = loaded_filter.do_hashes
-                self.data_is_hex = loaded_filter.data_is_hex
-                self.slices = loaded_filter.slices
-                self.slice_bits = loaded_filter.slice_bits
-                self.hashfunc = loaded_filter.hashfunc
-                self.bitcount = loaded_filter.bitcount
-                self.bitset = loaded_filter.bitset
-                self.fast = loaded_filter.fast
-
-                if hasattr(loaded_filter, "use_mmap"):
-                    self.use_mmap = loaded_filter.use_mmap
-
-                if self.use_mmap:
-                    self.bfilter = MemoryMappedBitArray(
-                        self.bitcount, filepath=self.mmap_file
-                    )
-                    self.bfilter.frombytes(loaded_filter.bfilter.tobytes())
-                else:
-                    self.bfilter = loaded_filter.bfilter
-
+                self.clear_cache()
+                if is_mapfile(self.filename):
+                    self._load_mapfile(self.filename)
+                    if self.tracker is not None:
+                        self._track_all()
+                    self.loading = False
+                    return True
+                self._load_pickle(self.filename)
+                if self.tracker is not None:
+                    self._track_all()
                 self.loading = False
                 return True
             except Exception as e:
@@ -379,6 +1563,278 @@ class BloomFilter:
                 return False
         return False
 
+    @staticmethod
+    def _state_metadata(state: dict[str, Any]) -> dict[str, Any]:
+        # Metadata of a pickled filter, with the defaults of attributes that
+        # older versions did not have.
+        bitcount = int(state["bitcount"])
+        hashfunc = state["hashfunc"]
+        return {
+            "bitcount": bitcount,
+            "slices": state["slices"],
+            "slice_bits": state["slice_bits"],
+            "fast": state["fast"],
+            "do_hashes": state["do_hashes"],
+            "data_is_hex": state["data_is_hex"],
+            "hashfunc": hashfunc if isinstance(hashfunc, str) else hashfunc.__name__,
+            "index_mode": state.get("index_mode", "mask"),
+            "layout": state.get("layout", "shared"),
+            "partition_bits": state.get("partition_bits", bitcount),
+            "fingerprint_bits": state.get("fingerprint_bits", 64),
+            "bitset": state.get("bitset", 0),
+            "capacity": state.get("capacity"),
+            "error_rate": state.get("error_rate"),
+        }
+
+    def _load_pickle(self, filename: str) -> None:
+        # The bits are streamed from the pickle straight into a new backend.
+        state = load_legacy(filename, self._replace_storage)
+        self._apply_metadata(self._state_metadata(state))
+
+    @staticmethod
+    def convert(source: str, destination: str, chunk_size: int = 1024**2) -> None:
+        """
+        Rewrites a filter saved by save() in the mapped format. The pickle
+        is decoded as a stream and its bits copied chunk by chunk into a
+        mapping of the destination, so memory use does not depend on the
+        filter size. The destination is replaced atomically.
+        """
+        # The header is written last, at the start of the first allocation
+        # unit, so the payload goes right after it.
+        offset = mmap.ALLOCATIONGRANULARITY
+        directory = os.path.dirname(os.path.abspath(destination))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".bloommap-")
+        storage: FileMmapBackend | None = None
+        try:
+            with os.fdopen(fd, "r+b") as f:
+
+                def sink(nbytes: int) -> memoryview:
+                    nonlocal storage
+                    storage = FileMmapBackend(nbytes, tmp, offset=offset, keep=True)
+                    return storage.buffer()
+
+                state = load_legacy(source, sink, chunk_size)
+                meta = BloomFilter._state_metadata(state)
+                if storage is not None:
+                    view = storage.buffer()
+                    leaves = hash_chunks(
+                        view,
+                        MERKLE_CHUNK_SIZE,
+                        range(-(-len(view) // MERKLE_CHUNK_SIZE)),
+                    )
+                    view.release()
+                    meta["merkle_root"] = merkle_root(leaves).hex()
+                    meta["merkle_chunk_size"] = MERKLE_CHUNK_SIZE
+                    storage.close()
+                header, header_offset = encode_header(meta)
+                if header_offset != offset:
+                    raise ValueError("Filter metadata does not fit the header")
+                f.seek(0)
+                f.write(header)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, destination)
+        except BaseException:
+            if storage is not None:
+                storage.close()
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        sys.stderr.write(f"BLOOM: Converted {source} to {destination}\n")
+
+    def _load_mapfile(self, filename: str) -> None:
+        with open(filename, "rb") as f:
+            meta, offset = read_header(f)
+            self._apply_metadata(meta)
+            f.seek(offset)
+            view = self._replace_storage(self.bitcount // 8)
+            chunk = 1024**2
+            for start in range(0, len(view), chunk):
+                f.readinto(view[start : start + chunk])
+            view.release()
+
+    def __getstate__(self) -> tuple[dict[str, Any], bytes]:
+        view = self._buffer()
+        bits = view.tobytes()
+        view.release()
+        return self._metadata(), bits
+
+    def __reduce_ex__(self, protocol: Any) -> tuple[Any, ...]:  # noqa: ANN401
+        """
+        Pickles the metadata header and the raw bits. With protocol 5 the
+        bits go as a PickleBuffer over the filter's own memory: written
+        without an intermediate copy in-band, or handed to buffer_callback
+        out-of-band so they can be shipped (or placed in shared memory)
+        without being serialized at all.
+        """
+        if protocol < 5:
+            return _new_filter, (type(self),), self.__getstate__()
+        bits = pickle.PickleBuffer(self._buffer())
+        return _new_filter, (type(self),), (self._metadata(), bits)
+
+    def __setstate__(self, state: Any) -> None:  # noqa: ANN401
+        self._reset_runtime()
+        if isinstance(state, dict):
+            # Pickles written before __reduce_ex__ hold the whole __dict__.
+            self.__dict__.update(state)
+            bitcount = self.__dict__.get("bitcount", len(self.bfilter))
+            self.__dict__.setdefault("index_mode", "mask")
+            self.__dict__.setdefault("layout", "shared")
+            self.__dict__.setdefault("partition_bits", bitcount)
+            self.__dict__.setdefault("fingerprint_bits", 64)
+            self.__dict__.setdefault("capacity", None)
+            self.__dict__.setdefault("error_rate", None)
+            return
+        meta, bits = state
+        self._apply_metadata(meta)
+        if memoryview(bits).readonly:
+            self.bfilter = bitarray.bitarray(endian="little")
+            self.bfilter.frombytes(bits if isinstance(bits, bytes) else bytes(bits))
+        else:
+            # A writable buffer (in-band bytearray or an out-of-band buffer)
+            # is used in place.
+            self.bfilter = bitarray.bitarray(buffer=bits, endian="little")
+
+    def _reset_runtime(self) -> None:
+        # State that belongs to one process and is not pickled.
+        self.saving = False
+        self.loading = False
+        self.bitcalc = False
+        self.merging = False
+        self.header = "BLOOM:\0\0\0\0"
+        self.use_mmap = False
+        self.mmap_file = None
+        self.filename = None
+        self.hits = 0
+        self.queryes = 0
+        self.shared_mmap = None
+        self.reload_interval = None
+        self.verify_reloads = False
+        self._identity = None
+        self._checked_at = 0.0
+        self.storage = None
+        self.backend = "bitarray"
+        self._backend_options = {}
+        self.populate = False
+        self._faults_at_start = page_faults()
+        self.result_cache = None
+        self.digest_cache = None
+        self.tracker = None
+        self.tracer = None
+        self._leaves = None
+        self._leaves_version = 0
+        self._untracked_views = False
+        self.stored_merkle_root = None
+
+    def _track_all(self) -> None:
+        # Every chunk counts as changed, for new, loaded or merged bits.
+        nbytes = self.bitcount // 8
+        if self.tracker is None or self.tracker.nbytes != nbytes:
+            self.tracker = ChunkTracker(nbytes, DELTA_CHUNK_SIZE)
+        self.tracker.mark_all()
+
+    def _delta_metadata(self) -> dict[str, Any]:
+        return {
+            "bitcount": self.bitcount,
+            "slices": self.slices,
+            "fast": self.fast,
+            "hashfunc": self.hashfunc.__name__,
+            "index_mode": self.index_mode,
+            "layout": self.layout,
+        }
+
+    def export_delta(self, since: int = 0, base: BloomFilter | None = None) -> bytes:
+        """
+        Returns the chunks of the bit array a replica needs, bz2 compressed
+        with the metadata to check and apply them:
+            - with track_changes, the chunks written after version since
+            - with base, the chunks that differ from that snapshot
+            - otherwise every chunk that has a bit set
+        The blob carries the version to pass as since on the next export,
+        apply_delta() returns it on the replica.
+        """
+        view = self._buffer()
+        nbytes = len(view)
+        chunk_size = DELTA_CHUNK_SIZE
+        version = 0
+        if self.tracker is not None and base is None:
+            if self._untracked_views:
+                self.tracker.mark_all()
+            chunk_size = self.tracker.chunk_size
+            chunks = self.tracker.changed_since(since)
+            version = self.tracker.advance()
+        elif base is not None:
+            self._check_conformable(base)
+            base_view = base._buffer()
+            chunks = [
+                chunk
+                for chunk, start in enumerate(range(0, nbytes, chunk_size))
+                if view[start : start + chunk_size]
+                != base_view[start : start + chunk_size]
+            ]
+            base_view.release()
+        else:
+            chunks = [
+                chunk
+                for chunk, start in enumerate(range(0, nbytes, chunk_size))
+                if bitarray.bitarray(
+                    buffer=view[start : start + chunk_size], endian="little"
+                ).any()
+            ]
+        payload = [
+            view[chunk * chunk_size : (chunk + 1) * chunk_size].tobytes()
+            for chunk in chunks
+        ]
+        view.release()
+        meta = self._delta_metadata()
+        meta.update(
+            {
+                "version": version,
+                "since": since,
+                "chunk_size": chunk_size,
+                "chunks": chunks,
+                "bitset": self.bitset,
+            }
+        )
+        blob = encode_delta(meta, payload)
+        sys.stderr.write(
+            f"BLOOM: Delta of {len(chunks)} chunks, {len(blob)} bytes, version {version}\n"
+        )
+        return blob
+
+    def apply_delta(self, blob: bytes) -> int:
+        """
+        ORs the chunks of a delta from export_delta() into this filter and
+        returns the version it carries.
+        """
+        meta, payload = decode_delta(blob)
+        mine = self._delta_metadata()
+        theirs = {key: meta[key] for key in mine}
+        if mine != theirs:
+            raise ValueError(f"delta is not conformable: {mine} - {theirs}")
+        if self.shared_mmap is not None:
+            raise ValueError("Cannot apply a delta to a read-only shared filter")
+        chunk_size = int(meta["chunk_size"])
+        view = self._buffer()
+        pos = 0
+        for chunk in meta["chunks"]:
+            start = chunk * chunk_size
+            end = min(start + chunk_size, len(view))
+            target = bitarray.bitarray(buffer=view[start:end], endian="little")
+            target |= bitarray.bitarray(
+                buffer=payload[pos : pos + end - start], endian="little"
+            )
+            del target
+            pos += end - start
+            if self.tracker is not None:
+                self.tracker.mark_bits(
+                    range(start * 8, end * 8, self.tracker.chunk_size * 8)
+                )
+        view.release()
+        payload.release()
+        self.bitset = max(self.bitset, int(meta["bitset"]))
+        return int(meta["version"])
+
     def save(self, filename: str | None = None) -> bool:
         if self.saving:
             return False
@@ -392,12 +1848,8 @@ class BloomFilter:
             self.filename = filename
 
         try:
-            if (
-                self.use_mmap
-                and hasattr(self.bfilter, "mmap")
-                and self.bfilter.mmap is not None
-            ):
-                self.bfilter.mmap.flush()
+            if self.storage is not None:
+                self.storage.flush()
 
             assert self.filename is not None
             compress_pickle(self.filename, self)
@@ -408,6 +1860,38 @@ class BloomFilter:
             self.saving = False
             return False
 
+    def save_mapped(self, filename: str | None = None) -> bool:
+        """
+        Saves the filter uncompressed with a small header, in the format
+        open_shared() maps. The file is replaced atomically.
+        """
+        if self.saving:
+            return False
+
+        if filename is None and self.filename is None:
+            sys.stderr.write("A Filename must be provided\n")
+            return False
+
+        self.saving = True
+        if filename is not None:
+            self.filename = filename
+
+        try:
+            assert self.filename is not None
+            meta = self._metadata()
+            meta["merkle_root"] = self.merkle_root()
+            meta["merkle_chunk_size"] = MERKLE_CHUNK_SIZE
+            view = self._buffer()
+            write_mapfile(self.filename, meta, view)
+            view.release()
+            self.stored_merkle_root = meta["merkle_root"]
+            self.saving = False
+            return True
+        except Exception as e:
+            sys.stderr.write(f"BLOOM: Error saving filter: {str(e)}\n")
+            self.saving = False
+            return False
+
     def stat(self) -> None:
         if self.bitcalc:
             sys.stderr.write(
@@ -421,20 +1905,51 @@ class BloomFilter:
         bytes_ = (self.bitcount - self.bitset) / 8.0
         mfree = bytes_ / (1024**2)
         sys.stderr.write(f"BLOOM: Free: {int(mfree)} Megs\n")
+        minor, major = self.page_faults()
+        sys.stderr.write(f"BLOOM: Page faults: minor: {minor}, major: {major}\n")
+        for name, cache in self.cache_stats().items():
+            sys.stderr.write(
+                f"BLOOM: {name} cache: {cache['size']} of {cache['maxsize']}, "
+                f"hits: {cache['hits']}, misses: {cache['misses']}, "
+                f"evictions: {cache['evictions']}\n"
+            )
+        if self.tracer is not None:
+            self.tracer.dump()
 
     def info(self) -> None:
-        memory_type = "Memory-mapped" if self.use_mmap else "In-memory"
         sys.stderr.write(
             f"BLOOM: filename: {self.filename}, do_hashes: {self.do_hashes}, slices: {self.slices}, "
-            f"bits_per_slice: {self.slice_bits}, fast: {self.fast}, type: {memory_type}\n"
+            f"bits_per_slice: {self.slice_bits}, fast: {self.fast}, "
+            f"index_mode: {self.index_mode}, layout: {self.layout}, type: {self._memory_type()}\n"
         )
         self.calc_hashid()
         self.calc_entropy()
         self.stat()
 
+    def _close_storage(self) -> None:
+        if self.storage is not None:
+            if hasattr(self, "bfilter"):
+                del self.bfilter
+            self.storage.close()
+            self.storage = None
+
+    def _replace_storage(self, nbytes: int) -> memoryview:
+        # Loaded bits go into a new backend of the same kind.
+        name = self.storage.name if self.storage is not None else self.backend
+        self._close_storage()
+        self.storage = make_backend(name, nbytes, **self._backend_options)
+        self.bfilter = self.storage.bits
+        return self.storage.buffer()
+
     def close(self) -> None:
-        if hasattr(self, "bfilter") and hasattr(self.bfilter, "close"):
-            self.bfilter.close()
+        if getattr(self, "storage", None) is not None:
+            self._close_storage()
+        if getattr(self, "shared_mmap", None) is not None:
+            assert self.shared_mmap is not None
+            if hasattr(self, "bfilter"):
+                del self.bfilter
+            self.shared_mmap.close()
+            self.shared_mmap = None
 
     def __del__(self) -> None:
         self.close()
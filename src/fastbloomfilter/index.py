@@ -0,0 +1,241 @@
+"""
+Many conformable Bloom filters stored bit-sliced: row b holds bit b of
+every filter, one bit per slot. A key is hashed once and the k rows of its
+bits are ANDed, which gives every filter that may hold the key at once.
+"""
+
+from __future__ import annotations
+
+import mmap
+import sys
+from typing import TYPE_CHECKING, Any
+
+import bitarray
+
+from fastbloomfilter.bloom import BloomFilter, Key, _new_filter
+from fastbloomfilter.lib.mapfile import INDEX_MAGIC, read_header, write_mapfile
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+# Metadata that must match for filters to share an index.
+_CONFORMANCE = (
+    "bitcount",
+    "slices",
+    "slice_bits",
+    "fast",
+    "do_hashes",
+    "data_is_hex",
+    "hashfunc",
+    "index_mode",
+    "layout",
+    "partition_bits",
+)
+
+
+class FilterIndex:
+    def __init__(self, width: int = 64) -> None:
+        """
+        Expects:
+            width (int): number of filter slots per row, rounded up to a
+                multiple of 8 and grown by add_filter() when full
+        """
+        self.width = max(8, (width + 7) // 8 * 8)
+        self.names: list[str | None] = []
+        self.meta: dict[str, Any] | None = None
+        self.hasher: BloomFilter | None = None
+        self.bits: bitarray.bitarray | None = None
+        self.mapping: mmap.mmap | None = None
+
+    @classmethod
+    def from_filters(
+        cls, filters: Iterable[BloomFilter], names: Iterable[str] | None = None
+    ) -> FilterIndex:
+        filters = list(filters)
+        index = cls(width=len(filters))
+        name_list = list(names) if names is not None else [None] * len(filters)
+        for bf, name in zip(filters, name_list):
+            index.add_filter(bf, name)
+        return index
+
+    def __len__(self) -> int:
+        return sum(name is not None for name in self.names)
+
+    def _set_meta(self, meta: dict[str, Any]) -> None:
+        self.meta = {key: meta[key] for key in _CONFORMANCE}
+        # Only the index derivation of the filters is needed for lookups.
+        hasher = _new_filter(BloomFilter)
+        hasher._reset_runtime()
+        hasher._apply_metadata(meta)
+        self.hasher = hasher
+
+    def _check_writable(self) -> None:
+        if self.mapping is not None:
+            raise ValueError("A mapped FilterIndex is read-only, load() it to modify")
+
+    def _grow(self, width: int) -> None:
+        assert self.bits is not None and self.meta is not None
+        bits = bitarray.bitarray(self.meta["bitcount"] * width, endian="little")
+        bits.setall(False)
+        for slot in range(len(self.names)):
+            bits[slot::width] = self.bits[slot :: self.width]
+        self.bits = bits
+        self.width = width
+
+    def add_filter(self, bf: BloomFilter, name: str | None = None) -> int:
+        """
+        Copies the bits of bf into a free slot and returns the slot.
+        """
+        self._check_writable()
+        meta = bf._metadata()
+        if self.meta is None:
+            self._set_meta(meta)
+            self.bits = bitarray.bitarray(
+                meta["bitcount"] * self.width, endian="little"
+            )
+            self.bits.setall(False)
+        else:
+            theirs = {key: meta[key] for key in _CONFORMANCE}
+            if theirs != self.meta:
+                raise ValueError(f"filters are not conformable: {self.meta} - {theirs}")
+        assert self.bits is not None
+        if None in self.names:
+            slot = self.names.index(None)
+        else:
+            slot = len(self.names)
+            if slot == self.width:
+                self._grow(self.width * 2)
+            self.names.append(None)
+        self.names[slot] = name if name is not None else str(slot)
+        # A strided slice writes column slot of every row in one C loop.
+        self.bits[slot :: self.width] = bf.bfilter
+        return slot
+
+    def _slot(self, key: int | str) -> int:
+        if isinstance(key, int):
+            if not 0 <= key < len(self.names) or self.names[key] is None:
+                raise KeyError(key)
+            return key
+        try:
+            return self.names.index(key)
+        except ValueError:
+            raise KeyError(key) from None
+
+    def remove_filter(self, key: int | str) -> None:
+        """
+        Clears the slot of a filter, by slot number or name, for reuse.
+        """
+        self._check_writable()
+        slot = self._slot(key)
+        assert self.bits is not None
+        self.bits[slot :: self.width] = False
+        self.names[slot] = None
+
+    def get_filter(self, key: int | str) -> BloomFilter:
+        """
+        Rebuilds an in-memory BloomFilter from the bits of one slot.
+        """
+        slot = self._slot(key)
+        assert self.bits is not None and self.hasher is not None
+        bf = _new_filter(BloomFilter)
+        bf._reset_runtime()
+        bf._apply_metadata(self.hasher._metadata())
+        bf.bfilter = self.bits[slot :: self.width]
+        bf.bitset = bf.bfilter.count()
+        return bf
+
+    def _lookup(self, hash_list: Iterable[int]) -> list[str]:
+        assert self.bits is not None
+        width = self.width
+        match: bitarray.bitarray | None = None
+        for digest in hash_list:
+            row = self.bits[digest * width : (digest + 1) * width]
+            if match is None:
+                match = row
+            else:
+                match &= row
+            if not match.any():
+                return []
+        if match is None:
+            return []
+        names: list[str] = []
+        for slot in match.search(1):
+            name = self.names[slot] if slot < len(self.names) else None
+            if name is not None:
+                names.append(name)
+        return names
+
+    def lookup(self, value: Key) -> list[str]:
+        """
+        Returns the names of the filters that may contain value.
+        """
+        if self.hasher is None:
+            return []
+        return self._lookup(self.hasher._hash(value))
+
+    def lookup_batch(self, values: Iterable[Key]) -> list[list[str]]:
+        return [self.lookup(value) for value in values]
+
+    def save(self, filename: str) -> None:
+        """
+        Writes the index in the mapped filter format under its own magic, so
+        it is never read as a filter: the filter metadata plus the width and
+        slot names in the header, then the rows.
+        """
+        if self.bits is None or self.hasher is None:
+            raise ValueError("Cannot save an empty FilterIndex")
+        meta = self.hasher._metadata()
+        meta.update({"index_width": self.width, "index_names": self.names})
+        view = memoryview(self.bits)
+        write_mapfile(filename, meta, view, INDEX_MAGIC)
+        view.release()
+
+    @classmethod
+    def open(cls, filename: str) -> FilterIndex:
+        """
+        Maps a saved index read-only; rows are paged in as lookups touch them.
+        """
+        with open(filename, "rb") as f:
+            meta, offset = read_header(f, INDEX_MAGIC)
+            width = int(meta["index_width"])
+            mapping = mmap.mmap(
+                f.fileno(),
+                int(meta["bitcount"]) * width // 8,
+                prot=mmap.PROT_READ,
+                offset=offset,
+            )
+        index = cls(width)
+        index._set_meta(meta)
+        index.names = list(meta["index_names"])
+        index.mapping = mapping
+        index.bits = bitarray.bitarray(buffer=mapping, endian="little")
+        sys.stderr.write(
+            f"BLOOM: Mapped index of {len(index)} filters from {filename}\n"
+        )
+        return index
+
+    @classmethod
+    def load(cls, filename: str) -> FilterIndex:
+        """
+        Reads a saved index into memory, where filters can be added or
+        removed.
+        """
+        with open(filename, "rb") as f:
+            meta, offset = read_header(f, INDEX_MAGIC)
+            width = int(meta["index_width"])
+            index = cls(width)
+            index._set_meta(meta)
+            index.names = list(meta["index_names"])
+            f.seek(offset)
+            index.bits = bitarray.bitarray(endian="little")
+            index.bits.fromfile(f, int(meta["bitcount"]) * width // 8)
+        return index
+
+    def close(self) -> None:
+        if self.mapping is not None:
+            self.bits = None
+            self.mapping.close()
+            self.mapping = None
+
+    def __del__(self) -> None:
+        self.close()
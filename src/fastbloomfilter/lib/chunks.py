@@ -0,0 +1,56 @@
+from array import array
+from collections.abc import Iterable
+
+
+class ChunkTracker:
+    """
+    Remembers, for every chunk_size byte chunk of a bit array, the epoch of
+    its last write. Writes are stamped with the current epoch and advance()
+    starts a new one, so the chunks changed after a given epoch can be
+    listed without comparing the bits.
+    """
+
+    def __init__(self, nbytes: int, chunk_size: int = 64 * 1024) -> None:
+        if chunk_size <= 0 or chunk_size & (chunk_size - 1):
+            raise ValueError(f"chunk_size must be a power of two, got {chunk_size}")
+        self.nbytes = nbytes
+        self.chunk_size = chunk_size
+        # Bit index >> shift is the chunk holding that bit.
+        self.shift = (chunk_size * 8).bit_length() - 1
+        self.epoch = 1
+        self.epochs = array("Q", bytes(8 * self.chunks))
+
+    @property
+    def chunks(self) -> int:
+        return (self.nbytes + self.chunk_size - 1) // self.chunk_size
+
+    def mark(self, bit: int) -> None:
+        self.epochs[bit >> self.shift] = self.epoch
+
+    def mark_bits(self, bits: Iterable[int]) -> None:
+        epochs, epoch, shift = self.epochs, self.epoch, self.shift
+        for bit in bits:
+            epochs[bit >> shift] = epoch
+
+    def mark_chunk(self, chunk: int) -> None:
+        self.epochs[chunk] = self.epoch
+
+    def mark_all(self) -> None:
+        for chunk in range(self.chunks):
+            self.epochs[chunk] = self.epoch
+
+    def changed_since(self, epoch: int) -> list[int]:
+        return [chunk for chunk, stamp in enumerate(self.epochs) if stamp > epoch]
+
+    def advance(self) -> int:
+        """
+        Closes the current epoch and returns it, later writes are stamped
+        with the next one.
+        """
+        closed = self.epoch
+        self.epoch += 1
+        return closed
+
+    def span(self, chunk: int) -> tuple[int, int]:
+        start = chunk * self.chunk_size
+        return start, min(start + self.chunk_size, self.nbytes)
@@ -0,0 +1,34 @@
+import bz2
+import json
+import struct
+from typing import Any
+
+DELTA_MAGIC = b"BLOOMDLT"
+DELTA_VERSION = 1
+_PREFIX = struct.Struct("<8sII")
+
+
+def encode_delta(meta: dict[str, Any], chunks: list[bytes]) -> bytes:
+    """
+    Packs a JSON header (meta, which lists the chunk numbers) and the chunk
+    bytes back to back, bz2 compressed.
+    """
+    header = json.dumps(meta, sort_keys=True).encode("utf8")
+    prefix = _PREFIX.pack(DELTA_MAGIC, DELTA_VERSION, len(header))
+    compressor = bz2.BZ2Compressor()
+    parts = [compressor.compress(prefix), compressor.compress(header)]
+    parts.extend(compressor.compress(chunk) for chunk in chunks)
+    parts.append(compressor.flush())
+    return b"".join(parts)
+
+
+def decode_delta(blob: bytes) -> tuple[dict[str, Any], memoryview]:
+    data = bz2.decompress(blob)
+    magic, version, header_len = _PREFIX.unpack_from(data)
+    if magic != DELTA_MAGIC:
+        raise ValueError("Not a bloom filter delta")
+    if version > DELTA_VERSION:
+        raise ValueError(f"Unsupported delta version: {version}")
+    start = _PREFIX.size
+    meta: dict[str, Any] = json.loads(data[start : start + header_len].decode("utf8"))
+    return meta, memoryview(data)[start + header_len :]
@@ -0,0 +1,150 @@
+"""
+Streaming reader for filters pickled by save(). The pickle is decoded
+opcode by opcode and the bit payload is copied chunk by chunk into a buffer
+given by the caller (a mapping of the destination file, usually), so the
+filter is never held in memory as a whole.
+"""
+
+import bz2
+import pickle
+from collections.abc import Callable
+from struct import unpack
+from typing import IO, Any
+
+CHUNK_SIZE = 1024**2
+
+# Byte value with its bits in reverse order, for big-endian bitarrays.
+REVERSE_BITS = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+# Classes and functions the filter pickles refer to, in the current package
+# and in the original fastBloomFilter one.
+_FILTER_MODULES = ("fastbloomfilter.bloom", "fastBloomFilter.bloom")
+_HASH_NAMES = ("blake2b512", "sha3", "sha256")
+
+Sink = Callable[[int], memoryview]
+
+# The pure Python unpickler, whose opcode handlers can be replaced.
+_PyUnpickler: Any = pickle._Unpickler
+
+
+class _Payload:
+    """
+    Stands for a bytes object that was streamed into the sink.
+    """
+
+    def __init__(self, nbytes: int) -> None:
+        self.nbytes = nbytes
+
+
+class LegacyState:
+    """
+    Stands for the pickled filter, whatever its class, and keeps its state.
+    """
+
+    state: dict[str, Any]
+
+    def __setstate__(self, state: Any) -> None:  # noqa: ANN401
+        if isinstance(state, tuple):
+            # Written by BloomFilter.__reduce_ex__: (metadata, bits).
+            meta, _ = state
+            self.state = dict(meta)
+        else:
+            self.state = dict(state)
+        self.state.pop("bfilter", None)
+
+
+def _new_state(_cls: type) -> LegacyState:
+    return LegacyState()
+
+
+class StreamingUnpickler(_PyUnpickler):
+    dispatch = dict(_PyUnpickler.dispatch)
+
+    def __init__(
+        self, file: IO[bytes], sink: Sink, chunk_size: int = CHUNK_SIZE
+    ) -> None:
+        super().__init__(file)
+        self.sink = sink
+        self.chunk_size = chunk_size
+        self.target: memoryview | None = None
+        self.endian = "little"
+
+    def _open_target(self, nbytes: int) -> memoryview:
+        if self.target is not None:
+            raise pickle.UnpicklingError("More than one bit payload in the pickle")
+        self.target = self.sink(nbytes)
+        if len(self.target) != nbytes:
+            raise pickle.UnpicklingError(
+                f"Sink holds {len(self.target)} bytes, payload has {nbytes}"
+            )
+        return self.target
+
+    def _stream(self, nbytes: int) -> None:
+        target = self._open_target(nbytes)
+        for start in range(0, nbytes, self.chunk_size):
+            self.readinto(target[start : start + self.chunk_size])
+        self.append(_Payload(nbytes))
+
+    def load_binbytes(self) -> None:
+        (nbytes,) = unpack("<I", self.read(4))
+        self._stream(nbytes)
+
+    def load_binbytes8(self) -> None:
+        (nbytes,) = unpack("<Q", self.read(8))
+        self._stream(nbytes)
+
+    dispatch[pickle.BINBYTES[0]] = load_binbytes
+    dispatch[pickle.BINBYTES8[0]] = load_binbytes8
+    dispatch[pickle.BYTEARRAY8[0]] = load_binbytes8
+
+    def find_class(self, module: str, name: str) -> Any:  # noqa: ANN401
+        if name == "_bitarray_reconstructor":
+            return self._reconstruct_bits
+        if module in _FILTER_MODULES:
+            if name in ("BloomFilter", "_new_filter"):
+                return LegacyState if name == "BloomFilter" else _new_state
+            if name in _HASH_NAMES:
+                return name
+        return super().find_class(module, name)
+
+    def _reconstruct_bits(
+        self,
+        _cls: type,
+        data: _Payload | bytes,
+        endian: str = "big",
+        _padbits: int = 0,
+        _readonly: int = 0,
+    ) -> _Payload:
+        if isinstance(data, bytes):
+            # Small payloads are not worth streaming.
+            self._open_target(len(data))[:] = data
+            data = _Payload(len(data))
+        self.endian = endian
+        return data
+
+
+def _reverse_bits(view: memoryview, chunk_size: int) -> None:
+    for start in range(0, len(view), chunk_size):
+        chunk = view[start : start + chunk_size]
+        chunk[:] = chunk.tobytes().translate(REVERSE_BITS)
+        chunk.release()
+
+
+def load_legacy(
+    filename: str, sink: Sink, chunk_size: int = CHUNK_SIZE
+) -> dict[str, Any]:
+    """
+    Reads a filter saved by save() and returns its state, with the bits
+    written little-endian into sink(nbytes). Hash functions are returned
+    by name.
+    """
+    with bz2.BZ2File(filename, "rb") as f:
+        unpickler = StreamingUnpickler(f, sink, chunk_size)
+        result = unpickler.load()
+        target = unpickler.target
+    if not isinstance(result, LegacyState) or target is None:
+        raise ValueError(f"{filename} does not hold a pickled filter")
+    if unpickler.endian == "big":
+        _reverse_bits(target, chunk_size)
+    target.release()
+    return result.state
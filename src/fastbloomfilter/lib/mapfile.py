@@ -0,0 +1,104 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from typing import IO, Any
+
+MAGIC = b"BLOOMMAP"
+INDEX_MAGIC = b"BLOOMIDX"
+ROTATING_MAGIC = b"BLOOMROT"
+_KINDS = {
+    MAGIC: "mapped bloom filter",
+    INDEX_MAGIC: "filter index",
+    ROTATING_MAGIC: "rotating filter",
+}
+VERSION = 1
+_PREFIX = struct.Struct("<8sII")
+
+
+def payload_offset(header_len: int) -> int:
+    # The payload starts on an allocation boundary so it can be mapped on
+    # its own with mmap(..., offset=payload_offset).
+    size = _PREFIX.size + header_len
+    granularity = mmap.ALLOCATIONGRANULARITY
+    return (size + granularity - 1) // granularity * granularity
+
+
+def is_mapfile(filename: str) -> bool:
+    try:
+        with open(filename, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def read_header(f: IO[bytes], kind: bytes = MAGIC) -> tuple[dict[str, Any], int]:
+    f.seek(0)
+    magic, version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+    if magic != kind:
+        if magic in _KINDS:
+            raise ValueError(f"File is a {_KINDS[magic]}, not a {_KINDS[kind]}")
+        raise ValueError(f"Not a {_KINDS[kind]} file")
+    if version > VERSION:
+        raise ValueError(f"Unsupported mapped file version: {version}")
+    meta: dict[str, Any] = json.loads(f.read(header_len).decode("utf8"))
+    return meta, payload_offset(header_len)
+
+
+def encode_header(meta: dict[str, object], kind: bytes = MAGIC) -> tuple[bytes, int]:
+    header = json.dumps(meta, sort_keys=True).encode("utf8")
+    offset = payload_offset(len(header))
+    prefix = _PREFIX.pack(kind, VERSION, len(header)) + header
+    return prefix + b"\x00" * (offset - len(prefix)), offset
+
+
+def atomic_write(filename: str, *chunks: bytes | memoryview) -> None:
+    """
+    Writes chunks to a temporary file next to filename and renames it into
+    place, so readers of filename never see a partial file.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".bloommap-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def write_mapfile(
+    filename: str, meta: dict[str, object], payload: memoryview, kind: bytes = MAGIC
+) -> None:
+    header, _ = encode_header(meta, kind)
+    atomic_write(filename, header, payload)
+    sys.stderr.write(f"BLOOM: wrote mapped filter {filename}\n")
+
+
+def rewrite_header(filename: str, meta: dict[str, object]) -> None:
+    """
+    Writes new metadata over the header of a mapped file in place, for a
+    payload that was changed through a writable mapping. The header must
+    keep its payload offset.
+    """
+    header, offset = encode_header(meta)
+    with open(filename, "r+b") as f:
+        _, current = read_header(f)
+        if offset != current:
+            raise ValueError("New metadata does not fit the header")
+        f.seek(0)
+        f.write(header)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def file_identity(filename: str) -> tuple[int, int, int, int]:
+    st = os.stat(filename)
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
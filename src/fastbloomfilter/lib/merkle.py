@@ -0,0 +1,55 @@
+"""
+Merkle tree over fixed-size chunks of a bit array. Each chunk is hashed to
+a leaf and the leaves are hashed pairwise up to a root, so a filter that
+changed in a few chunks only needs those leaves rehashed to get its new
+root.
+"""
+
+import hashlib
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+
+MERKLE_CHUNK_SIZE = 1024**2
+DIGEST_SIZE = 32
+
+
+def leaf_digest(chunk: memoryview) -> bytes:
+    return hashlib.blake2b(chunk, digest_size=DIGEST_SIZE).digest()
+
+
+def hash_chunks(
+    view: memoryview, chunk_size: int, chunks: Iterable[int], workers: int = 1
+) -> list[bytes]:
+    """
+    Leaf digests of the given chunks of view. hashlib releases the GIL on
+    large inputs, so several workers hash chunks in parallel.
+    """
+
+    def digest(chunk: int) -> bytes:
+        return leaf_digest(view[chunk * chunk_size : (chunk + 1) * chunk_size])
+
+    chunks = list(chunks)
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(digest, chunks))
+    return [digest(chunk) for chunk in chunks]
+
+
+def merkle_root(leaves: list[bytes]) -> bytes:
+    """
+    Hashes pairs of nodes level by level; an odd node is carried up as is.
+    """
+    if not leaves:
+        return leaf_digest(memoryview(b""))
+    level = leaves
+    while len(level) > 1:
+        parents = [
+            hashlib.blake2b(
+                level[i] + level[i + 1], digest_size=DIGEST_SIZE, person=b"node"
+            ).digest()
+            for i in range(0, len(level) - 1, 2)
+        ]
+        if len(level) % 2:
+            parents.append(level[-1])
+        level = parents
+    return level[0]
@@ -1,12 +1,14 @@
 import _pickle
 import bz2
+import pickle
 import sys
 
 
 def compress_pickle(filename: str, data: object) -> None:
     sys.stderr.write(f"loading pickle {filename}...\n")
     with bz2.BZ2File(filename, "w") as f:
-        _pickle.dump(data, f)
+        # Protocol 5 writes PickleBuffer payloads straight from memory.
+        _pickle.dump(data, f, protocol=5)
 
 
 def decompress_pickle(filename: str) -> object:
@@ -14,3 +16,18 @@ def decompress_pickle(filename: str) -> object:
     data = bz2.BZ2File(filename, "rb")
     data = _pickle.load(data)
     return data
+
+
+def dumps_out_of_band(data: object) -> tuple[bytes, list[pickle.PickleBuffer]]:
+    """
+    Pickles data with protocol 5 and returns the large buffers apart from
+    the pickle, so they can be sent or copied into shared memory as they
+    are. They reference the original memory: use them before it changes.
+    """
+    buffers: list[pickle.PickleBuffer] = []
+    header = pickle.dumps(data, protocol=5, buffer_callback=buffers.append)
+    return header, buffers
+
+
+def loads_out_of_band(header: bytes, buffers: list[pickle.PickleBuffer]) -> object:
+    return pickle.loads(header, buffers=buffers)
@@ -1,17 +1,19 @@
 import sys
 from collections.abc import Callable
 from functools import wraps
-from time import time
+from time import perf_counter
 
 
 def timing(f: Callable[..., object]) -> Callable[..., object]:
     @wraps(f)
     def wrap(*args: object, **kw: object) -> object:
-        ts = time()
+        ts = perf_counter()
         result = f(*args, **kw)
-        te = time()
+        te = perf_counter()
+        # Argument types only: the repr of a filter is its whole bit array.
+        arg_types = ", ".join(type(arg).__name__ for arg in args)
         sys.stderr.write(
-            f"func:{f.__name__!r} args:{args!r}, {kw!r} took: {te - ts:2.4f} sec\n"
+            f"func:{f.__name__!r} args:({arg_types}) kwargs:{sorted(kw)} took: {te - ts:2.4f} sec\n"
         )
         return result
 
@@ -0,0 +1,161 @@
+"""
+Sampling tracer for the per-key hot path. One call in sample_every is timed
+stage by stage with perf_counter_ns; the other calls only pay for a counter.
+Timings go into log-linear (HDR style) histograms, keyed by collapsed stacks
+such as "query;hash", so they can be read as percentiles or fed to a flame
+graph.
+"""
+
+import sys
+from typing import IO
+
+
+class Histogram:
+    """
+    Counts values in buckets whose width grows with the value, so every
+    value is kept within 1 / 2**sub_bucket_bits of its size in a few
+    hundred buckets, whatever the range.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 5) -> None:
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_buckets = 1 << sub_bucket_bits
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def _bucket(self, value: int) -> int:
+        if value < 2 * self.sub_buckets:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits - 1
+        return shift * self.sub_buckets + (value >> shift)
+
+    def _highest(self, bucket: int) -> int:
+        # Largest value that falls in bucket.
+        if bucket < 2 * self.sub_buckets:
+            return bucket
+        shift = bucket // self.sub_buckets - 1
+        mantissa = bucket - shift * self.sub_buckets
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value: int) -> None:
+        value = max(value, 0)
+        bucket = self._bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q: float) -> int:
+        """
+        Value below which q percent of the recorded values fall, rounded up
+        to its bucket.
+        """
+        if self.count == 0:
+            return 0
+        rank = max(1, -(-q * self.count // 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self._highest(bucket), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other: "Histogram") -> None:
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Histograms with different precision")
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        if other.count:
+            self.min = other.min if not self.count else min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+
+class Tracer:
+    def __init__(self, sample_every: int = 1000, sub_bucket_bits: int = 5) -> None:
+        """
+        Expects:
+            sample_every (int): time one call in sample_every, 1 times all
+            sub_bucket_bits (int): histogram precision, 5 keeps values
+                within about 3%
+        """
+        if sample_every < 1:
+            raise ValueError(f"sample_every must be positive, got {sample_every}")
+        self.sample_every = sample_every
+        self.sub_bucket_bits = sub_bucket_bits
+        self.calls = 0
+        self._countdown = sample_every
+        self.histograms: dict[str, Histogram] = {}
+
+    def sample(self) -> bool:
+        self.calls += 1
+        self._countdown -= 1
+        if self._countdown:
+            return False
+        self._countdown = self.sample_every
+        return True
+
+    def record(self, stack: str, ns: int) -> None:
+        histogram = self.histograms.get(stack)
+        if histogram is None:
+            histogram = self.histograms[stack] = Histogram(self.sub_bucket_bits)
+        histogram.record(ns)
+
+    def reset(self) -> None:
+        self.calls = 0
+        self._countdown = self.sample_every
+        self.histograms = {}
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        return {
+            stack: {
+                "count": h.count,
+                "mean": h.mean,
+                "p50": h.percentile(50),
+                "p99": h.percentile(99),
+                "p999": h.percentile(99.9),
+                "max": h.max,
+            }
+            for stack, h in sorted(self.histograms.items())
+        }
+
+    def collapsed(self) -> list[str]:
+        """
+        Sampled nanoseconds per stack in the collapsed format flame graph
+        tools read; a parent only keeps the time its stages don't account for.
+        """
+        totals = {stack: h.total for stack, h in self.histograms.items()}
+        lines = []
+        for stack in sorted(totals):
+            own = totals[stack]
+            prefix = stack + ";"
+            for child, child_total in totals.items():
+                if child.startswith(prefix) and ";" not in child[len(prefix) :]:
+                    own -= child_total
+            lines.append(f"{stack} {max(own, 0)}")
+        return lines
+
+    def dump(self, stream: IO[str] | None = None) -> None:
+        out = stream if stream is not None else sys.stderr
+        out.write(
+            f"BLOOM: trace of {self.calls} calls, one in {self.sample_every} sampled (ns)\n"
+        )
+        for stack, row in self.summary().items():
+            out.write(
+                f"BLOOM: {stack}: count: {row['count']}, mean: {row['mean']:.0f}, "
+                f"p50: {row['p50']}, p99: {row['p99']}, p999: {row['p999']}, "
+                f"max: {row['max']}\n"
+            )
+        for line in self.collapsed():
+            out.write(f"{line}\n")
@@ -0,0 +1,330 @@
+"""
+Named filters kept under a memory budget in three tiers: hot filters in
+memory, warm ones mapped read-write from their file, cold ones bz2
+compressed on disk. Filters are loaded on first access, promoted by use and
+demoted least recently used first, writing their bits back on the way down.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from fastbloomfilter.bloom import BloomFilter, Key, _new_filter
+from fastbloomfilter.lib.mapfile import atomic_write
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+MANIFEST = "manager.json"
+TIERS = ("memory", "mapped", "disk", "cold")
+_NAME = re.compile(r"[A-Za-z0-9_][A-Za-z0-9_.-]*")
+
+
+@dataclass
+class _Slot:
+    nbytes: int
+    tier: str = "cold"
+    accesses: int = 0
+    bf: BloomFilter | None = None
+
+
+class FilterManager:
+    def __init__(
+        self,
+        directory: str,
+        memory_budget: int = (1024**2) * 256,
+        mapped_budget: int = (1024**3) * 4,
+        promote_after: int = 2,
+    ) -> None:
+        """
+        Opens the filters saved in directory.
+        Expects:
+            memory_budget (in bytes): total size of the filters kept in memory
+            mapped_budget (in bytes): total size of the filters kept mapped,
+                the rest is compressed
+            promote_after (int): accesses after which a mapped filter is
+                moved into memory
+        """
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.mapped_budget = mapped_budget
+        self.promote_after = promote_after
+        self.slots: dict[str, _Slot] = {}
+        # Least recently used first.
+        self.hot: OrderedDict[str, None] = OrderedDict()
+        self.warm: OrderedDict[str, None] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.promotions = 0
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            for name, entry in manifest["filters"].items():
+                if os.path.exists(self._path(name, "mapped")):
+                    tier = "disk"
+                elif os.path.exists(self._path(name, "cold")):
+                    tier = "cold"
+                else:
+                    # Created in memory and never written back.
+                    sys.stderr.write(f"BLOOM: Filter {name} was never saved\n")
+                    continue
+                self.slots[name] = _Slot(int(entry["nbytes"]), tier)
+        sys.stderr.write(
+            f"BLOOM: Opened manager of {len(self.slots)} filters in {directory}\n"
+        )
+
+    def _path(self, name: str, tier: str) -> str:
+        suffix = ".bfz" if tier == "cold" else ".blm"
+        return os.path.join(self.directory, name + suffix)
+
+    def _bytes(self, tier: OrderedDict[str, None]) -> int:
+        return sum(self.slots[name].nbytes for name in tier)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.slots
+
+    def names(self) -> list[str]:
+        return list(self.slots)
+
+    def tier(self, name: str) -> str:
+        return self.slots[name].tier
+
+    def create(
+        self,
+        name: str,
+        array_size: int = (1024**2) * 16,
+        slices: int = 10,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> BloomFilter:
+        """
+        Adds a new empty filter, in memory when it fits the budget and
+        mapped otherwise. Remaining keyword arguments go to BloomFilter().
+        """
+        if not _NAME.fullmatch(name):
+            raise ValueError(f"Invalid filter name: {name!r}")
+        if name in self.slots:
+            raise KeyError(f"Filter {name} already exists")
+        slot = _Slot(array_size)
+        self.slots[name] = slot
+        if array_size <= self.memory_budget:
+            self._make_room(self.hot, self.memory_budget, array_size)
+            slot.bf = BloomFilter(
+                array_size=array_size,
+                slices=slices,
+                use_mmap=False,
+                memory_threshold=array_size,
+                **kwargs,
+            )
+            self._place(name, "memory")
+        else:
+            # Built in a temporary mapping, so it never has to fit in memory.
+            bf = BloomFilter(
+                array_size=array_size, slices=slices, backend="mmap", **kwargs
+            )
+            bf.save_mapped(self._path(name, "mapped"))
+            bf.close()
+            slot.tier = "disk"
+            self._open_mapped(name)
+        assert slot.bf is not None
+        return slot.bf
+
+    def get(self, name: str) -> BloomFilter:
+        """
+        Returns the filter, loading it when it is not resident. The filter
+        may be closed by a later call that demotes it, so don't hold on to it.
+        """
+        slot = self.slots[name]
+        slot.accesses += 1
+        if slot.tier == "memory":
+            self.hits += 1
+            self.hot.move_to_end(name)
+        elif slot.tier == "mapped":
+            self.hits += 1
+            self.warm.move_to_end(name)
+            if (
+                slot.accesses >= self.promote_after
+                and slot.nbytes <= self.memory_budget
+            ):
+                self._promote(name)
+        else:
+            self.misses += 1
+            if slot.tier == "cold" and slot.nbytes <= self.memory_budget:
+                self._load_cold(name)
+            else:
+                if slot.tier == "cold":
+                    BloomFilter.convert(
+                        self._path(name, "cold"), self._path(name, "mapped")
+                    )
+                    os.unlink(self._path(name, "cold"))
+                    slot.tier = "disk"
+                self._open_mapped(name)
+        assert slot.bf is not None
+        return slot.bf
+
+    def __getitem__(self, name: str) -> BloomFilter:
+        return self.get(name)
+
+    def add(self, name: str, value: Key) -> None:
+        self.get(name).add(value)
+
+    def query(self, name: str, value: Key) -> bool:
+        return self.get(name).query(value)
+
+    def update(self, name: str, value: Key) -> bool:
+        return self.get(name).update(value)
+
+    def add_batch(self, name: str, values: Iterable[Key]) -> None:
+        self.get(name).add_batch(values)
+
+    def query_batch(self, name: str, values: Iterable[Key]) -> list[bool]:
+        return self.get(name).query_batch(values)
+
+    def _place(self, name: str, tier: str) -> None:
+        self.slots[name].tier = tier
+        (self.hot if tier == "memory" else self.warm)[name] = None
+        self._save_manifest()
+
+    def _save_manifest(self) -> None:
+        # Saved on every tier change, so the directory always lists the
+        # filters it holds even if flush() is never reached.
+        manifest = {
+            "version": 1,
+            "filters": {
+                name: {"nbytes": slot.nbytes, "tier": slot.tier}
+                for name, slot in self.slots.items()
+            },
+        }
+        atomic_write(
+            os.path.join(self.directory, MANIFEST),
+            json.dumps(manifest, indent=1).encode(),
+        )
+
+    def _make_room(
+        self, tier: OrderedDict[str, None], budget: int, nbytes: int
+    ) -> None:
+        while tier and self._bytes(tier) + nbytes > budget:
+            victim = next(iter(tier))
+            if tier is self.hot:
+                self._demote_hot(victim)
+            else:
+                self._demote_warm(victim)
+            self.evictions += 1
+
+    def _open_mapped(self, name: str) -> None:
+        slot = self.slots[name]
+        self._make_room(self.warm, self.mapped_budget, slot.nbytes)
+        slot.bf = BloomFilter.open_mapped(self._path(name, "mapped"))
+        self._place(name, "mapped")
+
+    def _load_cold(self, name: str) -> None:
+        slot = self.slots[name]
+        self._make_room(self.hot, self.memory_budget, slot.nbytes)
+        bf = _new_filter(BloomFilter)
+        bf._reset_runtime()
+        if not bf.load(self._path(name, "cold")):
+            raise ValueError(f"Cannot load filter {name}")
+        slot.bf = bf
+        self._place(name, "memory")
+
+    def _promote(self, name: str) -> None:
+        slot = self.slots[name]
+        assert slot.bf is not None
+        slot.bf.sync_mapped()
+        slot.bf.close()
+        del self.warm[name]
+        self._make_room(self.hot, self.memory_budget, slot.nbytes)
+        bf = _new_filter(BloomFilter)
+        bf._reset_runtime()
+        if not bf.load(self._path(name, "mapped")):
+            raise ValueError(f"Cannot load filter {name}")
+        slot.bf = bf
+        self._place(name, "memory")
+        self.promotions += 1
+
+    def _write_back(self, name: str) -> None:
+        slot = self.slots[name]
+        assert slot.bf is not None
+        if slot.tier == "memory":
+            slot.bf.save_mapped(self._path(name, "mapped"))
+            if os.path.exists(self._path(name, "cold")):
+                os.unlink(self._path(name, "cold"))
+        else:
+            slot.bf.sync_mapped()
+
+    def _demote_hot(self, name: str) -> None:
+        slot = self.slots[name]
+        assert slot.bf is not None
+        self._write_back(name)
+        slot.bf.close()
+        slot.bf = None
+        del self.hot[name]
+        slot.tier = "disk"
+        slot.accesses = 0
+        self._open_mapped(name)
+
+    def _demote_warm(self, name: str) -> None:
+        slot = self.slots[name]
+        assert slot.bf is not None
+        self._write_back(name)
+        # save() pickles straight from the mapping, the bits are not copied
+        # into memory first.
+        slot.bf.save(self._path(name, "cold"))
+        slot.bf.close()
+        slot.bf = None
+        del self.warm[name]
+        os.unlink(self._path(name, "mapped"))
+        slot.tier = "cold"
+        slot.accesses = 0
+        self._save_manifest()
+
+    def stats(self) -> dict[str, int]:
+        counts = dict.fromkeys(TIERS, 0)
+        for slot in self.slots.values():
+            counts[slot.tier] += 1
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "promotions": self.promotions,
+            "memory_bytes": self._bytes(self.hot),
+            "mapped_bytes": self._bytes(self.warm),
+            **counts,
+        }
+
+    def flush(self) -> None:
+        """
+        Writes every resident filter back to its file and saves the
+        manifest atomically. The manifest is also saved on every tier
+        change, but the bits of resident filters are only durable after
+        flush().
+        """
+        for name in (*self.hot, *self.warm):
+            self._write_back(name)
+        self._save_manifest()
+
+    def close(self) -> None:
+        if not self.slots:
+            return
+        self.flush()
+        for name in (*self.hot, *self.warm):
+            slot = self.slots[name]
+            assert slot.bf is not None
+            slot.bf.close()
+            slot.bf = None
+            slot.tier = "disk"
+        self.hot.clear()
+        self.warm.clear()
+        self._save_manifest()
+        self.slots = {}
@@ -0,0 +1,205 @@
+"""
+A Bloom filter that also answers "may a key start with P?", so prefix and
+range scans can be pruned like point lookups. Every added key inserts its
+prefixes as extra entries. The prefixes are hashed on the way to the
+digest of the full key: each one costs a copy of the hash state, not a
+second pass over its bytes.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from fastbloomfilter.bloom import BloomFilter, Key
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+# Appended to a prefix before its digest is taken, so a prefix entry never
+# collides with a full key made of the same bytes.
+PREFIX_MARKER = b"\0prefix"
+
+
+def _encode(value: Key) -> bytes:
+    return value.encode("utf8") if isinstance(value, str) else bytes(value)
+
+
+def separator_cuts(key: bytes, separator: bytes) -> list[int]:
+    """
+    Lengths of the prefixes of key that end with separator: b"a/b/c" cut
+    at b"/" gives [2, 4], the prefixes b"a/" and b"a/b/".
+    """
+    cuts = []
+    end = key.find(separator)
+    while end != -1:
+        cuts.append(end + len(separator))
+        end = key.find(separator, end + len(separator))
+    return cuts
+
+
+class PrefixBloomFilter(BloomFilter):
+    def __init__(
+        self,
+        *args: Any,  # noqa: ANN401
+        prefix_lengths: Iterable[int] = (),
+        separator: bytes | str | None = None,
+        extractor: Callable[[bytes], Iterable[int]] | None = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        """
+        Initializes a BloomFilter() that inserts the prefixes of every key.
+        Expects:
+            prefix_lengths (in bytes): fixed prefix lengths of the UTF-8 key
+            separator (bytes): also insert every prefix ending with it
+            extractor: callable returning more prefix lengths for the key
+                bytes, including len(p) when given a prefix p itself; it is
+                not saved with the filter, set it again on the loaded one
+        Prefix entries count towards capacity like keys do. Remaining
+        arguments are passed to BloomFilter().
+        """
+        lengths = sorted(set(prefix_lengths))
+        if lengths and lengths[0] <= 0:
+            raise ValueError(f"Prefix lengths must be positive, got {lengths[0]}")
+        if separator is not None:
+            separator = _encode(separator)
+            if not separator:
+                raise ValueError("separator must not be empty")
+        if not kwargs.get("do_hashing", True):
+            raise ValueError("A prefix filter needs do_hashing=True")
+        self.prefix_lengths: list[int] = lengths
+        self.separator: bytes | None = separator
+        self.extractor: Callable[[bytes], Iterable[int]] | None = extractor
+        super().__init__(*args, **kwargs)
+
+    def _reset_runtime(self) -> None:
+        super()._reset_runtime()
+        self.prefix_lengths = []
+        self.separator = None
+        self.extractor = None
+
+    def _metadata(self) -> dict[str, Any]:
+        meta = super()._metadata()
+        meta["prefix_lengths"] = self.prefix_lengths
+        meta["prefix_separator"] = (
+            self.separator.hex() if self.separator is not None else None
+        )
+        return meta
+
+    def _apply_metadata(self, meta: dict[str, Any]) -> None:
+        super()._apply_metadata(meta)
+        if "prefix_lengths" in meta:
+            self.prefix_lengths = [int(n) for n in meta["prefix_lengths"]]
+            separator = meta.get("prefix_separator")
+            self.separator = bytes.fromhex(separator) if separator else None
+
+    def _cuts(self, key: bytes) -> list[int]:
+        cuts = {n for n in self.prefix_lengths if n <= len(key)}
+        if self.separator is not None:
+            cuts.update(separator_cuts(key, self.separator))
+        if self.extractor is not None:
+            cuts.update(n for n in self.extractor(key) if 0 < n <= len(key))
+        return sorted(cuts)
+
+    def _key_digests(self, value: Key) -> list[int]:
+        """
+        Digests of the prefix entries of value followed by the digest of
+        value itself, which equals the one BloomFilter computes.
+        """
+        key = _encode(value)
+        view = memoryview(key)
+        state = self.hashfunc(b"")
+        digests = []
+        start = 0
+        for cut in self._cuts(key):
+            state.update(view[start:cut])
+            prefix = state.copy()
+            prefix.update(PREFIX_MARKER)
+            digests.append(int.from_bytes(prefix.digest(), "big"))
+            start = cut
+        state.update(view[start:])
+        digests.append(int.from_bytes(state.digest(), "big"))
+        return digests
+
+    def _key_indices(self, value: Key) -> list[list[int]]:
+        return [
+            list(self._digest_indices(digest)) for digest in self._key_digests(value)
+        ]
+
+    def _prefix_indices(self, prefix: Key) -> list[int]:
+        key = _encode(prefix)
+        if not self._is_prefix(key):
+            # Answering False would prune keys that are in the filter.
+            raise ValueError(f"{prefix!r} is not a prefix this filter inserts")
+        state = self.hashfunc(key)
+        state.update(PREFIX_MARKER)
+        return list(self._digest_indices(int.from_bytes(state.digest(), "big")))
+
+    def _is_prefix(self, key: bytes) -> bool:
+        if len(key) in self.prefix_lengths:
+            return True
+        if self.separator is not None and key.endswith(self.separator):
+            return True
+        return self.extractor is not None and len(key) in self.extractor(key)
+
+    def add(self, value: Key) -> None:
+        if not self.saving and not self.loading and not self.merging:
+            for hash_list in self._key_indices(value):
+                self._add(hash_list)
+
+    def add_batch(self, values: Iterable[Key], page_sorted: bool | None = None) -> None:
+        if self.saving or self.loading or self.merging:
+            return
+        hashes = [
+            hash_list for value in values for hash_list in self._key_indices(value)
+        ]
+        self._add_hashes(hashes, self._sort_pages(page_sorted))
+
+    def update(self, value: Key) -> bool:
+        if self.saving or self.loading or self.merging:
+            return False
+        *prefixes, full = self._key_indices(value)
+        # The full key may be a false positive whose prefixes were never
+        # added, so they are set whatever the answer.
+        for hash_list in prefixes:
+            if not all(self.bfilter[digest] for digest in hash_list):
+                self._add(hash_list)
+        present = self._query(full)
+        if not present:
+            self._add(full)
+        if self.result_cache is not None:
+            self.result_cache.put(value, True)
+        return present
+
+    def update_batch(
+        self, values: Iterable[Key], page_sorted: bool | None = None
+    ) -> list[bool]:
+        if self.saving or self.loading or self.merging:
+            return []
+        keys = [self._key_indices(value) for value in values]
+        # Full keys go first, so the answer for a key depends on the keys
+        # before it and not on the prefix entries of the batch.
+        hashes = [hash_lists[-1] for hash_lists in keys]
+        hashes += [hash_list for hash_lists in keys for hash_list in hash_lists[:-1]]
+        result = self._update_hashes(hashes, self._sort_pages(page_sorted))
+        prefixes = result[len(keys) :]
+        self.hits -= sum(prefixes)
+        self.queryes -= len(prefixes)
+        return result[: len(keys)]
+
+    def query_prefix(self, prefix: Key) -> bool:
+        """
+        False when no added key starts with prefix. prefix must be one that
+        is inserted: of a configured length, ending with the separator or
+        cut by the extractor; other prefixes raise ValueError.
+        """
+        if self.reload_interval is not None:
+            self._maybe_reload()
+        return self._query(self._prefix_indices(prefix))
+
+    def query_prefix_batch(
+        self, prefixes: Iterable[Key], page_sorted: bool | None = None
+    ) -> list[bool]:
+        if self.reload_interval is not None:
+            self._maybe_reload()
+        hashes = [self._prefix_indices(prefix) for prefix in prefixes]
+        return self._query_hashes(hashes, self._sort_pages(page_sorted))
@@ -0,0 +1,261 @@
+"""
+A time-windowed Bloom filter made of G generations of BloomFilter sharing one
+contiguous buffer. New values go to the current generation, queries look at
+all of them, and rotate() recycles the oldest generation in place.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import sys
+import time
+from typing import Any
+
+import bitarray
+
+from fastbloomfilter.backends import FileMmapBackend
+from fastbloomfilter.bloom import BloomFilter
+from fastbloomfilter.lib.mapfile import (
+    ROTATING_MAGIC,
+    encode_header,
+    payload_offset,
+    read_header,
+)
+from fastbloomfilter.lib.pickling import decompress_pickle
+
+# Header fields a reopened file must share with the filter opening it.
+_CONFORMANCE = (
+    "generations",
+    "bitcount",
+    "slices",
+    "slice_bits",
+    "fast",
+    "do_hashes",
+    "data_is_hex",
+    "hashfunc",
+    "index_mode",
+    "layout",
+    "partition_bits",
+)
+
+
+class RotatingBloomFilter:
+    def __init__(
+        self,
+        generations: int = 4,
+        array_size: int = (1024**2) * 16,
+        slices: int = 10,
+        slice_bits: int = 256,
+        interval: float | None = None,
+        mmap_file: str | None = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        """
+        Expects:
+            generations (int): number of generations G kept in the window
+            array_size (in bytes): size of each generation
+            interval (float): seconds between automatic rotations, None to only
+                rotate when rotate() is called
+            mmap_file (str): file holding a header with the current
+                generation and the last rotation time, then all generations
+                back to back; an existing file is reopened where it was left.
+                An in-memory buffer is used when None
+        Remaining keyword arguments are passed to every BloomFilter().
+        """
+        if generations < 1:
+            raise ValueError(f"generations must be positive, got {generations}")
+        self.array_size = array_size
+        self.interval = interval
+        self.mmap_file = mmap_file
+        self.hits = 0
+        self.queryes = 0
+
+        size = generations * array_size
+        self.offset = 0
+        self.storage: FileMmapBackend | None = None
+        self.buffer: bytearray | mmap.mmap
+        stored: dict[str, Any] | None = None
+        if mmap_file is not None:
+            if os.path.exists(mmap_file) and os.path.getsize(mmap_file) > 0:
+                with open(mmap_file, "rb") as f:
+                    stored, _ = read_header(f, ROTATING_MAGIC)
+                self.offset = int(stored["payload_offset"])
+                if os.path.getsize(mmap_file) != self.offset + size:
+                    raise ValueError(
+                        f"{mmap_file} does not hold {generations} generations "
+                        f"of {array_size} bytes"
+                    )
+            else:
+                # Room for the header with a 20 digit bit count per
+                # generation; the header is padded to it and stores it.
+                self.offset = payload_offset(2048 + 32 * generations)
+            self.storage = FileMmapBackend(self.offset + size, mmap_file, keep=True)
+            assert self.storage.mapping is not None
+            self.buffer = self.storage.mapping
+        else:
+            self.buffer = bytearray(size)
+
+        view = memoryview(self.buffer)
+        self.generations = [
+            BloomFilter(
+                slices=slices,
+                slice_bits=slice_bits,
+                buffer=view[start : start + array_size],
+                **kwargs,
+            )
+            for start in range(self.offset, self.offset + size, array_size)
+        ]
+        del view
+        self.current = 0
+        self.rotated_at = time.monotonic()
+        try:
+            if stored is not None:
+                self._restore(stored)
+            else:
+                self._write_header()
+        except Exception:
+            self._release()
+            raise
+
+    def _header(self) -> dict[str, Any]:
+        meta = self.generations[0]._metadata()
+        del meta["bitset"]
+        meta.update(
+            {
+                "generations": len(self.generations),
+                "current": self.current,
+                # Wall clock time, the monotonic clock restarts with the process.
+                "rotated_at": time.time() - (time.monotonic() - self.rotated_at),
+                "bitsets": [gen.bitset for gen in self.generations],
+                "payload_offset": self.offset,
+            }
+        )
+        return meta
+
+    def _write_header(self) -> None:
+        if not isinstance(self.buffer, mmap.mmap):
+            return
+        header, offset = encode_header(self._header(), ROTATING_MAGIC)
+        if offset > self.offset:
+            raise ValueError("Rotating filter header does not fit")
+        self.buffer[: self.offset] = header + b"\x00" * (self.offset - offset)
+
+    def _restore(self, meta: dict[str, Any]) -> None:
+        # Continues the window of a reopened file, rotations that were due
+        # while it was closed happen on the next call.
+        expected = self._header()
+        for key in _CONFORMANCE:
+            if meta.get(key) != expected[key]:
+                raise ValueError(
+                    f"{self.mmap_file}: {key} is {meta.get(key)}, "
+                    f"expected {expected[key]}"
+                )
+        self.current = int(meta["current"])
+        for gen, bitset in zip(self.generations, meta["bitsets"], strict=True):
+            gen.bitset = int(bitset)
+        elapsed = max(0.0, time.time() - float(meta["rotated_at"]))
+        self.rotated_at = time.monotonic() - elapsed
+
+    def _maybe_rotate(self) -> None:
+        if self.interval is None:
+            return
+        elapsed = time.monotonic() - self.rotated_at
+        if elapsed >= self.interval:
+            # After a long idle period every generation may have expired.
+            steps = min(int(elapsed // self.interval), len(self.generations))
+            for _ in range(steps):
+                self.rotate()
+
+    def rotate(self) -> None:
+        """
+        Makes the oldest generation current, clearing its bits in place.
+        """
+        self.current = (self.current + 1) % len(self.generations)
+        oldest = self.generations[self.current]
+        oldest.bfilter.setall(False)
+        oldest.bitset = 0
+        if oldest.tracker is not None:
+            oldest._track_all()
+        self.rotated_at = time.monotonic()
+        self._write_header()
+        sys.stderr.write(f"BLOOM: Rotated to generation {self.current}\n")
+
+    def _contains(self, hash_list: list[int]) -> bool:
+        return any(
+            all(gen.bfilter[digest] for digest in hash_list) for gen in self.generations
+        )
+
+    def add(self, value: str) -> None:
+        self._maybe_rotate()
+        current = self.generations[self.current]
+        current._add(current._hash(value))
+
+    def query(self, value: str) -> bool:
+        self._maybe_rotate()
+        ret = self._contains(list(self.generations[self.current]._hash(value)))
+        if ret:
+            self.hits += 1
+        self.queryes += 1
+        return ret
+
+    def __getitem__(self, value: str) -> bool:
+        return self.query(value)
+
+    def update(self, value: str) -> bool:
+        """
+        Returns True if value was seen in any generation, and makes sure it
+        is in the current one so it stays in the window while it keeps
+        showing up.
+        """
+        self._maybe_rotate()
+        current = self.generations[self.current]
+        hash_list = list(current._hash(value))
+        if all(current.bfilter[digest] for digest in hash_list):
+            return True
+        seen = self._contains(hash_list)
+        current._add(hash_list)
+        return seen
+
+    def save_generation(self, index: int, filename: str) -> bool:
+        return self.generations[index].save(filename)
+
+    def load_generation(self, index: int, filename: str) -> bool:
+        """
+        Copies the bits of a filter saved with save_generation() into
+        generation index.
+        """
+        try:
+            loaded_filter: Any = decompress_pickle(filename)
+            gen = self.generations[index]
+            gen._check_conformable(loaded_filter)
+            bits = gen.bfilter
+            assert isinstance(bits, bitarray.bitarray)
+            bits[:] = loaded_filter.bfilter
+            gen.bitset = loaded_filter.bitset
+            if gen.tracker is not None:
+                gen._track_all()
+            return True
+        except Exception as e:
+            sys.stderr.write(f"BLOOM: Error loading generation: {str(e)}\n")
+            return False
+
+    def close(self) -> None:
+        # Also runs from __del__ on an object whose __init__ raised.
+        if not getattr(self, "generations", None):
+            return
+        try:
+            self._write_header()
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        for gen in self.generations:
+            del gen.bfilter
+        self.generations = []
+        if self.storage is not None:
+            self.storage.close()
+            self.storage = None
+
+    def __del__(self) -> None:
+        self.close()
@@ -0,0 +1,257 @@
+"""
+A logical Bloom filter split into S shard filters, each in its own file.
+Keys are routed to a shard by the top bits of their digest, so every shard
+can be saved, loaded and merged on its own.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
+
+from fastbloomfilter.bloom import BloomFilter, Key
+from fastbloomfilter.lib.mapfile import atomic_write
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+MANIFEST = "manifest.json"
+ROUTING_BITS = 32
+
+
+class ShardedBloomFilter:
+    def __init__(
+        self,
+        directory: str,
+        shards: int = 16,
+        array_size: int = (1024**2) * 16,
+        slices: int = 10,
+        slice_bits: int = 256,
+        workers: int = 1,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        """
+        Opens the sharded filter in directory, or creates it when directory
+        has no manifest yet.
+        Expects:
+            shards (int): number of shard filters S
+            array_size (in bytes): size of each shard
+            workers (int): threads used to run batch operations on several
+                shards at once
+        Remaining keyword arguments are passed to every BloomFilter().
+        """
+        self.directory = directory
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(workers) if workers > 1 else None
+        os.makedirs(directory, exist_ok=True)
+
+        manifest_path = os.path.join(directory, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest: dict[str, Any] = json.load(f)
+            self.filters = []
+            try:
+                for name in self.manifest["files"]:
+                    self.filters.append(self._open_shard(name, kwargs))
+            except (OSError, ValueError):
+                self.close()
+                raise
+            sys.stderr.write(
+                f"BLOOM: Opened {len(self.filters)} shards from {directory}\n"
+            )
+        else:
+            if shards < 1:
+                raise ValueError(f"shards must be positive, got {shards}")
+            self.manifest = {
+                "version": 1,
+                "shards": shards,
+                "files": [f"shard-{i:04d}.blf" for i in range(shards)],
+            }
+            self.filters = []
+            for name in self.manifest["files"]:
+                bf = BloomFilter(
+                    array_size=array_size,
+                    slices=slices,
+                    slice_bits=slice_bits,
+                    **kwargs,
+                )
+                bf.filename = os.path.join(directory, name)
+                self.filters.append(bf)
+
+        first = self.filters[0]
+        if not first.do_hashes:
+            raise ValueError("A sharded filter needs do_hashing=True")
+        self.digest_bits = len(first.hashfunc("").digest()) * 8
+        # The routing prefix must not overlap the digest bits used for the
+        # indices, or keys of one shard would share index bits.
+        if first.slice_bits > self.digest_bits - ROUTING_BITS:
+            raise ValueError(
+                f"slice_bits {first.slice_bits} leaves no room for the routing "
+                f"prefix in a {self.digest_bits} bit digest"
+            )
+
+    def _open_shard(self, name: str, kwargs: dict[str, Any]) -> BloomFilter:
+        """
+        Loads one shard and checks it against the manifest. A shard that
+        failed to load would come back as an empty filter and turn all of
+        its keys into false negatives, so that raises instead.
+        """
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Shard {path} is missing")
+        bf = BloomFilter(array_size=8, **kwargs)
+        if not bf.load(path):
+            bf.close()
+            raise ValueError(f"Cannot load shard {path}")
+        for field in ("bitcount", "slices", "slice_bits"):
+            if field in self.manifest and getattr(bf, field) != self.manifest[field]:
+                bf.close()
+                raise ValueError(
+                    f"Shard {path} has {field} {getattr(bf, field)}, "
+                    f"the manifest says {self.manifest[field]}"
+                )
+        return bf
+
+    def __len__(self) -> int:
+        return len(self.filters)
+
+    def _route(self, digest: int) -> int:
+        prefix = digest >> (self.digest_bits - ROUTING_BITS)
+        return (prefix * len(self.filters)) >> ROUTING_BITS
+
+    def shard_for(self, value: Key) -> int:
+        return self._route(self.filters[0]._digest(value))
+
+    def _locate(self, value: Key) -> tuple[BloomFilter, list[int]]:
+        digest = self.filters[0]._digest(value)
+        bf = self.filters[self._route(digest)]
+        return bf, list(bf._digest_indices(digest))
+
+    def add(self, value: Key) -> None:
+        bf, hash_list = self._locate(value)
+        bf._add(hash_list)
+
+    def query(self, value: Key) -> bool:
+        bf, hash_list = self._locate(value)
+        return bf._query(hash_list)
+
+    def __getitem__(self, value: Key) -> bool:
+        return self.query(value)
+
+    def update(self, value: Key) -> bool:
+        bf, hash_list = self._locate(value)
+        r = bf._query(iter(hash_list))
+        if r is False:
+            bf._add(iter(hash_list))
+        return r
+
+    def _run_batch(
+        self,
+        values: Iterable[Key],
+        operation: Callable[[BloomFilter, list[list[int]]], list[bool] | None],
+    ) -> list[bool]:
+        # Split the batch per shard, run the shards (in parallel with
+        # workers > 1) and put the answers back in the order of values.
+        positions: list[list[int]] = [[] for _ in self.filters]
+        rows: list[list[list[int]]] = [[] for _ in self.filters]
+        count = 0
+        for count, value in enumerate(values, 1):
+            digest = self.filters[0]._digest(value)
+            shard = self._route(digest)
+            positions[shard].append(count - 1)
+            rows[shard].append(list(self.filters[shard]._digest_indices(digest)))
+
+        def run(shard: int) -> list[bool] | None:
+            if not rows[shard]:
+                return []
+            return operation(self.filters[shard], rows[shard])
+
+        if self.executor is not None:
+            answers = list(self.executor.map(run, range(len(self.filters))))
+        else:
+            answers = [run(shard) for shard in range(len(self.filters))]
+
+        result = [False] * count
+        for shard, shard_answers in enumerate(answers):
+            for position, answer in zip(positions[shard], shard_answers or []):
+                result[position] = answer
+        return result
+
+    def add_batch(self, values: Iterable[Key]) -> None:
+        self._run_batch(
+            values,
+            lambda bf, rows: bf._add_hashes(rows, bf._sort_pages(None)),
+        )
+
+    def query_batch(self, values: Iterable[Key]) -> list[bool]:
+        return self._run_batch(
+            values,
+            lambda bf, rows: bf._query_hashes(rows, bf._sort_pages(None)),
+        )
+
+    def update_batch(self, values: Iterable[Key]) -> list[bool]:
+        return self._run_batch(
+            values,
+            lambda bf, rows: bf._update_hashes(rows, bf._sort_pages(None)),
+        )
+
+    def save_shard(self, shard: int) -> bool:
+        """
+        Checkpoints one shard to its file without touching the others.
+        """
+        return self.filters[shard].save_mapped()
+
+    def load_shard(self, shard: int) -> bool:
+        return self.filters[shard].load()
+
+    def save_manifest(self) -> None:
+        first = self.filters[0]
+        self.manifest.update(
+            {
+                "shards": len(self.filters),
+                "bitcount": first.bitcount,
+                "slices": first.slices,
+                "slice_bits": first.slice_bits,
+                "bitsets": [bf.bitset for bf in self.filters],
+            }
+        )
+        atomic_write(
+            os.path.join(self.directory, MANIFEST),
+            json.dumps(self.manifest, indent=2, sort_keys=True).encode("utf8"),
+        )
+
+    def save(self) -> bool:
+        ok = all(self.save_shard(shard) for shard in range(len(self.filters)))
+        if ok:
+            self.save_manifest()
+        return ok
+
+    def merge_shard(self, shard: int, other: BloomFilter) -> None:
+        self.filters[shard]._raw_merge(other)
+
+    def merge(self, other: ShardedBloomFilter) -> None:
+        """
+        Merges a sharded filter with the same shards and routing, shard by
+        shard.
+        """
+        if len(other.filters) != len(self.filters):
+            raise ValueError(
+                f"filters are not conformable: {len(self.filters)} - {len(other.filters)} shards"
+            )
+        for shard, bf in enumerate(other.filters):
+            self.merge_shard(shard, bf)
+
+    def close(self) -> None:
+        for bf in getattr(self, "filters", []):
+            bf.close()
+        self.filters = []
+        if getattr(self, "executor", None) is not None:
+            assert self.executor is not None
+            self.executor.shutdown()
+            self.executor = None
+
+    def __del__(self) -> None:
+        self.close()
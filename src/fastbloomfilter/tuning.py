@@ -0,0 +1,226 @@
+"""
+Empirical sizing. The false positive rate of a configuration depends on
+how the bit indices are cut from the digest (slice_bits, index_mode, the
+power of two masking), which the textbook formula ignores. tune() builds
+each candidate filter from a key sample, probes it with keys that were
+never added and reports the measured rate, memory and throughput.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+import sys
+from dataclasses import dataclass, replace
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from fastbloomfilter.bloom import BloomFilter, Key, false_positive_rate
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+DIGEST_BITS = 512
+SCALES = (0.5, 1.0, 2.0)
+
+
+@dataclass(frozen=True)
+class TuneConfig:
+    array_size: int
+    slices: int
+    slice_bits: int = 256
+    fast: bool = False
+    index_mode: str | None = None
+
+    @property
+    def bitcount(self) -> int:
+        return self.array_size * 8
+
+
+@dataclass(frozen=True)
+class TuneResult:
+    config: TuneConfig
+    count: int
+    expected_fpr: float
+    empirical_fpr: float
+    memory_bytes: int
+    add_rate: float
+    query_rate: float
+    pareto: bool = False
+
+    def dominates(self, other: TuneResult) -> bool:
+        no_worse = (
+            self.empirical_fpr <= other.empirical_fpr
+            and self.memory_bytes <= other.memory_bytes
+            and self.query_rate >= other.query_rate
+        )
+        better = (
+            self.empirical_fpr < other.empirical_fpr
+            or self.memory_bytes < other.memory_bytes
+            or self.query_rate > other.query_rate
+        )
+        return no_worse and better
+
+
+def _config(bitcount: int, slices: int, index_mode: str) -> TuneConfig | None:
+    # Same index widths as BloomFilter.plan(); None when the digest is too short.
+    needed = (bitcount - 1).bit_length()
+    if slices * needed > DIGEST_BITS:
+        return None
+    if index_mode == "mask":
+        bits_per_index = needed
+    else:
+        bits_per_index = max(needed, min(64, DIGEST_BITS // slices))
+    return TuneConfig(bitcount // 8, slices, slices * bits_per_index, False, index_mode)
+
+
+def candidate_configs(
+    capacity: int, error_rate: float, scales: Sequence[float] = SCALES
+) -> list[TuneConfig]:
+    """
+    Configurations around BloomFilter.plan(capacity, error_rate): the planned
+    bit count times each scale with the best number of hashes and one more
+    and one less, the nearest power of two with masking and the best number
+    of hashes for that size, and fast mode.
+    """
+    plan = BloomFilter.plan(capacity, error_rate)
+    configs: list[TuneConfig] = []
+    for scale in scales:
+        bitcount = max(64, round(plan.bitcount * scale / 8) * 8)
+        best = max(1, round(bitcount / capacity * math.log(2)))
+        for slices in sorted({max(1, best - 1), best, best + 1}):
+            config = _config(bitcount, slices, "lemire")
+            if config is not None:
+                configs.append(config)
+        # The power of two size holds more bits, so it takes more hashes.
+        pow2 = 1 << (bitcount - 1).bit_length()
+        best_masked = max(1, round(pow2 / capacity * math.log(2)))
+        masked = _config(pow2, best_masked, "mask")
+        if masked is not None:
+            configs.append(masked)
+        configs.append(TuneConfig(bitcount // 8, 1, 256, True, "lemire"))
+    return list(dict.fromkeys(configs))
+
+
+def synthetic_keys(count: int, seed: int = 0, prefix: str = "key") -> list[str]:
+    rng = random.Random(seed)
+    return [f"{prefix}-{rng.getrandbits(64):016x}-{i}" for i in range(count)]
+
+
+def _probe_keys(keys: Sequence[Key], count: int, seed: int) -> list[Key]:
+    # Probes must not be in the sample, or they would count as false positives.
+    present = {k.encode("utf8") if isinstance(k, str) else bytes(k) for k in keys}
+    return [
+        probe
+        for probe in synthetic_keys(count, seed + 1, "probe")
+        if probe.encode("utf8") not in present
+    ]
+
+
+def measure(
+    config: TuneConfig, keys: Sequence[Key], probes: Sequence[Key]
+) -> TuneResult:
+    """
+    Adds keys to a new in-memory filter of config with add_batch() and
+    queries probes, none of which were added, with query_batch().
+    """
+    bf = BloomFilter(
+        array_size=config.array_size,
+        slices=config.slices,
+        slice_bits=config.slice_bits,
+        fast=config.fast,
+        index_mode=config.index_mode,
+        memory_threshold=config.array_size,
+    )
+    start = perf_counter()
+    bf.add_batch(keys)
+    add_time = perf_counter() - start
+    start = perf_counter()
+    positives = sum(bf.query_batch(probes))
+    query_time = perf_counter() - start
+    bf.close()
+    return TuneResult(
+        config=config,
+        count=len(keys),
+        expected_fpr=false_positive_rate(
+            config.bitcount, 1 if config.fast else config.slices, len(keys)
+        ),
+        empirical_fpr=positives / len(probes) if probes else 0.0,
+        memory_bytes=config.array_size,
+        add_rate=len(keys) / add_time if add_time > 0 else math.inf,
+        query_rate=len(probes) / query_time if query_time > 0 else math.inf,
+    )
+
+
+def tune(
+    keys: Iterable[Key] | None = None,
+    capacity: int = 100_000,
+    error_rate: float = 0.01,
+    configs: Iterable[TuneConfig] | None = None,
+    probes: int = 100_000,
+    seed: int = 0,
+) -> list[TuneResult]:
+    """
+    Measures every configuration, candidate_configs(capacity, error_rate)
+    by default, on keys or on capacity synthetic keys. Results are sorted
+    by memory and flagged when no other result has a lower or equal false
+    positive rate and memory with a higher or equal query rate.
+    """
+    sample = list(keys) if keys is not None else synthetic_keys(capacity, seed)
+    if not sample:
+        raise ValueError("Cannot tune on an empty key sample")
+    if configs is None:
+        configs = candidate_configs(len(sample), error_rate)
+    probe_keys = _probe_keys(sample, probes, seed)
+    results = []
+    for config in configs:
+        result = measure(config, sample, probe_keys)
+        sys.stderr.write(
+            f"BLOOM: tune: {config}: fpr: {result.empirical_fpr:.6f}, "
+            f"add: {result.add_rate:.0f}/s, query: {result.query_rate:.0f}/s\n"
+        )
+        results.append(result)
+    results = [
+        replace(r, pareto=not any(other.dominates(r) for other in results))
+        for r in results
+    ]
+    results.sort(key=lambda r: (r.memory_bytes, r.empirical_fpr))
+    return results
+
+
+def recommend(results: Sequence[TuneResult], error_rate: float) -> TuneResult:
+    """
+    The smallest measured configuration within error_rate, the fastest to
+    query among equals; the most accurate one when none is within it.
+    """
+    if not results:
+        raise ValueError("No results to recommend from")
+    within = [r for r in results if r.empirical_fpr <= error_rate]
+    if not within:
+        return min(results, key=lambda r: (r.empirical_fpr, r.memory_bytes))
+    return min(within, key=lambda r: (r.memory_bytes, -r.query_rate))
+
+
+def format_table(
+    results: Sequence[TuneResult], recommended: TuneResult | None = None
+) -> str:
+    """
+    One row per result; Pareto optimal rows are marked with * and the
+    recommended one with <-.
+    """
+    header = (
+        f"{'':2}{'array_size':>12} {'slices':>6} {'slice_bits':>10} {'fast':>5} "
+        f"{'index':>6} {'expected':>10} {'measured':>10} {'add/s':>10} {'query/s':>10}"
+    )
+    lines = [header]
+    for r in results:
+        c = r.config
+        mark = "*" if r.pareto else ""
+        lines.append(
+            f"{mark:2}{c.array_size:>12} {c.slices:>6} {c.slice_bits:>10} "
+            f"{'yes' if c.fast else 'no':>5} {c.index_mode or '':>6} "
+            f"{r.expected_fpr:>10.6f} {r.empirical_fpr:>10.6f} "
+            f"{r.add_rate:>10.0f} {r.query_rate:>10.0f}"
+            + (" <-" if r is recommended else "")
+        )
+    return "\n".join(lines)
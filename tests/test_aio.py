@@ -0,0 +1,189 @@
+import asyncio
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Any
+
+from fastbloomfilter.aio import AsyncBloomFilter
+from fastbloomfilter.bloom import BloomFilter
+
+
+class _HookExecutor(Executor):
+    # Runs calls inline, then hook, as if the filter changed while the
+    # batch was hashed.
+    def __init__(self, hook: Callable[[], object]) -> None:
+        self.hook = hook
+
+    def submit(  # type: ignore[override]
+        self,
+        fn: Callable[..., Any],
+        /,
+        *args: Any,  # noqa: ANN401
+        **kwargs: Any,  # noqa: ANN401
+    ) -> Future[Any]:
+        future: Future[Any] = Future()
+        future.set_result(fn(*args, **kwargs))
+        self.hook()
+        return future
+
+
+class _SlowLock:
+    # Lingers after acquiring, so two merges in opposite directions both
+    # hold their first lock before taking the second; gives up instead of
+    # hanging the test run.
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> None:
+        if not self.lock.acquire(timeout=2):
+            raise TimeoutError("merge deadlocked")
+        time.sleep(0.1)
+
+    def __exit__(self, *exc: object) -> None:
+        self.lock.release()
+
+
+class TestAsyncBloomFilter:
+    def test_concurrent_calls_are_coalesced(self) -> None:
+        async def main() -> None:
+            abf = AsyncBloomFilter(array_size=1024 * 8, slices=5)
+            await asyncio.gather(*(abf.add(f"key-{i}") for i in range(200)))
+            assert abf.batches == 1
+            answers = await asyncio.gather(
+                abf.query("key-1"), abf.query("missing"), abf.update("new")
+            )
+            assert answers == [True, False, False]
+            assert abf.batches == 3
+            assert await abf.update("new") is True
+            await abf.close()
+
+        asyncio.run(main())
+
+    def test_max_batch_flushes_early(self) -> None:
+        async def main() -> None:
+            abf = AsyncBloomFilter(array_size=1024 * 8, slices=5, max_batch=50)
+            await asyncio.gather(*(abf.add(f"key-{i}") for i in range(120)))
+            assert abf.batches == 3
+            assert await abf.query_batch(["key-0", "key-119", "nope"]) == [
+                True,
+                True,
+                False,
+            ]
+            await abf.close()
+
+        asyncio.run(main())
+
+    def test_loop_stays_responsive(self) -> None:
+        async def main() -> int:
+            abf = AsyncBloomFilter(array_size=1024 * 64, slices=5)
+            ticks = 0
+
+            async def ticker() -> None:
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0)
+
+            task = asyncio.create_task(ticker())
+            await abf.add_batch(f"key-{i}" for i in range(20000))
+            task.cancel()
+            await abf.close()
+            return ticks
+
+        assert asyncio.run(main()) > 1
+
+    def test_save_load_and_merge(self, tmp_path: os.PathLike[str]) -> None:
+        filename = os.path.join(tmp_path, "async.bloom")
+
+        async def main() -> None:
+            abf = AsyncBloomFilter(array_size=1024 * 8, slices=5)
+            other = AsyncBloomFilter(array_size=1024 * 8, slices=5)
+            await abf.add("mine")
+            other_add = asyncio.ensure_future(other.add("theirs"))
+            await asyncio.sleep(0)
+            await abf.merge(other)
+            assert other_add.done()
+            assert await abf.query("theirs") is True
+            assert await abf.save(filename) is True
+
+            loaded = AsyncBloomFilter(BloomFilter(array_size=1024 * 8, slices=5))
+            assert await loaded.load(filename) is True
+            assert await loaded.query_batch(["mine", "theirs"]) == [True, True]
+            for bf in (abf, other, loaded):
+                await bf.close()
+
+        asyncio.run(main())
+
+    def test_crossed_merges_do_not_deadlock(self) -> None:
+        async def main() -> None:
+            a = AsyncBloomFilter(array_size=1024 * 8, slices=5)
+            b = AsyncBloomFilter(array_size=1024 * 8, slices=5)
+            for abf in (a, b):
+                abf.lock = _SlowLock()  # type: ignore[assignment]
+            await a.add("a")
+            await b.add("b")
+            await asyncio.gather(a.merge(b), b.merge(a), a.merge(a))
+            for abf in (a, b):
+                assert await abf.query_batch(["a", "b"]) == [True, True]
+                await abf.close()
+
+        asyncio.run(main())
+
+    def test_hashing_in_process_pool(self) -> None:
+        async def main() -> None:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                abf = AsyncBloomFilter(
+                    array_size=1000 * 8, slices=5, hash_executor=pool
+                )
+                await abf.add_batch(["a", "b"])
+                assert await abf.update_batch(["a", "c", "c"]) == [True, False, True]
+                assert abf.bloom.query_batch(["a", "b", "c", "d"]) == [
+                    True,
+                    True,
+                    True,
+                    False,
+                ]
+                await abf.close()
+
+        asyncio.run(main())
+
+    def test_hashed_rows_follow_filter_changes(
+        self, tmp_path: os.PathLike[str]
+    ) -> None:
+        filename = os.path.join(tmp_path, "small.bloom")
+        small = BloomFilter(array_size=64, slices=3)
+        assert small.save(filename) is True
+        small.close()
+
+        async def main() -> None:
+            # Loaded while the batch is hashed: the rows are recomputed for
+            # the new size instead of being applied out of range.
+            abf = AsyncBloomFilter(
+                array_size=1024 * 8,
+                slices=5,
+                hash_executor=_HookExecutor(lambda: abf.bloom.load(filename)),
+            )
+            await abf.add_batch(["a", "b"])
+            assert abf.bloom.bitcount == 512
+            assert abf.bloom.query_batch(["a", "b"]) == [True, True]
+            await abf.close()
+
+            # Saving while the batch is hashed: writes are dropped like in
+            # the batch methods.
+            guarded = AsyncBloomFilter(
+                array_size=1024 * 8,
+                slices=5,
+                hash_executor=_HookExecutor(
+                    lambda: setattr(guarded.bloom, "saving", True)
+                ),
+            )
+            await guarded.add_batch(["x"])
+            assert await guarded.update_batch(["y"]) == []
+            assert await guarded.update("z") is False
+            guarded.bloom.saving = False
+            assert guarded.bloom.query_batch(["x", "y", "z"]) == [False] * 3
+            await guarded.close()
+
+        asyncio.run(main())
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from fastbloomfilter.arena import ALIGNMENT, DIRECTORY, FilterArena
+
+
+@pytest.fixture
+def arena_dir(tmp_path: object) -> str:
+    return f"{tmp_path}/arena"
+
+
+class TestFilterArena:
+    def test_tenants_are_isolated(self, arena_dir: str) -> None:
+        arena = FilterArena(arena_dir, initial_size=4096)
+        a = arena.create("a", 1024, slices=4)
+        b = arena.create("b", 3100, slices=6)
+        a.add("shared key")
+        assert a.query("shared key") is True
+        assert "shared key" not in b
+        assert arena.filters["b"]["offset"] % ALIGNMENT == 0
+        # The second filter did not fit, the data file doubled.
+        assert arena.meta["size"] == 8192
+        assert len(arena) == 2 and "a" in arena
+        with pytest.raises(KeyError):
+            arena.create("a", 64)
+        with pytest.raises(KeyError):
+            arena["missing"]
+        arena.close()
+
+    def test_batches(self, arena_dir: str) -> None:
+        arena = FilterArena(arena_dir, initial_size=4096)
+        for tenant in ("x", "y", "z"):
+            arena.create(tenant, 512, slices=3)
+        arena.add_batch([("x", "one"), ("y", "two"), ("z", b"three")])
+        assert arena.query_batch(
+            [("x", "one"), ("x", "two"), ("y", "two"), ("z", b"three")]
+        ) == [True, False, True, True]
+        assert arena.query_batch([]) == []
+        assert arena["y"].query_batch(["two", "one"]) == [True, False]
+        arena.close()
+
+    def test_filter_view_matches_arena(self, arena_dir: str) -> None:
+        arena = FilterArena(arena_dir, initial_size=4096)
+        handle = arena.create("t", 1000, slices=5)
+        handle.add_batch([f"key-{i}" for i in range(50)])
+        bf = arena.filter("t")
+        assert all(bf.query(f"key-{i}") for i in range(50))
+        bf.add("through the view")
+        bf.close()
+        del bf
+        assert handle.query("through the view") is True
+        arena.close()
+
+    def test_persistence_and_compaction(self, arena_dir: str) -> None:
+        arena = FilterArena(arena_dir, initial_size=4096)
+        for i in range(8):
+            arena.create(f"t{i}", 4096, slices=3).add(f"value {i}")
+        for i in range(0, 8, 2):
+            arena.remove(f"t{i}")
+        arena.save()
+        # Once saved, a removed filter's space is reused, zeroed.
+        reused = arena.create("new", 4096, slices=3)
+        assert arena.filters["new"]["offset"] == 0
+        assert reused.query("value 0") is False
+        arena.save()
+        arena.close()
+
+        arena = FilterArena(arena_dir)
+        assert sorted(arena.tenants()) == ["new", "t1", "t3", "t5", "t7"]
+        assert arena["t3"].query("value 3") is True
+        reclaimed = arena.compact()
+        assert reclaimed == 3 * 4096
+        assert arena.used == 5 * 4096
+        assert arena.meta["generation"] == 1
+        assert sorted(os.listdir(arena_dir)) == [DIRECTORY, "data-0001.bin"]
+        arena.close()
+
+        arena = FilterArena(arena_dir)
+        assert all(arena[f"t{i}"].query(f"value {i}") for i in (1, 3, 5, 7))
+        arena.close()
+
+    def test_space_freed_since_save_is_not_reused(self, arena_dir: str) -> None:
+        arena = FilterArena(arena_dir, initial_size=4096)
+        arena.create("old", 4096, slices=3).add("kept")
+        arena.save()
+        arena.remove("old")
+        arena.create("new", 4096, slices=3)
+        assert arena.filters["new"]["offset"] == 4096
+        # A crash now: the saved directory still has "old", with its bits.
+        arena.close()
+        arena = FilterArena(arena_dir)
+        assert arena.tenants() == ["old"]
+        assert arena["old"].query("kept") is True
+        arena.close()
@@ -0,0 +1,169 @@
+import os
+
+import pytest
+
+from fastbloomfilter.backends import (
+    BACKENDS,
+    DEFAULT_MEMORY_THRESHOLD,
+    FileMmapBackend,
+    SharedMemoryBackend,
+    available_memory,
+    make_backend,
+    memory_limit,
+    np,
+    select_backend,
+)
+from fastbloomfilter.bloom import BloomFilter
+
+# numpy is an optional extra, the test extra does not install it.
+BACKEND_NAMES = [
+    pytest.param(name, marks=pytest.mark.skipif(np is None, reason="needs numpy"))
+    if name == "numpy"
+    else name
+    for name in BACKENDS
+]
+
+
+class TestBackends:
+    @pytest.mark.parametrize("name", BACKEND_NAMES)
+    def test_operations_agree(self, name: str) -> None:
+        backend = make_backend(name, 64)
+        assert backend.count() == 0
+        backend.set_bits([3, 3, 100, 511])
+        assert backend.get_bits([3, 4, 100, 511]) == [True, False, True, True]
+        assert backend.count() == 3
+
+        other = bytearray(64)
+        other[0] = 0b10000
+        backend.or_(other)
+        assert backend.bits[4] and backend.count() == 4
+        backend.and_(other)
+        assert backend.count() == 1
+        with pytest.raises(ValueError):
+            backend.or_(bytearray(32))
+
+        view = backend.buffer()
+        assert view.nbytes == 64
+        view.release()
+        backend.flush()
+        backend.close()
+
+    def test_temporary_mmap_file_is_removed(self) -> None:
+        backend = make_backend("mmap", 4096)
+        path = backend.filepath  # type: ignore[attr-defined]
+        assert os.path.getsize(path) == 4096
+        backend.close()
+        assert not os.path.exists(path)
+
+    def test_mmap_file_keeps_its_bits(self, tmp_path: object) -> None:
+        path = f"{tmp_path}/bits.bin"
+        backend = FileMmapBackend(1024, path)
+        backend.set_bits([42])
+        backend.close()
+        backend = FileMmapBackend(4096, path, keep=True)
+        assert os.path.getsize(path) == 4096
+        assert backend.count() == 1 and backend.get_bits([42]) == [True]
+        backend.close()
+        backend = FileMmapBackend(4096, path)
+        assert backend.count() == 0
+        backend.close()
+
+    def test_shared_memory_attach(self) -> None:
+        owner = SharedMemoryBackend(1024)
+        owner.set_bits([42])
+        other = SharedMemoryBackend(1024, name=owner.shm_name, create=False)
+        assert other.get_bits([42]) == [True]
+        other.close()
+        owner.close()
+
+    def test_unknown_backend(self) -> None:
+        with pytest.raises(ValueError):
+            make_backend("redis", 64)
+
+    def test_selection_reads_meminfo(self, tmp_path: object) -> None:
+        meminfo = f"{tmp_path}/meminfo"
+        with open(meminfo, "w") as f:
+            f.write("MemTotal:  8000 kB\nMemFree:  1000 kB\nMemAvailable:  4000 kB\n")
+        assert available_memory(meminfo) == 4000 * 1024
+        assert memory_limit(0.5, meminfo) == 2000 * 1024
+        assert memory_limit(0.5, f"{tmp_path}/missing") == DEFAULT_MEMORY_THRESHOLD
+        assert select_backend(1024) == "bitarray"
+        assert select_backend(1 << 60) == "mmap"
+
+
+class TestBloomFilterBackends:
+    @pytest.mark.parametrize("name", BACKEND_NAMES)
+    def test_filter_on_backend(self, name: str, temp_filter_file: str) -> None:
+        bf = BloomFilter(array_size=4096, slices=4, backend=name)
+        assert bf.storage is not None and bf.storage.name == name
+        bf.add_batch(["a", "b", "c"])
+        assert bf.query("a") is True
+        assert bf.query_batch(["b", "z"]) == [True, False]
+
+        other = BloomFilter(array_size=4096, slices=4)
+        other.add("merged")
+        bf._raw_merge(other)
+        assert bf.query("merged") is True
+
+        assert bf.save_mapped(temp_filter_file) is True
+        loaded = BloomFilter(array_size=1024, backend=name)
+        assert loaded.load(temp_filter_file) is True
+        assert loaded.storage is not None and loaded.storage.name == name
+        assert loaded.bitcount == bf.bitcount
+        assert loaded.query("merged") is True
+        loaded.close()
+        other.close()
+        bf.close()
+        assert bf.storage is None
+
+    @pytest.mark.parametrize("name", BACKEND_NAMES)
+    def test_filename_loads_into_backend(
+        self, name: str, temp_filter_file: str
+    ) -> None:
+        bf = BloomFilter(array_size=2048, slices=3)
+        bf.add("saved")
+        for save in (bf.save, bf.save_mapped):
+            assert save(temp_filter_file) is True
+            loaded = BloomFilter(filename=temp_filter_file, backend=name)
+            assert loaded.storage is not None and loaded.storage.name == name
+            assert loaded.bfilter is loaded.storage.bits
+            assert loaded.query("saved") is True
+            loaded.close()
+        bf.close()
+
+    def test_pickle_loads_into_backend(self, temp_filter_file: str) -> None:
+        bf = BloomFilter(array_size=2048, slices=3)
+        bf.add("pickled")
+        assert bf.save(temp_filter_file) is True
+        loaded = BloomFilter(array_size=1024, backend="anonymous")
+        assert loaded.load(temp_filter_file) is True
+        assert loaded.storage is not None and loaded.storage.mapping is not None
+        assert loaded.query("pickled") is True
+        assert loaded.advise("random") is True
+        loaded.close()
+        bf.close()
+
+    def test_filter_attaches_to_shared_memory(self) -> None:
+        owner = BloomFilter(array_size=4096, slices=4, backend="shm")
+        owner.add("shared")
+        assert isinstance(owner.storage, SharedMemoryBackend)
+        name = owner.storage.shm_name
+        worker = BloomFilter(array_size=4096, slices=4, backend="shm", shm_name=name)
+        assert worker.query("shared") is True
+        assert worker.bitset == owner.bfilter.count()
+        worker.add("from worker")
+        assert owner.query("from worker") is True
+        with pytest.raises(ValueError):
+            BloomFilter(array_size=1 << 20, backend="shm", shm_name=name)
+        with pytest.raises(ValueError):
+            BloomFilter(array_size=4096, shm_name=name)
+        worker.close()
+        # The block stays with its creator.
+        assert owner.query("shared") is True
+        owner.close()
+
+    def test_for_capacity_backend(self) -> None:
+        pytest.importorskip("numpy")
+        bf = BloomFilter.for_capacity(500, 0.01, backend="numpy")
+        assert bf.storage is not None and bf.storage.name == "numpy"
+        bf.close()
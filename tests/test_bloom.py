@@ -1,12 +1,26 @@
+import mmap
+import os
+import pickle
 import random
+from collections.abc import Iterable
+from typing import Any
 
+import pytest
+
+import fastbloomfilter.bloom as bloom_module
 from fastbloomfilter.bloom import (
     BloomFilter,
+    MemoryMappedBitArray,
     blake2b512,
+    false_positive_rate,
     sha3,
     sha256,
     shannon_entropy,
 )
+from fastbloomfilter.lib.delta import decode_delta
+from fastbloomfilter.lib.mapfile import read_header
+from fastbloomfilter.lib.merkle import MERKLE_CHUNK_SIZE
+from fastbloomfilter.lib.pickling import dumps_out_of_band, loads_out_of_band
 
 
 class TestHashFunctions:
@@ -40,6 +54,13 @@ class TestShannonEntropy:
         entropy = shannon_entropy(data)
         assert entropy > 0
 
+    def test_entropy_without_numpy(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        data = bytes(range(256)) * 8 + b"\x00" * 100
+        expected = shannon_entropy(memoryview(data))
+        monkeypatch.setattr(bloom_module, "np", None)
+        assert bloom_module.byte_counts(data, chunk_size=100)[0] == 108
+        assert shannon_entropy(data) == pytest.approx(expected)
+
 
 class TestBloomFilterCreation:
     def test_create_default_filter(self) -> None:
@@ -104,6 +125,39 @@ class TestBloomFilterUpdate:
         result = populated_filter.update("test_element_0")
         assert result is True
 
+    def test_dedup_matches_update_loop(self, small_filter: BloomFilter) -> None:
+        records = [{"id": i % 7, "n": i} for i in range(20)]
+        small_filter.add("3")
+        first = list(
+            small_filter.dedup(records, key=lambda r: str(r["id"]), batch_size=4)
+        )
+        assert [r["n"] for r in first] == [0, 1, 2, 4, 5, 6]
+        assert list(small_filter.dedup(["3", "x", "x", "y"])) == ["x", "y"]
+        with pytest.raises(ValueError):
+            list(small_filter.dedup([], batch_size=0))
+
+    def test_dedup_reads_one_batch_ahead(self, small_filter: BloomFilter) -> None:
+        consumed = []
+
+        def source() -> Iterable[str]:
+            for i in range(10):
+                consumed.append(i)
+                yield f"record {i}"
+
+        stream = small_filter.dedup(source(), batch_size=3)
+        assert next(stream) == "record 0"
+        assert consumed == [0, 1, 2]
+        assert len(list(stream)) == 9
+
+    def test_dedup_raises_while_saving(self, small_filter: BloomFilter) -> None:
+        stream = small_filter.dedup(["a", "b", "c"], batch_size=2)
+        assert next(stream) == "a"
+        small_filter.saving = True
+        with pytest.raises(RuntimeError, match="being saved"):
+            list(stream)
+        small_filter.saving = False
+        assert small_filter.query_batch(["b", "c"]) == [True, False]
+
 
 class TestBloomFilterSaveLoad:
     def test_save_and_load(
@@ -175,3 +229,806 @@ class TestBloomFilterEdgeCases:
             small_filter.add(char)
         for char in special_chars:
             assert small_filter.query(char) is True
+
+
+class TestBloomFilterPlanning:
+    def test_plan_sizes_for_capacity(self) -> None:
+        plan = BloomFilter.plan(10000, 0.01)
+        assert plan.slices == 7
+        assert plan.bitcount == 95856
+        assert plan.slice_bits == plan.slices * plan.bits_per_index
+        assert plan.slice_bits <= plan.digest_bits
+        assert plan.expected_fpr == pytest.approx(0.01, rel=0.01)
+
+    def test_plan_mask_mode_rounds_to_power_of_two(self) -> None:
+        plan = BloomFilter.plan(10000, 0.01, index_mode="mask")
+        assert plan.bitcount == 131072
+        assert plan.bits_per_index == 17
+        assert plan.expected_fpr < 0.01
+
+    def test_plan_rejects_short_digest(self) -> None:
+        with pytest.raises(ValueError, match="digest bits"):
+            BloomFilter.plan(10**9, 1e-12, hashfunc=sha256)
+
+    def test_plan_rejects_bad_arguments(self) -> None:
+        with pytest.raises(ValueError):
+            BloomFilter.plan(0, 0.01)
+        with pytest.raises(ValueError):
+            BloomFilter.plan(100, 1.5)
+
+    def test_for_capacity_configures_filter(self) -> None:
+        bf = BloomFilter.for_capacity(2000, 0.01, backend="bitarray")
+        plan = BloomFilter.plan(2000, 0.01)
+        assert bf.bitcount == plan.bitcount
+        assert bf.slices == plan.slices
+        assert bf.use_mmap is False
+        for i in range(2000):
+            bf.add(f"element_{i}")
+        false_positives = sum(bf.query(f"other_{i}") for i in range(5000))
+        assert false_positives / 5000 < 0.02
+        assert bf.expected_fpr() == pytest.approx(
+            false_positive_rate(bf.bitcount, bf.slices, 2000)
+        )
+        bf.close()
+
+    def test_for_capacity_mmap_backend(self) -> None:
+        bf = BloomFilter.for_capacity(100, 0.01, backend="mmap")
+        # The same file mapping as BloomFilter(backend="mmap").
+        assert bf.storage is not None and bf.storage.name == "mmap"
+        bf.add("value")
+        assert bf.query("value") is True
+        bf.close()
+
+    def test_for_capacity_unknown_backend(self) -> None:
+        with pytest.raises(ValueError):
+            BloomFilter.for_capacity(100, 0.01, backend="redis")
+
+
+class TestBloomFilterIndexModes:
+    def test_default_index_mode(self) -> None:
+        bf = BloomFilter(array_size=1024)
+        assert bf.index_mode == "mask"
+        bf.close()
+        bf = BloomFilter(array_size=1000)
+        assert bf.index_mode == "lemire"
+        bf.close()
+
+    def test_mask_mode_needs_power_of_two(self) -> None:
+        with pytest.raises(ValueError, match="power of two"):
+            BloomFilter(array_size=1000, index_mode="mask")
+        with pytest.raises(ValueError):
+            BloomFilter(array_size=1024, index_mode="modulo")
+
+    @pytest.mark.parametrize("index_mode", ["lemire", "mod"])
+    def test_non_power_of_two_reaches_every_bit(self, index_mode: str) -> None:
+        bf = BloomFilter(
+            array_size=1000, slices=4, slice_bits=256, index_mode=index_mode
+        )
+        seen = set()
+        for i in range(40000):
+            seen.update(bf._hash(f"element_{i}"))
+        assert max(seen) < bf.bitcount
+        assert len(seen) == bf.bitcount
+        bf.close()
+
+    def test_index_mode_saved(self, temp_filter_file: str) -> None:
+        bf = BloomFilter(array_size=1000, index_mode="mod")
+        bf.add("value")
+        bf.save(temp_filter_file)
+        bf2 = BloomFilter(filename=temp_filter_file)
+        assert bf2.index_mode == "mod"
+        assert bf2.query("value") is True
+        bf.close()
+        bf2.close()
+
+
+class TestBloomFilterPartitioned:
+    def test_each_hash_indexes_its_partition(self) -> None:
+        bf = BloomFilter(array_size=1000, slices=5, layout="partitioned")
+        assert bf.partition_bits == 1600
+        for i in range(200):
+            for part, index in enumerate(bf._hash(f"element_{i}")):
+                assert part * 1600 <= index < (part + 1) * 1600
+        bf.close()
+
+    def test_large_partitions_are_granule_aligned(self, temp_filter_file: str) -> None:
+        granule = mmap.ALLOCATIONGRANULARITY
+        bf = BloomFilter(array_size=3 * granule + 100, slices=3, layout="partitioned")
+        assert bf.partition_bits == 2 * granule * 8
+        assert bf.bitcount == 3 * bf.partition_bits
+        bf.add("value")
+        assert bf.save_mapped(temp_filter_file) is True
+        with open(temp_filter_file, "rb") as f:
+            _, offset = read_header(f)
+            # The last partition maps on its own, straight from the file.
+            part = mmap.mmap(
+                f.fileno(),
+                granule * 2,
+                prot=mmap.PROT_READ,
+                offset=offset + 2 * granule * 2,
+            )
+        index = list(bf._hash("value"))[2] - 2 * bf.partition_bits
+        assert part[index // 8] >> (index % 8) & 1
+        part.close()
+        bf.close()
+        # A caller's buffer can't grow: its partitions round down.
+        buffered = BloomFilter(
+            buffer=bytearray(3 * granule + 100), slices=3, layout="partitioned"
+        )
+        assert buffered.partition_bits == granule * 8
+        plan = BloomFilter.plan(100_000, 0.01, layout="partitioned")
+        assert plan.bitcount // plan.slices % (granule * 8) == 0
+
+    def test_partitioned_rejects_fast(self) -> None:
+        with pytest.raises(ValueError):
+            BloomFilter(array_size=1024, fast=True, layout="partitioned")
+        with pytest.raises(ValueError):
+            BloomFilter(array_size=1024, layout="striped")
+
+    def test_batch_matches_single_queries(self) -> None:
+        bf = BloomFilter.for_capacity(1000, 0.01, layout="partitioned")
+        assert bf.layout == "partitioned"
+        bf.add_batch(f"element_{i}" for i in range(1000))
+        keys = [f"element_{i}" for i in range(0, 2000, 7)]
+        assert bf.query_batch(keys) == [bf.query(key) for key in keys]
+        assert all(bf.query_batch([f"element_{i}" for i in range(1000)]))
+        bf.close()
+
+    def test_partition_view_shares_memory(self) -> None:
+        bf = BloomFilter(array_size=1024, slices=4, layout="partitioned", use_mmap=True)
+        bf.add("value")
+        hashes = list(bf._hash("value"))
+        part = bf.partition(2)
+        assert len(part) == bf.partition_bits
+        assert part[hashes[2] - 2 * bf.partition_bits] == 1
+        assert part.count() == 1
+        del part
+        with pytest.raises(IndexError):
+            bf.partition(4)
+        bf.close()
+
+    def test_shared_layout_batch(self, populated_filter: BloomFilter) -> None:
+        assert populated_filter.query_batch(["test_element_1", "missing"]) == [
+            True,
+            False,
+        ]
+        with pytest.raises(ValueError):
+            populated_filter.partition(0)
+
+
+class TestBloomFilterBuffer:
+    def test_filter_over_existing_buffer(self) -> None:
+        buf = bytearray(1024)
+        bf = BloomFilter(buffer=buf, slices=4)
+        assert bf.bitcount == 1024 * 8
+        bf.add("value")
+        assert any(buf)
+        bf2 = BloomFilter(buffer=buf, slices=4)
+        assert bf2.query("value") is True
+        bf.close()
+        bf2.close()
+
+
+class TestBloomFilterSharedMapping:
+    def test_open_shared_queries_mapping(
+        self, populated_filter: BloomFilter, temp_filter_file: str
+    ) -> None:
+        assert populated_filter.save_mapped(temp_filter_file) is True
+        bf = BloomFilter.open_shared(temp_filter_file)
+        assert bf.shared_mmap is not None
+        assert bf.bitcount == populated_filter.bitcount
+        assert bf.query("test_element_0") is True
+        assert bf.query("missing") is False
+        with pytest.raises(TypeError):
+            bf.add("new_element")
+        bf.close()
+
+    def test_open_mapped_writes_through(
+        self, populated_filter: BloomFilter, temp_filter_file: str
+    ) -> None:
+        assert populated_filter.save_mapped(temp_filter_file) is True
+        bf = BloomFilter.open_mapped(temp_filter_file)
+        bf.add("written in place")
+        bf.sync_mapped()
+        bf.close()
+        shared = BloomFilter.open_shared(temp_filter_file, verify=True)
+        assert shared.query("written in place") is True
+        assert shared.query("test_element_0") is True
+        assert shared.bitset == populated_filter.bitset + shared.slices
+        shared.close()
+        with pytest.raises(ValueError):
+            populated_filter.sync_mapped()
+        assert bf.shared_mmap is None
+
+    def test_reload_on_replace(self, temp_filter_file: str) -> None:
+        writer = BloomFilter(array_size=1000, slices=5)
+        writer.add("first")
+        writer.save_mapped(temp_filter_file)
+        reader = BloomFilter.open_shared(temp_filter_file, reload_interval=0)
+        assert reader.query("second") is False
+        assert reader.reload() is False
+        writer.add("second")
+        writer.save_mapped(temp_filter_file)
+        assert reader.query("second") is True
+        assert reader.query("first") is True
+        reader.close()
+        writer.close()
+
+    @pytest.mark.parametrize("use_mmap", [False, True])
+    def test_load_mapped_file(self, temp_filter_file: str, use_mmap: bool) -> None:
+        bf = BloomFilter(array_size=1000, slices=5, index_mode="mod")
+        bf.add("value")
+        bf.save_mapped(temp_filter_file)
+        bf2 = BloomFilter(filename=temp_filter_file, use_mmap=use_mmap)
+        assert bf2.index_mode == "mod"
+        assert bf2.slices == 5
+        assert bf2.query("value") is True
+        bf2.add("other")
+        assert bf2.query("other") is True
+        bf.close()
+        bf2.close()
+
+
+class TestBloomFilterPaging:
+    @pytest.mark.parametrize("use_mmap", [False, True])
+    def test_warm_and_advise(self, use_mmap: bool) -> None:
+        bf = BloomFilter(array_size=1024 * 64, use_mmap=use_mmap)
+        bf.add("value")
+        bf.warm()
+        assert bf.advise("random") is use_mmap
+        assert bf.query("value") is True
+        with pytest.raises(ValueError):
+            bf.advise("backwards")
+        bf.close()
+
+    def test_anonymous_huge_page_buffer(self) -> None:
+        bf = BloomFilter(array_size=1024 * 64, huge_pages=True, populate=True)
+        assert bf.storage is not None and bf.storage.name == "anonymous"
+        assert bf.advise("normal") is True
+        bf.add("value")
+        assert bf.query("value") is True
+        assert bf.bfilter.count() == bf.slices
+        bf.close()
+        assert bf.storage is None
+
+    def test_page_faults_counted(self) -> None:
+        bf = BloomFilter(array_size=1024 * 1024, use_mmap=True, populate=True)
+        bf.warm()
+        minor, major = bf.page_faults()
+        assert minor >= 0
+        assert major >= 0
+        bf.stat()
+        bf.close()
+
+    def test_open_shared_populate(
+        self, populated_filter: BloomFilter, temp_filter_file: str
+    ) -> None:
+        populated_filter.save_mapped(temp_filter_file)
+        bf = BloomFilter.open_shared(temp_filter_file, populate=True)
+        bf.warm()
+        assert bf.advise("random") is True
+        assert bf.query("test_element_3") is True
+        bf.close()
+
+
+class TestBloomFilterPageSortedBatches:
+    @pytest.mark.parametrize("use_mmap", [False, True])
+    @pytest.mark.parametrize("layout", ["shared", "partitioned"])
+    def test_sorted_batches_match_unsorted(self, use_mmap: bool, layout: str) -> None:
+        keys = [f"element_{i}" for i in range(500)]
+        probes = [f"element_{i}" for i in range(0, 1000, 3)]
+        sorted_bf = BloomFilter(
+            array_size=4096, slices=5, layout=layout, use_mmap=use_mmap
+        )
+        plain_bf = BloomFilter(array_size=4096, slices=5, layout=layout)
+        sorted_bf.add_batch(keys, page_sorted=True)
+        plain_bf.add_batch(keys, page_sorted=False)
+        assert sorted_bf.bfilter.tobytes() == plain_bf.bfilter.tobytes()
+        expected = [plain_bf.query(key) for key in probes]
+        assert sorted_bf.query_batch(probes, page_sorted=True) == expected
+        assert sorted_bf.query_batch(probes) == expected
+        sorted_bf.close()
+        plain_bf.close()
+
+    @pytest.mark.parametrize("page_sorted", [False, True])
+    def test_update_batch_matches_update_loop(self, page_sorted: bool) -> None:
+        keys = [f"key_{i % 70}" for i in range(200)] + ["key_3", "new", "new"]
+        loop_bf = BloomFilter(array_size=256, slices=4)
+        batch_bf = BloomFilter(array_size=256, slices=4)
+        loop_bf.add_batch(["key_1", "key_2"])
+        batch_bf.add_batch(["key_1", "key_2"])
+        expected = [loop_bf.update(key) for key in keys]
+        assert batch_bf.update_batch(keys, page_sorted=page_sorted) == expected
+        assert batch_bf.bfilter.tobytes() == loop_bf.bfilter.tobytes()
+        assert batch_bf.bitset == loop_bf.bitset
+        loop_bf.close()
+        batch_bf.close()
+
+
+class TestBloomFilterCache:
+    def test_result_cache_serves_repeated_positives(self) -> None:
+        bf = BloomFilter(array_size=1024, cache_size=2)
+        bf.add("a")
+        bf.add("b")
+        bf.add("c")
+        assert bf.query("a") is True
+        assert bf.query("a") is True
+        assert bf.query("missing") is False
+        assert bf.query("missing") is False
+        stats = bf.cache_stats()["result"]
+        assert stats["hits"] == 1
+        assert stats["size"] == 1
+        bf.query("b")
+        bf.query("c")
+        assert bf.cache_stats()["result"]["evictions"] == 1
+        assert bf.hits == 4
+        assert bf.queryes == 6
+        bf.close()
+
+    def test_update_with_caches(self) -> None:
+        bf = BloomFilter(array_size=1024, cache_size=8, digest_cache_size=8)
+        assert bf.update("key") is False
+        assert bf.update("key") is True
+        assert bf.cache_stats()["result"]["hits"] == 1
+        bf.add("other")
+        assert bf.query("other") is True
+        assert bf.cache_stats()["digest"]["hits"] == 1
+        bf.stat()
+        bf.close()
+
+    def test_digest_cache_in_batches(self) -> None:
+        bf = BloomFilter(array_size=1024, digest_cache_size=4)
+        bf.add_batch(["a", "b"])
+        assert bf.query_batch(["a", "b", "c"]) == [True, True, False]
+        assert bf.cache_stats()["digest"]["hits"] == 2
+        bf.close()
+
+    def test_cache_cleared_on_reload(self, temp_filter_file: str) -> None:
+        writer = BloomFilter(array_size=1024)
+        writer.add("a")
+        writer.save_mapped(temp_filter_file)
+        reader = BloomFilter.open_shared(temp_filter_file, cache_size=8)
+        assert reader.query("a") is True
+        assert len(reader.result_cache or []) == 1
+        writer.bfilter.setall(False)
+        writer.save_mapped(temp_filter_file)
+        assert reader.reload() is True
+        assert reader.query("a") is False
+        reader.close()
+        writer.close()
+
+
+class TestBloomFilterRawKeys:
+    def test_bytes_keys_match_str_keys(self, small_filter: BloomFilter) -> None:
+        small_filter.add(b"raw_key")
+        assert small_filter.query("raw_key") is True
+        assert small_filter.query(memoryview(b"raw_key")) is True
+        assert small_filter.query(bytearray(b"raw_key")) is True
+        assert small_filter.update(b"other") is False
+        assert small_filter.query_batch([b"other", b"missing"]) == [True, False]
+
+    def test_unhashed_bytes_keys(self) -> None:
+        bf = BloomFilter(array_size=1024, do_hashing=False, fast=True)
+        bf.add(b"\x01\x02")
+        assert list(bf._hash(b"\x01\x02")) == [0x0102 % bf.bitcount]
+        assert bf.query("\x01\x02") is True
+        bf.close()
+        hex_bf = BloomFilter(array_size=1024, do_hashing=False, data_is_hex=True)
+        hex_bf.add(b"ff00")
+        assert hex_bf.query("ff00") is True
+        hex_bf.close()
+
+    def test_unhashable_keys_with_cache(self) -> None:
+        bf = BloomFilter(array_size=1024, cache_size=4, digest_cache_size=4)
+        bf.add(bytearray(b"key"))
+        assert bf.query(bytearray(b"key")) is True
+        assert bf.update(bytearray(b"key")) is True
+        bf.close()
+
+
+class TestBloomFilterFingerprints:
+    def test_fingerprint_round_trip(self, small_filter: BloomFilter) -> None:
+        small_filter.add_fingerprint(0x0123456789ABCDEF)
+        assert small_filter.query_fingerprint(0x0123456789ABCDEF) is True
+        assert small_filter.query_fingerprint(0xFEDCBA9876543210) is False
+        assert small_filter.update_fingerprint(0xFEDCBA9876543210) is False
+        assert small_filter.update_fingerprint(0xFEDCBA9876543210) is True
+
+    def test_fingerprint_width_limits_the_index_range(self) -> None:
+        # 16 bit fingerprints give 8 bits per index: 256 positions.
+        fits = BloomFilter(array_size=32, slices=2, fingerprint_bits=16)
+        fits.add_fingerprint(0xBEEF)
+        assert fits.query_fingerprints([0xBEEF]) == [True]
+        too_large = BloomFilter(array_size=33, slices=2, fingerprint_bits=16)
+        with pytest.raises(ValueError):
+            too_large.add_fingerprint(0xBEEF)
+        with pytest.raises(ValueError):
+            too_large.query_fingerprints([0xBEEF])
+        fast = BloomFilter(array_size=64, fast=True, fingerprint_bits=16)
+        with pytest.raises(ValueError):
+            fast.query_fingerprint(0xBEEF)
+
+    def test_fingerprint_batches(self) -> None:
+        fingerprints = [random.getrandbits(64) for _ in range(300)]
+        bf = BloomFilter(array_size=1000, slices=6, layout="partitioned")
+        bf.add_fingerprints(fingerprints[:200])
+        expected = [i < 200 for i in range(300)]
+        answers = bf.query_fingerprints(fingerprints)
+        assert answers[:200] == expected[:200]
+        assert sum(answers[200:]) < 5
+        assert bf.update_fingerprints(fingerprints[:3]) == [True, True, True]
+        bf.close()
+
+    def test_numpy_fingerprints_match_ints(self) -> None:
+        np = pytest.importorskip("numpy")
+        fingerprints = np.array(
+            [random.getrandbits(64) for _ in range(100)], dtype=np.uint64
+        )
+        bf = BloomFilter(array_size=1000, slices=5)
+        rows = bf._fingerprint_rows(fingerprints)
+        assert rows == [bf._fingerprint_indices(int(fp)) for fp in fingerprints]
+        bf.add_fingerprints(fingerprints)
+        assert all(bf.query_fingerprints(fingerprints))
+        bf.close()
+
+    def test_wide_fingerprints(self) -> None:
+        bf = BloomFilter(array_size=1024, fingerprint_bits=128)
+        fingerprint = random.getrandbits(128)
+        bf.add_fingerprint(fingerprint)
+        assert bf.query_fingerprint(fingerprint) is True
+        with pytest.raises(ValueError):
+            BloomFilter(array_size=1024, fingerprint_bits=63)
+        bf.close()
+
+
+class TestBloomFilterSimilarity:
+    def _pair(self) -> tuple[BloomFilter, BloomFilter]:
+        a = BloomFilter(array_size=1024 * 64, slices=7)
+        b = BloomFilter(array_size=1024 * 64, slices=7)
+        a.add_batch(f"element_{i}" for i in range(0, 3000))
+        b.add_batch(f"element_{i}" for i in range(1000, 5000))
+        return a, b
+
+    def test_cardinality_estimates(self) -> None:
+        a, b = self._pair()
+        assert a.estimate_cardinality() == pytest.approx(3000, rel=0.05)
+        assert a.union_cardinality(b) == pytest.approx(5000, rel=0.05)
+        assert a.intersection_cardinality(b) == pytest.approx(2000, rel=0.1)
+        a.close()
+        b.close()
+
+    def test_similarity_estimates(self) -> None:
+        a, b = self._pair()
+        assert a.jaccard(b) == pytest.approx(2000 / 5000, rel=0.1)
+        assert a.containment(b) == pytest.approx(2000 / 3000, rel=0.1)
+        assert b.containment(a) == pytest.approx(2000 / 4000, rel=0.1)
+        result = a.compare(a)
+        assert result["jaccard"] == pytest.approx(1.0)
+        a.close()
+        b.close()
+
+    def test_chunked_counts_on_mmap(self) -> None:
+        a = BloomFilter(array_size=4096, use_mmap=True)
+        b = BloomFilter(array_size=4096)
+        a.add("x")
+        b.add("x")
+        b.add("y")
+        count_a, count_b, count_or, count_and = a._overlap_counts(b, chunk_size=100)
+        assert count_a == int.from_bytes(a.bfilter.tobytes(), "little").bit_count()
+        assert count_b == b.bfilter.count()
+        assert count_and == count_a
+        assert count_or == count_b
+        a.close()
+        b.close()
+
+    def test_non_conformable(self) -> None:
+        a = BloomFilter(array_size=1024)
+        b = BloomFilter(array_size=2048)
+        with pytest.raises(ValueError, match="conformable"):
+            a.jaccard(b)
+        a.close()
+        b.close()
+
+    def test_empty_and_saturated(self) -> None:
+        bf = BloomFilter(array_size=8, slices=2)
+        assert bf.estimate_cardinality() == 0
+        assert bf.compare(bf)["jaccard"] == 0.0
+        bf.bfilter.setall(True)
+        assert bf.estimate_cardinality() == float("inf")
+        bf.close()
+
+
+class TestBloomFilterDelta:
+    def test_tracked_deltas_sync_a_replica(self, tmp_path: object) -> None:
+        size = 4 * 64 * 1024
+        primary = BloomFilter(array_size=size, track_changes=True)
+        replica = BloomFilter(array_size=size)
+        primary.add_batch([f"first-{i}" for i in range(100)])
+        delta_file = f"{tmp_path}/delta.bin"
+        with open(delta_file, "wb") as f:
+            f.write(primary.export_delta())
+        with open(delta_file, "rb") as f:
+            version = replica.apply_delta(f.read())
+        assert version == 1
+        assert replica.bfilter == primary.bfilter
+
+        primary.add("second")
+        blob = primary.export_delta(since=version)
+        assert replica.apply_delta(blob) == 2
+        assert replica.query("second") is True
+        assert replica.bfilter == primary.bfilter
+        primary.close()
+        replica.close()
+
+    def test_delta_only_carries_changed_chunks(self) -> None:
+        size = 16 * 64 * 1024
+        primary = BloomFilter(array_size=size, slices=1, track_changes=True)
+        primary.export_delta()
+        primary.add("one")
+        meta, payload = decode_delta(primary.export_delta(since=1))
+        assert len(meta["chunks"]) == 1
+        assert len(payload) == 64 * 1024
+        payload.release()
+        meta, payload = decode_delta(primary.export_delta(since=2))
+        assert meta["chunks"] == []
+        assert meta["version"] == 3
+        primary.close()
+
+    def test_untracked_and_base_deltas(self) -> None:
+        base = BloomFilter(array_size=4 * 64 * 1024, slices=2)
+        base.add("old")
+        current = BloomFilter(array_size=4 * 64 * 1024, slices=2)
+        current._raw_merge(base)
+        current.add("new")
+        replica = BloomFilter(array_size=4 * 64 * 1024, slices=2)
+        replica.apply_delta(base.export_delta())
+        assert replica.query("old") is True
+        replica.apply_delta(current.export_delta(base=base))
+        assert replica.bfilter == current.bfilter
+        for bf in (base, current, replica):
+            bf.close()
+
+    def test_non_conformable_delta(self) -> None:
+        a = BloomFilter(array_size=1024)
+        b = BloomFilter(array_size=2048)
+        with pytest.raises(ValueError, match="conformable"):
+            b.apply_delta(a.export_delta())
+        a.close()
+        b.close()
+
+
+class TestBloomFilterPickling:
+    def test_out_of_band_buffer_is_not_copied(self) -> None:
+        bf = BloomFilter(array_size=1024 * 64, slices=5)
+        bf.add("shared")
+        header, buffers = dumps_out_of_band(bf)
+        assert len(buffers) == 1
+        assert buffers[0].raw().nbytes == 1024 * 64
+        assert len(header) < 1024
+        clone: Any = loads_out_of_band(header, buffers)
+        assert clone.query("shared") is True
+        assert clone.bitcount == bf.bitcount
+        # Both filters use the same memory.
+        clone.add("written by clone")
+        assert bf.query("written by clone") is True
+        del clone, buffers
+        bf.close()
+
+    @pytest.mark.parametrize("protocol", [2, 4, 5])
+    def test_round_trip(self, protocol: int) -> None:
+        bf = BloomFilter(array_size=4096, slices=4, cache_size=10)
+        bf.add("value")
+        clone = pickle.loads(pickle.dumps(bf, protocol=protocol))
+        assert clone.query("value") is True
+        assert clone.query("other") is False
+        assert clone.result_cache is None
+        clone.add("other")
+        assert bf.query("other") is False
+        bf.close()
+
+    def test_mmap_filter_pickles(self) -> None:
+        bf = BloomFilter(array_size=4096, use_mmap=True)
+        bf.add("mapped")
+        clone = pickle.loads(pickle.dumps(bf, protocol=5))
+        assert clone.query("mapped") is True
+        assert clone.use_mmap is False
+        bf.close()
+
+    def test_legacy_dict_state(self) -> None:
+        bf = BloomFilter(array_size=1024, slices=3)
+        bf.add("legacy")
+        state = {
+            key: value
+            for key, value in bf.__dict__.items()
+            if key not in ("index_mode", "layout", "partition_bits")
+        }
+        restored = BloomFilter.__new__(BloomFilter)
+        restored.__setstate__(state)
+        assert restored.index_mode == "mask"
+        assert restored.query("legacy") is True
+        bf.close()
+
+
+class TestBloomFilterMerkle:
+    def test_only_dirty_leaves_are_rehashed(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        hashed: list[list[int]] = []
+        original = bloom_module.hash_chunks
+
+        def spy(
+            view: memoryview, chunk_size: int, chunks: Iterable[int], workers: int = 1
+        ) -> list[bytes]:
+            chunks = list(chunks)
+            hashed.append(chunks)
+            return original(view, chunk_size, chunks, workers)
+
+        monkeypatch.setattr(bloom_module, "hash_chunks", spy)
+        bf = BloomFilter(array_size=4 * MERKLE_CHUNK_SIZE, slices=1, track_changes=True)
+        root = bf.merkle_root()
+        assert hashed == [[0, 1, 2, 3]]
+        assert bf.merkle_root() == root
+        assert hashed[-1] == []
+        bf.add("dirty")
+        changed = bf.merkle_root()
+        assert changed != root
+        assert len(hashed[-1]) == 1
+        assert bf.calc_hashid() == changed[:8]
+        bf.close()
+
+    def test_hashid_leaves_delta_export_alone(self) -> None:
+        bf = BloomFilter(array_size=2 * MERKLE_CHUNK_SIZE, slices=3)
+        root = bf.merkle_root()
+        bf.calc_hashid()
+        assert bf.tracker is None
+        bf.add("after the root")
+        assert bf.merkle_root() != root
+        assert bf.tracker is None
+        replica = BloomFilter(array_size=2 * MERKLE_CHUNK_SIZE, slices=3)
+        replica.apply_delta(bf.export_delta())
+        assert replica.merkle_root() == bf.merkle_root()
+        assert replica.query("after the root") is True
+        bf.close()
+        replica.close()
+
+    def test_root_matches_a_fresh_computation(self) -> None:
+        bf = BloomFilter(array_size=2 * MERKLE_CHUNK_SIZE, slices=3)
+        bf.merkle_root()
+        bf.add_batch([f"key-{i}" for i in range(200)])
+        bf.update("one more")
+        clone = pickle.loads(pickle.dumps(bf))
+        assert clone.merkle_root(workers=2) == bf.merkle_root()
+        bf.close()
+
+    def test_saved_root_is_verified(self, tmp_path: object) -> None:
+        filename = f"{tmp_path}/filter.blm"
+        bf = BloomFilter(array_size=2 * MERKLE_CHUNK_SIZE, slices=3)
+        bf.add("stored")
+        with pytest.raises(ValueError):
+            bf.verify()
+        assert bf.save_mapped(filename) is True
+        with open(filename, "rb") as f:
+            assert read_header(f)[0]["merkle_root"] == bf.merkle_root()
+        shared = BloomFilter.open_shared(filename, verify=True)
+        assert shared.verify(workers=2) is True
+        shared.close()
+        BloomFilter.open_mapped(filename, verify=True).close()
+
+        # Flip one bit of the payload on disk.
+        with open(filename, "r+b") as f:
+            _, offset = read_header(f)
+            f.seek(offset + MERKLE_CHUNK_SIZE + 5)
+            byte = f.read(1)[0]
+            f.seek(-1, 1)
+            f.write(bytes([byte ^ 1]))
+        with pytest.raises(ValueError):
+            BloomFilter.open_shared(filename, verify=True)
+        with pytest.raises(ValueError):
+            BloomFilter.open_mapped(filename, verify=True)
+        loaded = BloomFilter(array_size=1024)
+        assert loaded.load(filename) is True
+        assert loaded.verify() is False
+        loaded.close()
+        bf.close()
+
+    def test_reload_keeps_mapping_of_corrupt_file(self, tmp_path: object) -> None:
+        filename = f"{tmp_path}/filter.blm"
+        writer = BloomFilter(array_size=MERKLE_CHUNK_SIZE, slices=3)
+        writer.add("first")
+        assert writer.save_mapped(filename) is True
+        reader = BloomFilter.open_shared(filename, reload_interval=0, verify=True)
+        writer.add("second")
+        assert writer.save_mapped(filename) is True
+        with open(filename, "r+b") as f:
+            _, offset = read_header(f)
+            f.seek(offset + 5)
+            byte = f.read(1)[0]
+            f.seek(-1, 1)
+            f.write(bytes([byte ^ 1]))
+        # Automatic reloads verify like open_shared(verify=True) did.
+        assert reader.query("second") is False
+        assert reader.reload() is False
+        assert reader.query("first") is True
+        assert reader.reload(verify=False) is True
+        assert reader.query("second") is True
+        reader.close()
+        writer.close()
+
+
+class TestBloomFilterZeroCopy:
+    def test_views_share_the_live_bits(self) -> None:
+        bf = BloomFilter(array_size=1024, slices=3)
+        view = bf.as_memoryview()
+        assert view.nbytes == 1024 and not view.readonly
+        view[10] = 0xFF
+        assert bf.bfilter[80] and bf.bfilter[87]
+        view.release()
+        bf.close()
+
+    def test_numpy_view_shares_the_live_bits(self) -> None:
+        pytest.importorskip("numpy")
+        bf = BloomFilter(array_size=1024, slices=3)
+        array = bf.as_numpy()
+        array[10] = 0xFF
+        bf.add("value")
+        assert int(array.sum()) > 0xFF
+        array[:] = 0
+        assert bf.query("value") is False
+        del array
+        bf.close()
+
+    def test_view_writes_reach_merkle_root_and_delta(
+        self, temp_filter_file: str
+    ) -> None:
+        pytest.importorskip("numpy")
+        bf = BloomFilter(array_size=4096, slices=3, track_changes=True)
+        replica = BloomFilter(array_size=4096, slices=3)
+        bf.add("tracked")
+        replica.apply_delta(bf.export_delta())
+        before = bf.merkle_root()
+        array = bf.as_numpy()
+        array[4000] = 0xFF
+        assert bf.merkle_root() != before
+        replica.apply_delta(bf.export_delta(since=1))
+        assert replica.bfilter == bf.bfilter
+        # Written after the root above was computed.
+        array[100] = 0xFF
+        del array
+        assert bf.save_mapped(temp_filter_file) is True
+        shared = BloomFilter.open_shared(temp_filter_file, verify=True)
+        assert shared.as_memoryview()[100] == 0xFF
+        shared.close()
+        replica.close()
+        bf.close()
+
+    def test_merge_in_place(self) -> None:
+        buffer = bytearray(4096)
+        bf = BloomFilter(buffer=buffer, slices=4)
+        other = BloomFilter(array_size=4096, slices=4, use_mmap=True)
+        other.add("from other")
+        bf._raw_merge(other)
+        assert bf.query("from other") is True
+        # The merged bits land in the caller's buffer, not a new array.
+        assert any(buffer)
+        other.close()
+        bf.close()
+
+    def test_merge_into_shared_filter_fails(
+        self, populated_filter: BloomFilter, temp_filter_file: str
+    ) -> None:
+        populated_filter.save_mapped(temp_filter_file)
+        shared = BloomFilter.open_shared(temp_filter_file)
+        with pytest.raises(ValueError):
+            shared._raw_merge(populated_filter)
+        shared.close()
+
+    def test_mmap_array_takes_buffers(self) -> None:
+        bits = MemoryMappedBitArray(4096 * 8)
+        bits.frombytes(memoryview(bytes([0x0F]) * 4096))
+        assert bits.as_memoryview()[100] == 0x0F
+        assert bits[0] is True and bits[4] is False
+        bits.setall(False)
+        assert not any(bits.tobytes())
+        path = bits.filepath
+        bits.close()
+        assert not os.path.exists(path)
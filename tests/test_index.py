@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from fastbloomfilter.bloom import BloomFilter
+from fastbloomfilter.index import FilterIndex
+from fastbloomfilter.lib.mapfile import is_mapfile
+
+
+def _filters(count: int) -> list[BloomFilter]:
+    filters = []
+    for day in range(count):
+        bf = BloomFilter(array_size=1024, slices=4)
+        bf.add_batch([f"day-{day}-{i}" for i in range(20)])
+        bf.add("everyday")
+        filters.append(bf)
+    return filters
+
+
+class TestFilterIndex:
+    def test_lookup_matches_every_filter(self) -> None:
+        filters = _filters(10)
+        index = FilterIndex.from_filters(filters, [f"day-{d}" for d in range(10)])
+        assert len(index) == 10
+        assert index.lookup("everyday") == [f"day-{d}" for d in range(10)]
+        assert index.lookup("day-3-7") == ["day-3"]
+        assert index.lookup("never") == []
+        for day, bf in enumerate(filters):
+            for i in range(20):
+                value = f"day-{day}-{i}"
+                expected = [f"day-{d}" for d, f in enumerate(filters) if f.query(value)]
+                assert index.lookup(value) == expected
+        for bf in filters:
+            bf.close()
+
+    def test_grow_remove_and_get(self) -> None:
+        filters = _filters(12)
+        index = FilterIndex(width=8)
+        for bf in filters:
+            index.add_filter(bf)
+        assert index.width == 16
+        assert index.lookup("day-11-0") == ["11"]
+        assert index.get_filter("11").bfilter == filters[11].bfilter
+        index.remove_filter("11")
+        assert index.lookup("day-11-0") == []
+        assert index.add_filter(filters[11], "again") == 11
+        assert index.lookup("day-11-0") == ["again"]
+        with pytest.raises(KeyError):
+            index.remove_filter(40)
+        for bf in filters:
+            bf.close()
+
+    def test_index_and_filter_files_are_not_mixed_up(
+        self, tmp_path: os.PathLike[str]
+    ) -> None:
+        index_file = os.path.join(tmp_path, "index.blf")
+        filter_file = os.path.join(tmp_path, "filter.blf")
+        filters = _filters(2)
+        FilterIndex.from_filters(filters).save(index_file)
+        assert filters[0].save_mapped(filter_file) is True
+        assert not is_mapfile(index_file)
+        with pytest.raises(ValueError, match="filter index"):
+            BloomFilter.open_shared(index_file)
+        with pytest.raises(ValueError, match="filter index"):
+            BloomFilter.open_mapped(index_file)
+        assert filters[1].load(index_file) is False
+        with pytest.raises(ValueError, match="not a filter index"):
+            FilterIndex.open(filter_file)
+        with pytest.raises(ValueError, match="not a filter index"):
+            FilterIndex.load(filter_file)
+        for bf in filters:
+            bf.close()
+
+    def test_non_conformable(self) -> None:
+        index = FilterIndex()
+        index.add_filter(BloomFilter(array_size=1024, slices=4))
+        with pytest.raises(ValueError, match="conformable"):
+            index.add_filter(BloomFilter(array_size=2048, slices=4))
+
+    def test_mapped_persistence(self, tmp_path: os.PathLike[str]) -> None:
+        filename = os.path.join(tmp_path, "index.blf")
+        filters = _filters(3)
+        FilterIndex.from_filters(filters).save(filename)
+        mapped = FilterIndex.open(filename)
+        assert mapped.lookup("day-1-5") == ["1"]
+        assert mapped.lookup("everyday") == ["0", "1", "2"]
+        with pytest.raises(ValueError, match="read-only"):
+            mapped.add_filter(filters[0])
+        mapped.close()
+        loaded = FilterIndex.load(filename)
+        loaded.remove_filter(0)
+        assert loaded.lookup("everyday") == ["1", "2"]
+        for bf in filters:
+            bf.close()
@@ -0,0 +1,95 @@
+import bz2
+import os
+import pickle
+
+import bitarray
+import pytest
+
+from fastbloomfilter.__main__ import main
+from fastbloomfilter.bloom import BloomFilter
+from fastbloomfilter.lib.mapfile import is_mapfile
+
+
+def _write_old_filter(
+    filename: str,
+    values: list[str],
+    monkeypatch: pytest.MonkeyPatch,
+    array_size: int = 64 * 1024,
+) -> BloomFilter:
+    # Releases before __reduce_ex__ pickled the whole __dict__; older
+    # bitarrays were big-endian and masked digests whatever the size.
+    bf = BloomFilter(array_size=array_size, slices=4)
+    bf.index_mode = "mask"
+    bf.add_batch(values)
+    old = BloomFilter(array_size=array_size, slices=4)
+    old.bitset = bf.bitset
+    # Their bits lived in bfilter alone, without a storage backend.
+    old.close()
+    old.bfilter = bitarray.bitarray(bf.bfilter, endian="big")
+    for attr in ("index_mode", "layout", "partition_bits", "fingerprint_bits"):
+        delattr(old, attr)
+    with monkeypatch.context() as m:
+        m.delattr(BloomFilter, "__reduce_ex__")
+        m.delattr(BloomFilter, "__getstate__")
+        with bz2.BZ2File(filename, "w") as f:
+            pickle.dump(old, f, protocol=4)
+    return bf
+
+
+class TestLegacyLoading:
+    def test_old_pickle_streams_into_memory_and_mmap(
+        self, tmp_path: os.PathLike[str], monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        filename = os.path.join(tmp_path, "old.blf")
+        values = [f"old-{i}" for i in range(200)]
+        original = _write_old_filter(filename, values, monkeypatch)
+        for use_mmap in (False, True):
+            bf = BloomFilter(array_size=1024, use_mmap=use_mmap)
+            assert bf.load(filename) is True
+            assert bf.index_mode == "mask"
+            assert all(bf.query_batch(values))
+            assert bf._buffer().tobytes() == original.bfilter.tobytes()
+            bf.close()
+        original.close()
+
+    def test_current_pickle_round_trip(self, tmp_path: os.PathLike[str]) -> None:
+        filename = os.path.join(tmp_path, "new.blf")
+        bf = BloomFilter(array_size=4096, slices=3, layout="partitioned")
+        bf.add("value")
+        assert bf.save(filename) is True
+        loaded = BloomFilter(filename=filename)
+        assert loaded.layout == "partitioned"
+        assert loaded.query("value") is True
+        bf.close()
+        loaded.close()
+
+    def test_convert_command(
+        self, tmp_path: os.PathLike[str], monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        source = os.path.join(tmp_path, "old.blf")
+        destination = os.path.join(tmp_path, "mapped.blf")
+        values = [f"old-{i}" for i in range(50)]
+        original = _write_old_filter(source, values, monkeypatch)
+        assert main(["convert", source, destination, "--chunk-size", "1000"]) == 0
+        assert is_mapfile(destination)
+        shared = BloomFilter.open_shared(destination)
+        assert all(shared.query_batch(values))
+        assert shared.bitset == original.bitset
+        shared.close()
+        original.close()
+
+    def test_convert_odd_sized_filter_opens_shared(
+        self, tmp_path: os.PathLike[str], monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        source = os.path.join(tmp_path, "old.blf")
+        destination = os.path.join(tmp_path, "mapped.blf")
+        values = [f"odd-{i}" for i in range(50)]
+        original = _write_old_filter(source, values, monkeypatch, array_size=3000)
+        BloomFilter.convert(source, destination)
+        shared = BloomFilter.open_shared(destination, verify=True, cache_size=8)
+        assert shared.index_mode == "mask" and shared.bitcount == 24000
+        assert all(shared.query_batch(values))
+        assert shared.query(values[0]) is True
+        assert shared.cache_stats()["result"]["size"] == 1
+        shared.close()
+        original.close()
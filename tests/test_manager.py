@@ -0,0 +1,96 @@
+import os
+
+from fastbloomfilter.manager import FilterManager
+
+SIZE = 64 * 1024
+
+
+class TestFilterManager:
+    def test_budget_demotes_least_recently_used(self, tmp_path: object) -> None:
+        directory = f"{tmp_path}/filters"
+        manager = FilterManager(
+            directory, memory_budget=2 * SIZE, mapped_budget=2 * SIZE
+        )
+        for name in ("a", "b", "c", "d", "e"):
+            manager.create(name, array_size=SIZE, slices=3)
+            manager.add(name, f"value of {name}")
+        # a and b were pushed to the mapped tier, then a to the compressed one.
+        assert [manager.tier(n) for n in "abcde"] == [
+            "cold",
+            "mapped",
+            "mapped",
+            "memory",
+            "memory",
+        ]
+        assert os.path.exists(f"{directory}/a.bfz")
+        assert not os.path.exists(f"{directory}/a.blm")
+        stats = manager.stats()
+        assert stats["memory_bytes"] <= 2 * SIZE
+        assert stats["mapped_bytes"] <= 2 * SIZE
+        assert stats["evictions"] == 4
+
+        # The compressed filter is loaded on first access, bits intact.
+        assert manager.query("a", "value of a") is True
+        assert manager.tier("a") == "memory"
+        assert manager.stats()["misses"] == 1
+        manager.close()
+
+    def test_mapped_filter_is_promoted_by_use(self, tmp_path: object) -> None:
+        manager = FilterManager(
+            f"{tmp_path}/filters",
+            memory_budget=SIZE,
+            mapped_budget=4 * SIZE,
+            promote_after=2,
+        )
+        manager.create("x", array_size=SIZE, slices=3)
+        manager.add("x", "kept")
+        manager.create("y", array_size=SIZE, slices=3)
+        assert manager.tier("x") == "mapped"
+        # Writes to a mapped filter go straight to its file.
+        manager.add("x", "written while mapped")
+        assert manager.tier("x") == "mapped"
+        # The second access moves it into memory, pushing y out.
+        assert manager.query("x", "written while mapped") is True
+        assert manager.tier("x") == "memory"
+        assert manager.tier("y") == "mapped"
+        assert manager.query("x", "kept") is True
+        assert manager.stats()["promotions"] == 1
+        manager.close()
+
+    def test_large_filter_starts_mapped_and_reopens(self, tmp_path: object) -> None:
+        directory = f"{tmp_path}/filters"
+        manager = FilterManager(directory, memory_budget=SIZE)
+        manager.create("big", array_size=4 * SIZE, slices=3)
+        assert manager.tier("big") == "mapped"
+        manager.add_batch("big", ["one", "two"])
+        manager.create("small", array_size=SIZE // 2, slices=3)
+        manager.update("small", "three")
+        manager.close()
+
+        manager = FilterManager(directory, memory_budget=SIZE)
+        assert sorted(manager.names()) == ["big", "small"]
+        assert manager.tier("big") == "disk"
+        assert manager.query_batch("big", ["one", "two", "four"]) == [
+            True,
+            True,
+            False,
+        ]
+        assert manager["small"].query("three") is True
+        bf = manager.get("big")
+        assert bf.verify() is True
+        manager.close()
+
+    def test_manifest_follows_tier_changes(self, tmp_path: object) -> None:
+        directory = f"{tmp_path}/filters"
+        manager = FilterManager(directory, memory_budget=SIZE)
+        manager.create("a", array_size=SIZE, slices=3)
+        manager.add("a", "value of a")
+        manager.create("b", array_size=SIZE, slices=3)
+        # No flush(): a was written back when b pushed it out of memory,
+        # b only lives in memory.
+        reopened = FilterManager(directory)
+        assert reopened.names() == ["a"]
+        assert reopened.query("a", "value of a") is True
+        reopened.close()
+        manager.close()
+        assert FilterManager(directory).names() == ["a", "b"]
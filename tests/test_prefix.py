@@ -0,0 +1,88 @@
+import pickle
+
+import pytest
+
+from fastbloomfilter.bloom import BloomFilter
+from fastbloomfilter.prefix import PrefixBloomFilter, separator_cuts
+
+
+class TestPrefixBloomFilter:
+    def test_prefix_lengths(self) -> None:
+        bf = PrefixBloomFilter(array_size=8192, slices=4, prefix_lengths=[2, 4])
+        bf.add("user:1234")
+        assert bf.query("user:1234") is True
+        assert bf.query_prefix("us") is True
+        assert bf.query_prefix(b"user") is True
+        assert bf.query_prefix("ab") is False
+        with pytest.raises(ValueError):
+            bf.query_prefix("use")
+
+    def test_separator_and_extractor(self) -> None:
+        assert separator_cuts(b"a/b/c", b"/") == [2, 4]
+        bf = PrefixBloomFilter(
+            array_size=8192,
+            slices=4,
+            separator="/",
+            extractor=lambda key: [key.find(b".") + 1] if b"." in key else [],
+        )
+        bf.add_batch(["usr/lib/libc.so", "etc/hosts"])
+        assert bf.query_prefix_batch(["usr/", "usr/lib/", "etc/", "var/"]) == [
+            True,
+            True,
+            True,
+            False,
+        ]
+        assert bf.query_prefix("usr/lib/libc.") is True
+
+    def test_full_key_hashes_like_bloomfilter(self) -> None:
+        bf = PrefixBloomFilter(array_size=4096, slices=4, separator="/")
+        plain = BloomFilter(array_size=4096, slices=4)
+        assert bf._key_indices("a/b/c")[-1] == list(plain._hash("a/b/c"))
+        # Prefix entries are kept apart from full keys of the same bytes.
+        bf.add("a/b")
+        assert bf.query_prefix("a/") is True
+        assert bf.query("a/") is False
+        plain._raw_merge(bf)
+        assert plain.query("a/b") is True
+
+    def test_update_batch_ignores_prefix_entries(self) -> None:
+        bf = PrefixBloomFilter(array_size=8192, slices=4, prefix_lengths=[1])
+        assert bf.update_batch(["ab", "ab", "ac"]) == [False, True, False]
+        assert bf.update("ac") is True
+        assert bf.update("b") is False
+        assert bf.query_prefix("b") is True
+        assert bf.queryes == 6 and bf.hits == 3
+
+    def test_update_adds_prefixes_of_false_positives(self) -> None:
+        bf = PrefixBloomFilter(array_size=4096, slices=2, prefix_lengths=(4,))
+        key = "0028:rest"
+        # The full key answers as present although it was never added.
+        for digest in bf._key_indices(key)[-1]:
+            bf.bfilter[digest] = True
+        assert bf.query_prefix("0028") is False
+        assert bf.update(key) is True
+        assert bf.query_prefix("0028") is True
+
+    def test_rejects_bad_options(self) -> None:
+        with pytest.raises(ValueError):
+            PrefixBloomFilter(array_size=1024, prefix_lengths=[0])
+        with pytest.raises(ValueError):
+            PrefixBloomFilter(array_size=1024, separator="")
+        with pytest.raises(ValueError):
+            PrefixBloomFilter(array_size=1024, do_hashing=False)
+
+    def test_prefix_options_are_saved(self, temp_filter_file: str) -> None:
+        bf = PrefixBloomFilter(
+            array_size=4096, slices=4, prefix_lengths=[3], separator=b"/"
+        )
+        bf.add("abc/def")
+        clone = pickle.loads(pickle.dumps(bf, protocol=5))
+        assert isinstance(clone, PrefixBloomFilter)
+        assert clone.prefix_lengths == [3] and clone.separator == b"/"
+        assert clone.query_prefix("abc/") is True
+
+        assert bf.save_mapped(temp_filter_file) is True
+        shared = PrefixBloomFilter.open_shared(temp_filter_file)
+        assert shared.query_prefix_batch(["abc", "xyz"]) == [True, False]  # type: ignore[attr-defined]
+        shared.close()
+        bf.close()
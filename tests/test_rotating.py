@@ -0,0 +1,167 @@
+import gc
+import os
+import time
+from collections.abc import Generator
+
+import pytest
+
+from fastbloomfilter.bloom import BloomFilter
+from fastbloomfilter.rotating import RotatingBloomFilter
+
+
+@pytest.fixture
+def rotating() -> Generator[RotatingBloomFilter, None, None]:
+    rbf = RotatingBloomFilter(generations=3, array_size=1024 * 8, slices=5)
+    yield rbf
+    rbf.close()
+
+
+class TestRotatingBloomFilter:
+    def test_generations_share_one_buffer(self, rotating: RotatingBloomFilter) -> None:
+        assert len(rotating.buffer) == 3 * 1024 * 8
+        rotating.add("value")
+        assert rotating.buffer.count(0) < len(rotating.buffer)
+        assert rotating.query("value") is True
+        assert rotating["missing"] is False
+
+    def test_values_expire_after_all_generations(
+        self, rotating: RotatingBloomFilter
+    ) -> None:
+        rotating.add("old")
+        rotating.rotate()
+        rotating.rotate()
+        assert rotating.query("old") is True
+        rotating.rotate()
+        assert rotating.query("old") is False
+        assert rotating.buffer.count(0) == len(rotating.buffer)
+
+    def test_update_checks_all_generations(self, rotating: RotatingBloomFilter) -> None:
+        assert rotating.update("key") is False
+        rotating.rotate()
+        assert rotating.update("key") is True
+        rotating.rotate()
+        rotating.rotate()
+        # The second update refreshed the key into its generation.
+        assert rotating.query("key") is True
+
+    def test_interval_rotation(self) -> None:
+        rbf = RotatingBloomFilter(generations=2, array_size=1024, interval=0.05)
+        rbf.add("value")
+        time.sleep(0.12)
+        assert rbf.query("value") is False
+        rbf.close()
+
+    def test_mmap_buffer_and_generation_save(self, tmp_path: os.PathLike) -> None:
+        path = os.path.join(tmp_path, "rotating.dat")
+        rbf = RotatingBloomFilter(generations=2, array_size=1024, mmap_file=path)
+        assert os.path.getsize(path) == rbf.offset + 2 * 1024
+        rbf.add("value")
+        saved = os.path.join(tmp_path, "gen.blf")
+        assert rbf.save_generation(rbf.current, saved) is True
+        rbf.rotate()
+        rbf.rotate()
+        assert rbf.query("value") is False
+        assert rbf.load_generation(rbf.current, saved) is True
+        assert rbf.query("value") is True
+        rbf.close()
+
+    def test_reopen_continues_the_window(self, tmp_path: os.PathLike) -> None:
+        path = os.path.join(tmp_path, "rotating.dat")
+        rbf = RotatingBloomFilter(generations=3, array_size=1024, mmap_file=path)
+        rbf.add("old")
+        rbf.rotate()
+        rbf.add("new")
+        # The last rotation was 10 seconds ago.
+        rbf.rotated_at -= 10
+        bitsets = [gen.bitset for gen in rbf.generations]
+        rbf.close()
+
+        rbf = RotatingBloomFilter(generations=3, array_size=1024, mmap_file=path)
+        assert rbf.current == 1
+        assert [gen.bitset for gen in rbf.generations] == bitsets
+        assert 9 < time.monotonic() - rbf.rotated_at < 60
+        rbf.close()
+
+        # Two rotations were due while it was closed: "old" expires.
+        rbf = RotatingBloomFilter(
+            generations=3, array_size=1024, mmap_file=path, interval=4
+        )
+        assert rbf.query("old") is False
+        assert rbf.current == 0
+        assert rbf.query("new") is True
+        rbf.close()
+
+        with pytest.raises(ValueError, match="slices"):
+            RotatingBloomFilter(
+                generations=3, array_size=1024, slices=4, mmap_file=path
+            )
+        with pytest.raises(ValueError, match="generations"):
+            RotatingBloomFilter(generations=2, array_size=1024, mmap_file=path)
+        # A rejected open leaves the file as it was.
+        rbf = RotatingBloomFilter(generations=3, array_size=1024, mmap_file=path)
+        assert rbf.query("new") is True
+        rbf.close()
+
+    @pytest.mark.parametrize("generations", [130, 160, 1000])
+    def test_header_of_many_generations(
+        self, tmp_path: os.PathLike, generations: int
+    ) -> None:
+        path = os.path.join(tmp_path, "rotating.dat")
+        rbf = RotatingBloomFilter(
+            generations=generations, array_size=64, slices=3, mmap_file=path
+        )
+        rbf.add("value")
+        for gen in rbf.generations:
+            gen.bitset = 10**19
+        rbf.rotate()
+        rbf.close()
+        rbf = RotatingBloomFilter(
+            generations=generations, array_size=64, slices=3, mmap_file=path
+        )
+        assert rbf.current == 1
+        assert rbf.generations[2].bitset == 10**19
+        assert rbf.query("value") is True
+        rbf.close()
+
+    def test_failed_open_is_released(
+        self, tmp_path: os.PathLike, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        # Too little room for the header: __init__ raises, __del__ must not.
+        monkeypatch.setattr("fastbloomfilter.rotating.payload_offset", lambda _: 8)
+        with pytest.raises(ValueError, match="does not fit"):
+            RotatingBloomFilter(
+                generations=2,
+                array_size=64,
+                mmap_file=os.path.join(tmp_path, "rotating.dat"),
+            )
+        gc.collect()
+
+    def test_load_generation_checks_the_filter(self, tmp_path: os.PathLike) -> None:
+        saved = os.path.join(tmp_path, "gen.blf")
+        other = BloomFilter(array_size=1024, slices=4)
+        other.add("value")
+        assert other.save(saved) is True
+        other.close()
+        rbf = RotatingBloomFilter(generations=2, array_size=1024, slices=5)
+        assert rbf.load_generation(0, saved) is False
+        assert rbf.query("value") is False
+        rbf.close()
+
+    def test_load_generation_marks_the_bits_changed(
+        self, tmp_path: os.PathLike
+    ) -> None:
+        saved = os.path.join(tmp_path, "gen.blf")
+        other = BloomFilter(array_size=1024, slices=5)
+        other.add("value")
+        assert other.save(saved) is True
+        other.close()
+        rbf = RotatingBloomFilter(
+            generations=2, array_size=1024, slices=5, track_changes=True
+        )
+        gen = rbf.generations[0]
+        empty_root = gen.merkle_root()
+        assert rbf.load_generation(0, saved) is True
+        fresh = BloomFilter(buffer=bytearray(gen.bfilter.tobytes()), slices=5)
+        assert gen.merkle_root() == fresh.merkle_root() != empty_root
+        fresh.close()
+        rbf.close()
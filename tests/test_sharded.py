@@ -0,0 +1,123 @@
+import os
+from collections.abc import Generator
+
+import pytest
+
+from fastbloomfilter.bloom import BloomFilter
+from fastbloomfilter.sharded import ShardedBloomFilter
+
+
+@pytest.fixture
+def sharded(tmp_path: os.PathLike[str]) -> Generator[ShardedBloomFilter, None, None]:
+    sbf = ShardedBloomFilter(
+        os.path.join(tmp_path, "sharded"), shards=4, array_size=1024 * 8, slices=5
+    )
+    yield sbf
+    sbf.close()
+
+
+class TestShardedBloomFilter:
+    def test_keys_spread_over_shards(self, sharded: ShardedBloomFilter) -> None:
+        values = [f"key-{i}" for i in range(400)]
+        for value in values:
+            sharded.add(value)
+        shards = {sharded.shard_for(value) for value in values}
+        assert shards == {0, 1, 2, 3}
+        assert all(sharded.query(value) for value in values)
+        assert sharded["missing"] is False
+        for value in values[:20]:
+            bf = sharded.filters[sharded.shard_for(value)]
+            assert bf.query(value) is True
+
+    def test_batches_match_single_calls(self, tmp_path: os.PathLike[str]) -> None:
+        sbf = ShardedBloomFilter(
+            os.path.join(tmp_path, "batch"),
+            shards=3,
+            array_size=1024 * 8,
+            slices=5,
+            workers=2,
+        )
+        values = [f"batch-{i}" for i in range(100)]
+        sbf.add_batch(values[:50])
+        assert sbf.query_batch(values) == [True] * 50 + [False] * 50
+        assert sbf.update_batch(values[40:60] + ["batch-55"]) == [True] * 10 + [
+            False
+        ] * 10 + [True]
+        assert all(sbf.query(value) for value in values[:60])
+        sbf.close()
+
+    def test_save_and_reopen(self, tmp_path: os.PathLike[str]) -> None:
+        directory = os.path.join(tmp_path, "persist")
+        sbf = ShardedBloomFilter(directory, shards=2, array_size=1024 * 8, slices=5)
+        sbf.add_batch(["one", "two", "three"])
+        assert sbf.save() is True
+        assert sorted(os.listdir(directory)) == [
+            "manifest.json",
+            "shard-0000.blf",
+            "shard-0001.blf",
+        ]
+        sbf.close()
+
+        reopened = ShardedBloomFilter(directory)
+        assert len(reopened) == 2
+        assert reopened.query_batch(["one", "two", "three", "four"]) == [
+            True,
+            True,
+            True,
+            False,
+        ]
+        reopened.close()
+
+    def test_reopen_checks_shards(self, tmp_path: os.PathLike[str]) -> None:
+        directory = os.path.join(tmp_path, "checked")
+        sbf = ShardedBloomFilter(directory, shards=2, array_size=1024, slices=5)
+        assert sbf.save() is True
+        sbf.close()
+        shard = os.path.join(directory, "shard-0001.blf")
+
+        other = BloomFilter(array_size=2048, slices=5)
+        assert other.save_mapped(shard) is True
+        other.close()
+        with pytest.raises(ValueError):
+            ShardedBloomFilter(directory)
+
+        with open(shard, "wb") as f:
+            f.write(b"garbage")
+        with pytest.raises(ValueError):
+            ShardedBloomFilter(directory)
+
+        os.unlink(shard)
+        with pytest.raises(FileNotFoundError):
+            ShardedBloomFilter(directory)
+
+    def test_shard_checkpoint_and_merge(self, tmp_path: os.PathLike[str]) -> None:
+        a = ShardedBloomFilter(
+            os.path.join(tmp_path, "a"), shards=2, array_size=1024 * 8, slices=5
+        )
+        b = ShardedBloomFilter(
+            os.path.join(tmp_path, "b"), shards=2, array_size=1024 * 8, slices=5
+        )
+        b.add("from-b")
+        a.merge(b)
+        assert a.query("from-b") is True
+
+        shard = a.shard_for("from-b")
+        assert a.save_shard(shard) is True
+        a.filters[shard].bfilter.setall(False)
+        assert a.query("from-b") is False
+        assert a.load_shard(shard) is True
+        assert a.query("from-b") is True
+        a.close()
+        b.close()
+
+    def test_slice_bits_leave_room_for_routing(
+        self, tmp_path: os.PathLike[str]
+    ) -> None:
+        with pytest.raises(ValueError):
+            ShardedBloomFilter(
+                os.path.join(tmp_path, "wide"),
+                shards=2,
+                array_size=1024,
+                slices=2,
+                slice_bits=512,
+            )
@@ -0,0 +1,84 @@
+import io
+import random
+
+import pytest
+
+from fastbloomfilter.bloom import BloomFilter
+from fastbloomfilter.lib.timing import timing
+from fastbloomfilter.lib.tracing import Histogram, Tracer
+
+
+class TestHistogram:
+    def test_percentiles_within_bucket_precision(self) -> None:
+        values = [random.randint(1, 10**7) for _ in range(20000)]
+        histogram = Histogram(sub_bucket_bits=5)
+        for value in values:
+            histogram.record(value)
+        values.sort()
+        for q in (50, 99, 99.9):
+            exact = values[int(len(values) * q / 100) - 1]
+            assert histogram.percentile(q) == pytest.approx(exact, rel=0.07)
+        assert histogram.max == values[-1]
+        assert histogram.min == values[0]
+
+    def test_small_values_are_exact(self) -> None:
+        histogram = Histogram()
+        for value in range(1, 11):
+            histogram.record(value)
+        assert histogram.percentile(50) == 5
+        assert histogram.percentile(100) == 10
+        assert Histogram().percentile(99) == 0
+
+    def test_merge(self) -> None:
+        a, b = Histogram(), Histogram()
+        a.record(10)
+        b.record(1000)
+        a.merge(b)
+        assert a.count == 2
+        assert a.percentile(100) >= 1000 * 0.97
+
+
+class TestTracer:
+    def test_samples_one_in_n(self) -> None:
+        tracer = Tracer(sample_every=10)
+        assert sum(tracer.sample() for _ in range(100)) == 10
+        with pytest.raises(ValueError):
+            Tracer(sample_every=0)
+
+    def test_filter_stages(self) -> None:
+        tracer = Tracer(sample_every=1)
+        bf = BloomFilter(array_size=4096, slices=4, tracer=tracer)
+        bf.add("one")
+        assert bf.query("one") is True
+        assert bf.update("two") is False
+        assert bf.update("two") is True
+        summary = tracer.summary()
+        for stage in ("hash", "index", "bits"):
+            assert summary[f"update;{stage}"]["count"] == 2
+        assert summary["query"]["count"] == 1
+        assert summary["add;hash"]["p99"] > 0
+
+        out = io.StringIO()
+        tracer.dump(out)
+        text = out.getvalue()
+        assert "p999" in text
+        collapsed = dict(line.rsplit(" ", 1) for line in tracer.collapsed())
+        assert set(collapsed) == set(summary)
+        bf.close()
+
+    def test_sampling_keeps_results(self) -> None:
+        tracer = Tracer(sample_every=3)
+        bf = BloomFilter(array_size=4096, slices=4, tracer=tracer, cache_size=8)
+        answers = [bf.update(f"key-{i % 5}") for i in range(20)]
+        assert answers == [False] * 5 + [True] * 15
+        # Result cache hits return before the tracer is asked.
+        assert tracer.calls == 5
+        bf.close()
+
+
+def test_timing_does_not_print_arguments(capsys: pytest.CaptureFixture[str]) -> None:
+    timed = timing(lambda data: len(data))
+    assert timed(b"x" * 1000) == 1000
+    err = capsys.readouterr().err
+    assert "args:(bytes)" in err
+    assert "xxxx" not in err
@@ -0,0 +1,86 @@
+import math
+
+import pytest
+
+from fastbloomfilter.__main__ import main
+from fastbloomfilter.bloom import BloomFilter
+from fastbloomfilter.tuning import (
+    TuneConfig,
+    candidate_configs,
+    format_table,
+    recommend,
+    synthetic_keys,
+    tune,
+)
+
+
+class TestTuning:
+    def test_candidates_build(self) -> None:
+        configs = candidate_configs(1000, 0.01)
+        assert len(configs) == len(set(configs))
+        assert any(c.fast for c in configs)
+        assert any(c.index_mode == "mask" for c in configs)
+        for config in configs:
+            assert config.slice_bits <= 512
+            if config.index_mode == "mask":
+                # Sized for the power of two bit count, not the planned one.
+                best = round(config.bitcount / 1000 * math.log(2))
+                assert config.slices == best
+            bf = BloomFilter(
+                array_size=config.array_size,
+                slices=config.slices,
+                slice_bits=config.slice_bits,
+                fast=config.fast,
+                index_mode=config.index_mode,
+            )
+            bf.close()
+
+    def test_tune_measures_and_recommends(self) -> None:
+        results = tune(capacity=2000, error_rate=0.05, probes=4000)
+        assert [r.memory_bytes for r in results] == sorted(
+            r.memory_bytes for r in results
+        )
+        assert any(r.pareto for r in results)
+        # A filter twice the planned size stays below the target.
+        assert results[-1].empirical_fpr < 0.05
+        best = recommend(results, 0.05)
+        assert best.empirical_fpr <= 0.05
+        table = format_table(results, best)
+        assert table.count("\n") == len(results)
+        assert table.count("<-") == 1
+
+    def test_sample_keys_and_explicit_configs(self) -> None:
+        keys = synthetic_keys(500, seed=7)
+        tiny = TuneConfig(64, 3)
+        large = TuneConfig(8192, 3)
+        results = tune(keys, configs=[large, tiny], probes=1000)
+        assert [r.config for r in results] == [tiny, large]
+        assert results[0].empirical_fpr > results[1].empirical_fpr
+        assert all(r.count == 500 for r in results)
+        # Nothing meets the target: the most accurate one is recommended.
+        assert recommend(results, 0.0).config == large
+        with pytest.raises(ValueError):
+            tune([])
+
+    def test_tune_command(
+        self, tmp_path: object, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        path = f"{tmp_path}/keys.txt"
+        with open(path, "w") as f:
+            f.write("\n".join(f"user-{i}" for i in range(300)))
+        argv = ["tune", "--keys", path, "--probes", "500", "--array-size", "1024"]
+        assert main([*argv, "--slices", "4", "--fast"]) == 0
+        out = capsys.readouterr().out
+        assert "Recommended: array_size=1024" in out
+        assert len(out.splitlines()) == 4
+
+    @pytest.mark.parametrize(
+        "flags", [["--slices", "4"], ["--slice-bits", "128"], ["--fast"]]
+    )
+    def test_tune_command_rejects_options_without_array_size(
+        self, flags: list[str], capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        with pytest.raises(SystemExit) as exc:
+            main(["tune", "--probes", "10", *flags])
+        assert exc.value.code == 2
+        assert "only apply with --array-size" in capsys.readouterr().err